@@ -48,6 +48,8 @@
     "data": [
         "data/statement_operation.xml",
         "data/queue_job.xml",
+        "data/ir_cron.xml",
+        "security/ir.model.access.csv",
         "views/account_reconcile_compassion.xml",
         "views/reconcile_fund_wizard_view.xml",
         "views/reconcile_split_payment_wizard_view.xml",
@@ -15,3 +15,5 @@ from . import res_config
 from . import account_journal
 from . import account_reconciliation_widget
 from . import account_reconcile_model
+from . import account_move
+from . import pf_checkout_transaction_cache
@@ -0,0 +1,58 @@
+##############################################################################
+#
+#    Copyright (C) 2022 Compassion CH (http://www.compassion.ch)
+#    Releasing children from poverty in Jesus' name
+#
+#    The licence is in the file __manifest__.py
+#
+##############################################################################
+import logging
+
+import psycopg2
+
+from odoo import api, models
+
+_logger = logging.getLogger(__name__)
+
+
+class AccountMove(models.Model):
+    _inherit = "account.move"
+
+    @api.model_cr
+    def init(self):
+        """ Function giving the digits contained in the name and reference of
+        the moves, which are compared with the statement lines labels in the
+        invoice matching query (see account_reconcile_model.py).
+        The comparison only flags the candidates and doesn't filter them, so
+        it can't use an index.
+        """
+        self.env.cr.execute(r"""
+            CREATE OR REPLACE FUNCTION compassion_digit_tokens(text)
+            RETURNS text[] AS $$
+                SELECT regexp_split_to_array(substring(REGEXP_REPLACE($1,
+                '[^0-9|^\s]', '', 'g'), '\S(?:.*\S)*'), '\s+')
+            $$ LANGUAGE SQL IMMUTABLE;
+        """)
+
+
+class AccountMoveLine(models.Model):
+    _inherit = "account.move.line"
+
+    @api.model_cr
+    def init(self):
+        """ Trigram index used to find the move lines whose reference contains
+        the reference of a statement line. """
+        cr = self.env.cr
+        try:
+            with cr.savepoint():
+                cr.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        except psycopg2.Error:
+            _logger.warning(
+                "pg_trgm extension is not available: move lines references "
+                "won't be indexed for the reconciliation."
+            )
+            return
+        cr.execute("""
+            CREATE INDEX IF NOT EXISTS account_move_line_ref_trgm_index
+            ON account_move_line USING gin (ref gin_trgm_ops)
+        """)
@@ -109,19 +109,15 @@ class AccountReconcileModel(models.Model):
                     -- communication using the move.name or move.ref.
                     -- only digits are considered and reference are split by any
                     -- space characters
-                    regexp_split_to_array(substring(REGEXP_REPLACE(move.name,
-                    '[^0-9|^\s]', '', 'g'), '\S(?:.*\S)*'), '\s+')
-                    && regexp_split_to_array(substring(REGEXP_REPLACE(st_line.name,
-                    '[^0-9|^\s]', '', 'g'), '\S(?:.*\S)*'), '\s+')
+                    -- compassion_digit_tokens() is defined in account_move.py
+                    compassion_digit_tokens(move.name)
+                    && compassion_digit_tokens(st_line.name)
                     OR
                     (
                         move.ref IS NOT NULL
                         AND
-                            regexp_split_to_array(substring(REGEXP_REPLACE(move.ref,
-                            '[^0-9|^\s]', '', 'g'), '\S(?:.*\S)*'), '\s+')
-                            &&
-                            regexp_split_to_array(substring(REGEXP_REPLACE(
-                            st_line.name, '[^0-9|^\s]', '', 'g'), '\S(?:.*\S)*'), '\s+')
+                            compassion_digit_tokens(move.ref)
+                            && compassion_digit_tokens(st_line.name)
                     )                                   AS communication_flag
                 FROM account_bank_statement_line st_line
                 LEFT JOIN account_journal journal       ON journal.id =
@@ -228,7 +224,11 @@ class AccountReconcileModel(models.Model):
         """
 
         # Keep only account.move.lines with a ref containing the statement_line ref
-        # strpos() > 0 is an efficient way to check if a substring exists
-        query += " AND strpos(aml.ref, st_line.ref)>0"
+        # LIKE can use the trigram index of aml.ref (see account_move.py),
+        # wildcards of the statement_line ref are escaped.
+        query += r"""
+            AND aml.ref LIKE '%%' || replace(replace(replace(st_line.ref,
+            '\', '\\'), '%%', '\%%'), '_', '\_') || '%%'
+        """
 
         return query, params
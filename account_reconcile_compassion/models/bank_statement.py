@@ -9,7 +9,12 @@
 #
 ##############################################################################
 
-from odoo import api, fields, models
+import logging
+
+from odoo import api, fields, models, _
+from odoo.tools import html_escape
+
+_logger = logging.getLogger(__name__)
 
 
 class AccountStatement(models.Model):
@@ -88,37 +93,86 @@ class AccountStatement(models.Model):
 
     @api.multi
     def auto_reconcile(self):
-        """ Auto reconcile matching invoices through jobs to avoid timeouts
-        Inspired by the `if model.auto_reconcile` part of _apply_rules()"""
+        """ Auto reconcile matching invoices through jobs to avoid timeouts.
+        The statement lines are split in chunks, each processed in its own job.
+        The chunk size can be configured in the settings, and the channel of
+        the jobs in the job function of `_auto_reconcile_lines`."""
+        chunk_size = max(int(
+            self.env["ir.config_parameter"].sudo().get_param(
+                "account_reconcile_compassion.auto_reconcile_chunk_size", 100)
+        ), 1)
+        for bank_statement in self.filtered("line_ids"):
+            line_ids = bank_statement.line_ids.filtered(
+                lambda l: not l.journal_entry_ids).ids
+            for index in range(0, len(line_ids), chunk_size):
+                chunk_ids = line_ids[index:index + chunk_size]
+                bank_statement.with_delay(
+                    description=_("Auto reconcile lines %s to %s of %s") % (
+                        index + 1, index + len(chunk_ids), bank_statement.name)
+                )._auto_reconcile_lines(chunk_ids)
+        return True
+
+    @api.multi
+    def _auto_reconcile_lines(self, line_ids):
+        """ Auto reconcile a chunk of statement lines.
+        Inspired by the `if model.auto_reconcile` part of _apply_rules().
+        A failing line doesn't prevent the others from being reconciled,
+        and the result of the chunk is logged on the statement.
+        :param line_ids: ids of the account.bank.statement.line to reconcile
+        :return: True
+        """
+        self.ensure_one()
         reconcile_model = self.env["account.reconcile.model"].search(
             [("rule_type", "!=", "writeoff_button")]
         )
-
-        for bank_statement in self.filtered("line_ids"):
-            matching_amls = reconcile_model._apply_rules(bank_statement.line_ids)
-
-            for line_id, result in matching_amls.items():
-                if result["aml_ids"]:
-                    line = bank_statement.line_ids.browse(line_id)
-                    move_lines = self.env["account.move.line"].browse(result["aml_ids"])
-
-                    # Check that line wasn't already reconciled
-                    if line.journal_entry_ids:
-                        continue
-
-                    reconcile = reconcile_model._prepare_reconciliation(
-                        line, move_lines)
-
-                    # An open balance is needed but no partner has been found.
-                    if reconcile['open_balance_dict'] is False:
-                        continue
-
-                    new_aml_dicts = reconcile['new_aml_dicts']
-                    if reconcile['open_balance_dict']:
-                        new_aml_dicts.append(reconcile['open_balance_dict'])
-
-                    line.process_reconciliation(
-                        counterpart_aml_dicts=reconcile['counterpart_aml_dicts'],
-                        payment_aml_rec=reconcile['payment_aml_rec'],
-                        new_aml_dicts=new_aml_dicts,
-                    )
+        lines = self.line_ids.browse(line_ids).exists()
+        matching_amls = reconcile_model._apply_rules(lines)
+        reconciled = self.env["account.bank.statement.line"]
+        failures = []
+
+        for line_id, result in matching_amls.items():
+            if result["aml_ids"]:
+                line = lines.browse(line_id)
+                move_lines = self.env["account.move.line"].browse(result["aml_ids"])
+
+                # Check that line wasn't already reconciled
+                if line.journal_entry_ids:
+                    continue
+
+                reconcile = reconcile_model._prepare_reconciliation(
+                    line, move_lines)
+
+                # An open balance is needed but no partner has been found.
+                if reconcile['open_balance_dict'] is False:
+                    continue
+
+                new_aml_dicts = reconcile['new_aml_dicts']
+                if reconcile['open_balance_dict']:
+                    new_aml_dicts.append(reconcile['open_balance_dict'])
+
+                try:
+                    with self.env.cr.savepoint():
+                        # We are already in a job: don't queue another one.
+                        line._process_reconciliation(
+                            counterpart_aml_dicts=reconcile['counterpart_aml_dicts'],
+                            payment_aml_rec=reconcile['payment_aml_rec'],
+                            new_aml_dicts=new_aml_dicts,
+                        )
+                    reconciled += line
+                except Exception as error:
+                    _logger.warning(
+                        "Auto reconciliation of statement line %s failed",
+                        line.id, exc_info=True)
+                    failures.append((line, error))
+
+        body = _("Auto reconciliation: %s of %s lines reconciled.") % (
+            len(reconciled), len(lines))
+        if failures:
+            body += "<br/>" + _("Failed lines:") + "<ul>%s</ul>" % "".join(
+                "<li>%s (%s): %s</li>" % (
+                    html_escape(line.name), html_escape(line.ref or ""),
+                    html_escape(str(error)))
+                for line, error in failures
+            )
+        self.message_post(body=body)
+        return True
@@ -0,0 +1,119 @@
+##############################################################################
+#
+#    Copyright (C) 2022 Compassion CH (http://www.compassion.ch)
+#    Releasing children from poverty in Jesus' name
+#
+#    The licence is in the file __manifest__.py
+#
+##############################################################################
+import json
+from datetime import timedelta
+
+from odoo import api, models, fields
+
+
+class PfCheckoutTransactionCache(models.Model):
+    """ Keeps the merchant references of the PostFinance Checkout transactions
+    of a settlement day, to avoid fetching them again each time the 1015
+    reconcile wizard is used.
+    - Days fetched after they were closed (older than the closing delay)
+      are never fetched again.
+    - Days fetched while still open expire after a time to live, even once
+      they are closed, so that their transactions are complete.
+    """
+
+    _name = "pf.checkout.transaction.cache"
+    _description = "PostFinance Checkout transactions cache"
+    _order = "date desc"
+
+    space_id = fields.Char(required=True, index=True)
+    provider = fields.Char(required=True, index=True)
+    date = fields.Date(required=True, index=True)
+    merchant_references = fields.Text(default="[]")
+    fetch_date = fields.Datetime(default=fields.Datetime.now, required=True)
+
+    _sql_constraints = [
+        ("unique_day", "unique(space_id, provider, date)",
+         "Transactions of a day are cached only once.")
+    ]
+
+    @api.model
+    def get_references(self, space_id, provider, date):
+        """
+        :return: the cached references of the day or None if they must be
+                 fetched.
+        """
+        cache = self.search([
+            ("space_id", "=", str(space_id)),
+            ("provider", "=", provider),
+            ("date", "=", date),
+        ])
+        if not cache:
+            return None
+        if not cache._is_final() and (
+                self._is_closed(date)
+                or cache.fetch_date <= fields.Datetime.now() - self._get_ttl()):
+            return None
+        return json.loads(cache.merchant_references)
+
+    @api.model
+    def set_references(self, space_id, provider, date, references):
+        vals = {
+            "merchant_references": json.dumps(references),
+            "fetch_date": fields.Datetime.now(),
+        }
+        cache = self.search([
+            ("space_id", "=", str(space_id)),
+            ("provider", "=", provider),
+            ("date", "=", date),
+        ])
+        if cache:
+            cache.write(vals)
+        else:
+            vals.update({
+                "space_id": str(space_id),
+                "provider": provider,
+                "date": date,
+            })
+            cache = self.create(vals)
+        return cache
+
+    @api.model
+    def evict_cache(self):
+        """ Cron removing the expired days that were fetched while still open
+        and the days older than the retention period. """
+        params = self.env["ir.config_parameter"].sudo()
+        retention = int(params.get_param(
+            "account_reconcile_compassion.pf_checkout_cache_retention", 365))
+        self.env.cr.execute("""
+            DELETE FROM pf_checkout_transaction_cache
+            WHERE date < %(retention_date)s
+            OR (fetch_date::date <= date + %(closing_days)s
+                AND fetch_date < %(expiry)s)
+        """, {
+            "retention_date": fields.Date.today() - timedelta(days=retention),
+            "closing_days": self._get_closing_days(),
+            "expiry": fields.Datetime.now() - self._get_ttl(),
+        })
+        return True
+
+    @api.multi
+    def _is_final(self):
+        """ Tells if the day was fetched after it was closed. """
+        self.ensure_one()
+        return self.fetch_date.date() > self.date + timedelta(
+            days=self._get_closing_days())
+
+    @api.model
+    def _is_closed(self, date):
+        return date < fields.Date.today() - timedelta(days=self._get_closing_days())
+
+    @api.model
+    def _get_closing_days(self):
+        return int(self.env["ir.config_parameter"].sudo().get_param(
+            "account_reconcile_compassion.pf_checkout_closing_days", 2))
+
+    @api.model
+    def _get_ttl(self):
+        return timedelta(hours=int(self.env["ir.config_parameter"].sudo().get_param(
+            "account_reconcile_compassion.pf_checkout_cache_ttl", 1)))
@@ -23,6 +23,10 @@ class AccountConfigSettings(models.TransientModel):
     currency_exchange_analytic_account = fields.Many2one(
         "account.analytic.account", readonly=False
     )
+    auto_reconcile_chunk_size = fields.Integer(
+        help="Number of statement lines reconciled in each job of the "
+        "auto reconciliation."
+    )
 
     @api.multi
     def set_values(self):
@@ -31,6 +35,10 @@ class AccountConfigSettings(models.TransientModel):
             "account_reconcile_compassion.currency_exchange_analytic_account",
             str(self.currency_exchange_analytic_account.id),
         )
+        self.env["ir.config_parameter"].sudo().set_param(
+            "account_reconcile_compassion.auto_reconcile_chunk_size",
+            str(self.auto_reconcile_chunk_size or 100),
+        )
 
     @api.model
     def get_values(self):
@@ -41,4 +49,9 @@ class AccountConfigSettings(models.TransientModel):
                 "account_reconcile_compassion.currency_exchange_analytic_account"
             )
         )
+        res["auto_reconcile_chunk_size"] = int(
+            param_obj.get_param(
+                "account_reconcile_compassion.auto_reconcile_chunk_size", 100
+            )
+        )
         return res
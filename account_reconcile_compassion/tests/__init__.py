@@ -9,3 +9,4 @@
 
 from . import test_account_reconcile
 from . import test_bank_account_assignation
+from . import test_reconcile_1015
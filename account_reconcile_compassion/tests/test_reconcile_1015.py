@@ -0,0 +1,66 @@
+##############################################################################
+#
+#    Copyright (C) 2022 Compassion CH (http://www.compassion.ch)
+#
+#    The licence is in the file __manifest__.py
+#
+##############################################################################
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from odoo.tests import TransactionCase
+
+from ..wizards.reconcile_1015_wizard import Provider
+
+
+class RecordedTransactionService:
+    """ Stand-in for the PostFinance TransactionServiceApi, replaying
+    recorded transactions instead of calling the API. """
+
+    def __init__(self, merchant_references):
+        self.merchant_references = merchant_references
+        self.search_count = 0
+
+    def search(self, space_id, pf_filter):
+        self.search_count += 1
+        return [SimpleNamespace(merchant_reference=ref)
+                for ref in self.merchant_references]
+
+
+class TestReconcile1015(TransactionCase):
+    def setUp(self):
+        super().setUp()
+        self.wizard = self.env["reconcile.1015.wizard"].create({})
+        self.service = RecordedTransactionService(["TEMPTR-1234-1", "5678-2"])
+        patcher = patch.object(
+            type(self.wizard), "get_pf_service", return_value=(self.service, 1))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_closed_days_are_fetched_once(self):
+        key = (Provider.TWINT, datetime.today() - timedelta(days=30))
+        for _i in range(2):
+            references = self.wizard._fetch_pf_references([key])
+            self.assertEqual(references[key], ["1234", "5678"])
+        self.assertEqual(self.service.search_count, 1)
+
+    def test_open_days_expire(self):
+        key = (Provider.TWINT, datetime.today())
+        self.wizard._fetch_pf_references([key])
+        self.env["ir.config_parameter"].sudo().set_param(
+            "account_reconcile_compassion.pf_checkout_cache_ttl", 0)
+        self.wizard._fetch_pf_references([key])
+        self.assertEqual(self.service.search_count, 2)
+
+    def test_days_fetched_while_open_are_fetched_again(self):
+        day = datetime.today() - timedelta(days=30)
+        key = (Provider.TWINT, day)
+        self.wizard._fetch_pf_references([key])
+        # The day was fetched the day after, before it was closed
+        cache = self.env["pf.checkout.transaction.cache"].search([
+            ("date", "=", day.date())])
+        cache.fetch_date = day + timedelta(days=1)
+        for _i in range(2):
+            self.wizard._fetch_pf_references([key])
+        self.assertEqual(self.service.search_count, 2)
@@ -7,12 +7,15 @@
 #    The licence is in the file __manifest__.py
 #
 ##############################################################################
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from enum import Enum
 from postfinancecheckout import Configuration
 from postfinancecheckout.api.transaction_service_api import TransactionServiceApi
 
 from odoo import api, models, fields, _
+from odoo.osv import expression
 from odoo.tools import ormcache
 
 
@@ -54,20 +57,54 @@ class ReconcileFundWizard(models.TransientModel):
         string="Leftover donations",
         readonly=True
     )
+    dry_run = fields.Boolean(
+        help="Only report the entries that would be reconciled, without "
+        "reconciling them."
+    )
+    matched_debit_line_ids = fields.Many2many(
+        "account.move.line", "reconcile_1015_matched_debit",
+        string="Matched donations", readonly=True
+    )
 
     def reconcile_1015(self):
         mvl_obj = self.env["account.move.line"]
+        # Clear results of a previous dry run
+        self.write({
+            "full_reconcile_line_ids": [(5, 0, 0)],
+            "partial_reconcile_line_ids": [(5, 0, 0)],
+            "missing_donation_line_ids": [(5, 0, 0)],
+            "matched_debit_line_ids": [(5, 0, 0)],
+        })
         credit_lines = mvl_obj.search([
             ("account_id", "=", self.account_id.id),
             ("full_reconcile_id", "=", False),
             ("credit", ">", 0),
             ("date", ">=", "2022-02-09")  # Date of activation of pf_checkout
         ])
+        # Transactions are grouped by provider and settlement date: fetch them
+        # once for each group and match all references at once.
+        credit_groups = defaultdict(lambda: mvl_obj)
         for cl in credit_lines:
-            self.reconcile_using_pf_checkout(cl)
+            transactions_key = self._get_transactions_key(cl)
+            if transactions_key:
+                credit_groups[transactions_key] += cl
+        refs_by_group = self._fetch_pf_references(list(credit_groups))
+        debit_lines_by_ref = self._search_debit_lines_by_ref(
+            {ref for refs in refs_by_group.values() for ref in refs})
+
+        matched_debit_lines = mvl_obj
+        for transactions_key, group_credit_lines in credit_groups.items():
+            for cl in group_credit_lines:
+                debit_match = mvl_obj
+                for ref in refs_by_group[transactions_key]:
+                    debit_match |= debit_lines_by_ref[ref]
+                # Lines reconciled with a previous credit are no more available
+                debit_match -= matched_debit_lines
+                matched_debit_lines |= debit_match
+                self.reconcile_using_pf_checkout(cl, debit_match)
 
         # Compute results
-        if self.partial_reconcile_line_ids:
+        if self.partial_reconcile_line_ids and not self.dry_run:
             oldest_credit = min(self.partial_reconcile_line_ids.mapped("date"))
             self.missing_donation_line_ids = mvl_obj.search([
                 ("account_id", "=", self.account_id.id),
@@ -76,6 +113,24 @@ class ReconcileFundWizard(models.TransientModel):
                 ("date", "<=", fields.Date.to_string(oldest_credit)),
                 ("date", ">=", "2022-02-09")  # Date of activation of pf_checkout
             ]).filtered(lambda m: not m.matched_credit_ids)
+        if self.dry_run:
+            self.matched_debit_line_ids = matched_debit_lines
+            self.env.user.notify_info(
+                message=_("Dry run: %s entries would be fully reconciled and "
+                          "%s partially reconciled")
+                % (len(self.full_reconcile_line_ids),
+                   len(self.partial_reconcile_line_ids)),
+                sticky=True
+            )
+            return {
+                "type": "ir.actions.act_window",
+                "view_mode": "form",
+                "view_type": "form",
+                "res_model": self._name,
+                "res_id": self.id,
+                "target": "new",
+                "context": self.env.context,
+            }
         if self.full_reconcile_line_ids:
             self.env.user.notify_success(
                 message=_("Successfully reconciled %s entries")
@@ -101,11 +156,45 @@ class ReconcileFundWizard(models.TransientModel):
         }
 
     @api.multi
-    def reconcile_using_pf_checkout(self, move_line):
+    def reconcile_using_pf_checkout(self, move_line, debit_match=None):
+        """
+        Reconcile a credit line with the debit lines of the PostFinance
+        transactions of the same settlement date.
+        :param move_line: credit account.move.line
+        :param debit_match: debit account.move.line to reconcile. If not
+                            given, the transactions are fetched for the line.
+        :return: True if the line could be reconciled
+        """
+        if debit_match is None:
+            transactions_key = self._get_transactions_key(move_line)
+            if not transactions_key:
+                return False
+            refs = self._fetch_pf_references([transactions_key])[transactions_key]
+            debit_match = self.env["account.move.line"]
+            for debit_lines in self._search_debit_lines_by_ref(refs).values():
+                debit_match |= debit_lines
+        # Perform a partial or full reconcile
+        if not self.dry_run:
+            (move_line + debit_match).reconcile()
+        if sum(debit_match.mapped("debit")) == move_line.credit:
+            self.full_reconcile_line_ids += move_line
+        else:
+            self.partial_reconcile_line_ids += move_line
+        return True
+
+    @api.model
+    def _get_transactions_key(self, move_line):
+        """
+        Finds the provider and the date of the PostFinance transactions
+        settled by a credit line.
+        :param move_line: credit account.move.line
+        :return: (Provider, datetime) or None if the line is not recognized
+        """
         # Transactions are grouped by dates
         date_position = -1
         date_length = 8
         search_days_delta = 0
+        provider = None
         if Provider.WORLDLINE.value in move_line.name:
             date_position = self._search_in_credit_string(move_line, "REFERENCES: ")
             search_days_delta = -9
@@ -123,31 +212,80 @@ class ReconcileFundWizard(models.TransientModel):
             date_length = 10
             provider = Provider.E_FINANCE
         if date_position == -1:
-            self.missing_line_ids += move_line
-            return False
+            return None
         date_transactions = datetime.strptime(
             move_line.name[date_position:date_position + date_length],
             "%Y%m%d" if date_length == 8 else "%d.%m.%Y"
         ) + timedelta(days=search_days_delta)
+        return provider, date_transactions
+
+    @api.model
+    def _fetch_pf_references(self, transactions_keys):
+        """
+        Fetches the merchant references of the PostFinance transactions of
+        each given provider and date. The days found in the transactions
+        cache are not fetched again. The other searches are run concurrently,
+        the number of parallel requests can be set with the system parameter
+        account_reconcile_compassion.pf_checkout_workers (default: 4).
+        :param transactions_keys: list of (Provider, datetime)
+        :return: dict {(Provider, datetime): list of references}
+        """
         pf_service, space_id = self.get_pf_service()
-        debit_match = self.env["account.move.line"]
-        pf_filter = self.get_pf_filter(date_transactions, provider)
-        for transaction in pf_service.search(space_id, pf_filter):
+        cache_obj = self.env["pf.checkout.transaction.cache"].sudo()
+        references = {}
+        to_fetch = []
+        for transactions_key in transactions_keys:
+            provider, date_transactions = transactions_key
+            cached = cache_obj.get_references(
+                space_id, provider.name, date_transactions.date())
+            if cached is None:
+                to_fetch.append(transactions_key)
+            else:
+                references[transactions_key] = cached
+
+        def search_references(transactions_key):
+            date_transactions, provider = transactions_key[1], transactions_key[0]
+            pf_filter = self.get_pf_filter(date_transactions, provider)
             # Some references have this TEMPTR- prefix that should be ignored
-            ref = transaction.merchant_reference.replace("TEMPTR-", "").split("-")[0]
-            debit_match += self.env["account.move.line"].search([
-                ("ref", "like", ref),
-                ("debit", ">", 0),
-                ("full_reconcile_id", "=", False),
-                ("account_id", "=", self.account_id.id)
-            ]).filtered(lambda m: not m.matched_credit_ids)
-        # Perform a partial or full reconcile
-        (move_line + debit_match).reconcile()
-        if sum(debit_match.mapped("debit")) == move_line.credit:
-            self.full_reconcile_line_ids += move_line
-        else:
-            self.partial_reconcile_line_ids += move_line
-        return True
+            return [
+                transaction.merchant_reference.replace("TEMPTR-", "").split("-")[0]
+                for transaction in pf_service.search(space_id, pf_filter)
+            ]
+
+        if to_fetch:
+            max_workers = int(self.env["ir.config_parameter"].sudo().get_param(
+                "account_reconcile_compassion.pf_checkout_workers", 4))
+            with ThreadPoolExecutor(max_workers=max(max_workers, 1)) as executor:
+                fetched = dict(zip(
+                    to_fetch, executor.map(search_references, to_fetch)))
+            for (provider, date_transactions), refs in fetched.items():
+                cache_obj.set_references(
+                    space_id, provider.name, date_transactions.date(), refs)
+            references.update(fetched)
+        return references
+
+    @api.multi
+    def _search_debit_lines_by_ref(self, refs):
+        """
+        Finds the open debit lines of the account having a reference that
+        contains each given merchant reference, in one query.
+        :param refs: iterable of merchant references
+        :return: dict {ref: account.move.line recordset}
+        """
+        mvl_obj = self.env["account.move.line"]
+        refs = list(set(refs))
+        if not refs:
+            return {}
+        debit_lines = mvl_obj.search(expression.AND([
+            expression.OR([[("ref", "like", ref)] for ref in refs]),
+            [("debit", ">", 0),
+             ("full_reconcile_id", "=", False),
+             ("account_id", "=", self.account_id.id)],
+        ])).filtered(lambda m: not m.matched_credit_ids)
+        return {
+            ref: debit_lines.filtered(lambda m: ref in (m.ref or ""))
+            for ref in refs
+        }
 
     @api.model
     def _search_in_credit_string(self, move_line, search_string):
@@ -156,13 +294,23 @@ class ReconcileFundWizard(models.TransientModel):
             string_position += len(search_string)
         return string_position
 
-    @ormcache()
     def get_pf_service(self):
+        """ The API host can be replaced with the system parameter
+        account_reconcile_compassion.pf_checkout_host, for instance to use a
+        local server replaying recorded transactions. """
+        pf_host = self.env["ir.config_parameter"].sudo().get_param(
+            "account_reconcile_compassion.pf_checkout_host")
+        return self._get_pf_service(pf_host or None)
+
+    @ormcache("pf_host")
+    def _get_pf_service(self, pf_host):
         pf_acquirer = self.env.ref(
             "payment_postfinance_flex.payment_acquirer_postfinance")
         config = Configuration(
             user_id=pf_acquirer.postfinance_api_userid,
             api_secret=pf_acquirer.postfinance_api_application_key)
+        if pf_host:
+            config.host = pf_host
         return TransactionServiceApi(configuration=config),\
             pf_acquirer.postfinance_api_spaceid
 
@@ -8,10 +8,12 @@
 #
 ##############################################################################
 import logging
+import time
 
-from datetime import date
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
 
-from odoo import api, models
+from odoo import api, models, fields
 from odoo.tools import relativedelta
 from odoo.addons.child_compassion.models.compassion_hold import HoldType
 
@@ -23,6 +25,10 @@ logger = logging.getLogger(__name__)
 class CompassionChild(models.Model):
     _inherit = "compassion.child"
 
+    infos_refresh_date = fields.Datetime(
+        readonly=True, help="Last time the information were refreshed from GMC "
+        "before putting the child on Wordpress.")
+
     @api.multi
     def add_to_wordpress(self, company_id=None):
         in_two_years = date.today() + relativedelta(years=2)
@@ -46,7 +52,12 @@ class CompassionChild(models.Model):
             )
 
         wp_config = self.env["wordpress.configuration"].get_config(company_id)
-        wp = WPSync(wp_config)
+        params = self.env["ir.config_parameter"].sudo()
+        wp = WPSync(
+            wp_config,
+            batch_size=int(params.get_param("child_sync_wp.upload_batch_size", 10)),
+            max_workers=int(params.get_param("child_sync_wp.upload_workers", 3)),
+        )
         return wp.upload_children(valid_children)
 
     @api.multi
@@ -128,13 +139,54 @@ class CompassionChild(models.Model):
         return global_pool
 
     def _update_information_and_filter_invalid(self, children):
-        for child in children:
-            try:
-                child.get_infos()
-                child.mapped("project_id").update_informations()
-            except:
-                logger.error("Error updating child information: ", exc_info=True)
-                continue
+        """
+        Refresh the information of the children and their projects from GMC.
+        - Projects shared by several children are refreshed only once.
+        - Children and projects refreshed recently are skipped
+          (system parameter child_sync_wp.refresh_max_age, in hours).
+        - The requests are sent in parallel
+          (system parameter child_sync_wp.refresh_workers, 1 to disable).
+        """
+        params = self.env["ir.config_parameter"].sudo()
+        max_age = int(params.get_param("child_sync_wp.refresh_max_age", 24))
+        workers = int(params.get_param("child_sync_wp.refresh_workers", 4))
+        # New cursors can't see the data of the test transaction
+        concurrent = workers > 1 and not self.pool.in_test_mode()
+        if concurrent:
+            # Make the held children visible to the workers' cursors
+            self.env.cr.commit()
+
+        outdated = fields.Datetime.now() - timedelta(hours=max_age)
+
+        def to_refresh(records):
+            return records.filtered(
+                lambda r: not r.infos_refresh_date or r.infos_refresh_date < outdated)
+
+        for stage, method in (("children", "get_infos"),
+                              ("projects", "update_informations")):
+            start = time.time()
+            if stage == "children":
+                records = to_refresh(children)
+            else:
+                records = to_refresh(children.mapped("project_id"))
+            if concurrent:
+                self._refresh_concurrently(records, method, workers)
+                self.invalidate_cache()
+            else:
+                for record in records:
+                    try:
+                        getattr(record, method)()
+                        record.infos_refresh_date = fields.Datetime.now()
+                    except:
+                        logger.error(
+                            "Error updating child information: ", exc_info=True)
+                        continue
+            logger.info(
+                "Refreshed %s %s from GMC in %.2f seconds (%s skipped)",
+                len(records), stage, time.time() - start,
+                len(children if stage == "children" else
+                    children.mapped("project_id")) - len(records),
+            )
         return children.filtered(
             lambda c: c.state == "N"
             and c.desc_it
@@ -142,6 +194,35 @@ class CompassionChild(models.Model):
             and c.project_id.description_it
         )
 
+    def _refresh_concurrently(self, records, method, workers):
+        """
+        Call the given method on each record, in parallel threads having
+        their own cursor. Each record is committed independently.
+        :param records: compassion.child or compassion.project recordset
+        :param method: name of the method refreshing the record
+        :param workers: maximum number of threads
+        :return: number of records refreshed
+        """
+        model = records._name
+        uid = self.env.uid
+        context = self.env.context
+
+        def refresh(record_id):
+            with api.Environment.manage(), self.pool.cursor() as cr:
+                record = api.Environment(cr, uid, context)[model].browse(record_id)
+                try:
+                    getattr(record, method)()
+                    record.infos_refresh_date = fields.Datetime.now()
+                    return True
+                except:
+                    cr.rollback()
+                    logger.error(
+                        "Error updating child information: ", exc_info=True)
+                    return False
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return sum(executor.map(refresh, records.ids))
+
     def _hold_children(self, global_pool):
         hold_wizard = (
             global_pool.env["child.hold.wizard"]
@@ -168,16 +249,13 @@ class CompassionChild(models.Model):
         try:
             with self.env.cr.savepoint():
                 old_children.force_remove_from_wordpress(company_id)
-                # Put children 5 by 5 to avoid delays
-                for i in range(0, len(new_children), 5):
-                    try:
-                        new_children[i: i + 5].add_to_wordpress(company_id)
-                    except:
-                        logger.error(
-                            "Failed adding a batch of children to" " wordpress: ",
-                            exc_info=True,
-                        )
-                        continue
+                # Children are sent by batches (see WPSync.publish_children)
+                try:
+                    new_children.add_to_wordpress(company_id)
+                except:
+                    logger.error(
+                        "Failed adding children to wordpress: ", exc_info=True
+                    )
 
                 old_children.mapped("hold_id").release_hold()
         except:
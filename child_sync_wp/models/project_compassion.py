@@ -7,7 +7,7 @@
 #    The licence is in the file __manifest__.py
 #
 ##############################################################################
-from odoo import models
+from odoo import models, fields
 
 from ..tools.wp_sync import WPSync
 
@@ -15,6 +15,10 @@ from ..tools.wp_sync import WPSync
 class CompassionProject(models.Model):
     _inherit = "compassion.project"
 
+    infos_refresh_date = fields.Datetime(
+        readonly=True, help="Last time the information were refreshed from GMC "
+        "before putting children on Wordpress.")
+
     def suspend_funds(self):
         """ Remove children from the website when FCP Suspension occurs. """
         children = self.env["compassion.child"].search(
@@ -8,8 +8,12 @@
 #
 ##############################################################################
 import logging
+import threading
 
-from xmlrpc.client import ServerProxy, SafeTransport, GzipDecodedResponse
+from concurrent.futures import ThreadPoolExecutor
+from xmlrpc.client import (
+    ServerProxy, SafeTransport, GzipDecodedResponse, MultiCall, Fault
+)
 
 _logger = logging.getLogger(__name__)
 
@@ -47,12 +51,19 @@ class CustomTransport(SafeTransport):
 
 
 class WPSync(object):
-    def __init__(self, wp_config):
-        self.xmlrpc_server = ServerProxy(
-            "https://" + wp_config.host + "/xmlrpc.php", transport=CustomTransport()
-        )
+    def __init__(self, wp_config, batch_size=10, max_workers=3):
+        """
+        :param wp_config: wordpress.configuration record
+        :param batch_size: number of children sent in one XMLRPC request
+        :param max_workers: number of requests sent in parallel
+        """
+        self.url = "https://" + wp_config.host + "/xmlrpc.php"
+        self.xmlrpc_server = ServerProxy(self.url, transport=CustomTransport())
         self.user = wp_config.user
         self.pwd = wp_config.password
+        self.batch_size = max(batch_size, 1)
+        self.max_workers = max(max_workers, 1)
+        self._local = threading.local()
 
     def test_xmlrpc(self):
         return self.xmlrpc_server.demo.sayHello()
@@ -65,45 +76,14 @@ class WPSync(object):
         not uploaded as file anymore
 
         :param children: compassion.child recordset
-        :return: result of xmlrpc call to wordpress (true/false)
+        :return: number of children imported
         """
-        count_insert = 0
-
-        for child in children:
-            _logger.info(
-                "Pushing child %s/%s",
-                count_insert + 1, len(children)
-            )
-            try:
-                child_values = {
-                    "local_id": child.local_id,
-                    "number": child.local_id,
-                    "first_name": child.preferred_name,
-                    "name": child.name,
-                    "full_name": child.name,
-                    "birthday": child.birthdate,
-                    "gender": child.gender,
-                    # CO-1003 in case child has no unsponsored_since date,
-                    # we use allocation date
-                    "start_date": child.unsponsored_since or child.date,
-                    "desc": child.desc_fr,
-                    "desc_de": child.desc_de,
-                    "desc_it": child.desc_it,
-                    "country": child.project_id.country_id.name,
-                    "project": child.project_id.description_fr,
-                    "project_de": child.project_id.description_de,
-                    "project_it": child.project_id.description_it,
-                    "cloudinary_url": child.image_url,
-                }
-                if self.xmlrpc_server.child_import.addChild(
-                        self.user, self.pwd, child_values
-                ):
-                    count_insert += 1
-                    child.state = "I"
-                    children.env.cr.commit()
-            except:
-                children.env.clear()
-                _logger.error("Child Upload failed: ", exc_info=True)
+        results = self.publish_children(children)
+        count_insert = len([res for res in results.values() if res])
+        uploaded = children.filtered(lambda c: results.get(c.id))
+        if uploaded:
+            uploaded.write({"state": "I"})
+            children.env.cr.commit()
 
         if count_insert == len(children):
             _logger.info(
@@ -123,6 +103,87 @@ class WPSync(object):
 
         return count_insert
 
+    def publish_children(self, children):
+        """ Send children to Wordpress by batches (with XMLRPC multicall),
+        the batches being sent in parallel. No record is modified.
+
+        :param children: compassion.child recordset
+        :return: dict {child_id: True if child was imported}
+        """
+        results = {child.id: False for child in children}
+        # Read all data before sending it, as records can't be used in threads.
+        to_publish = []
+        for child in children:
+            try:
+                to_publish.append((child.id, self._get_child_values(child)))
+            except:
+                _logger.error("Child Upload failed: ", exc_info=True)
+        batches = [
+            to_publish[i: i + self.batch_size]
+            for i in range(0, len(to_publish), self.batch_size)
+        ]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for batch_results in executor.map(self._publish_batch, batches):
+                results.update(batch_results)
+        return results
+
+    def _publish_batch(self, batch):
+        """ Send a batch of children in one XMLRPC request.
+        :param batch: list of (child_id, child_values)
+        :return: dict {child_id: True if child was imported}
+        """
+        _logger.info("Pushing %s children on Wordpress", len(batch))
+        results = {}
+        multicall = MultiCall(self._get_server_proxy())
+        for child_id, child_values in batch:
+            multicall.child_import.addChild(self.user, self.pwd, child_values)
+        try:
+            multicall_results = multicall()
+        except:
+            _logger.error("Child Upload failed: ", exc_info=True)
+            return {child_id: False for child_id, child_values in batch}
+        for index, (child_id, child_values) in enumerate(batch):
+            try:
+                results[child_id] = bool(multicall_results[index])
+            except Fault:
+                _logger.error(
+                    "Child Upload failed for %s: ", child_values["local_id"],
+                    exc_info=True)
+                results[child_id] = False
+        return results
+
+    def _get_server_proxy(self):
+        """ Each thread keeps its own connection to Wordpress, which is reused
+        for all batches it sends. """
+        server = getattr(self._local, "server", None)
+        if server is None:
+            server = ServerProxy(self.url, transport=CustomTransport())
+            self._local.server = server
+        return server
+
+    @staticmethod
+    def _get_child_values(child):
+        return {
+            "local_id": child.local_id,
+            "number": child.local_id,
+            "first_name": child.preferred_name,
+            "name": child.name,
+            "full_name": child.name,
+            "birthday": child.birthdate,
+            "gender": child.gender,
+            # CO-1003 in case child has no unsponsored_since date,
+            # we use allocation date
+            "start_date": child.unsponsored_since or child.date,
+            "desc": child.desc_fr,
+            "desc_de": child.desc_de,
+            "desc_it": child.desc_it,
+            "country": child.project_id.country_id.name,
+            "project": child.project_id.description_fr,
+            "project_de": child.project_id.description_de,
+            "project_it": child.project_id.description_it,
+            "cloudinary_url": child.image_url,
+        }
+
     def remove_children(self, children):
         try:
             res = self.xmlrpc_server.child_import.deleteChildren(
@@ -69,19 +69,15 @@ class HomepageController(Controller):
                 "name": fund.crowdfunding_impact_text_active,
                 "description": fund.crowdfunding_description,
                 "icon_image": fund.image_medium or SPONSOR_ICON,
-                # the header is a small image so we can compress it to save space
-                "header_image":
-                    compress_big_images(
-                        fund.image_large,
-                        max_width=400
-                    ) if fund.image_large else SPONSOR_HEADER,
+                "header_image": fund.image_header or SPONSOR_HEADER,
             })
 
-        for project in current_year_projects:
-            impact["sponsorship"]["value"] += project.number_sponsorships_reached
-            project_fund = project.product_id.name
-            if project_fund in impact:
-                impact[project_fund]["value"] += project.product_number_reached
+        sponsorships, fund_numbers = request.env[
+            "crowdfunding.project.impact"].get_year_totals(current_year_projects)
+        impact["sponsorship"]["value"] += sponsorships
+        for fund_name, number in fund_numbers.items():
+            if fund_name in impact:
+                impact[fund_name]["value"] += number
 
         for fund in funds_used:
             impact_val = impact[fund.name]["value"]
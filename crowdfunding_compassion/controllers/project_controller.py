@@ -1,14 +1,20 @@
+import base64
 from datetime import datetime
 
 from babel.dates import format_timedelta
 
 from odoo import _
+from odoo.tools.mimetypes import guess_mimetype
 from odoo.addons.http_routing.models.ir_http import slug
 from odoo.addons.website.models.ir_http import sitemap_qs2dom
 from odoo.http import request, route, Controller
 from odoo.addons.crowdfunding_compassion.controllers.\
     homepage_controller import sponsorship_card_content
 import werkzeug
+from werkzeug.urls import url_encode
+
+# Number of impact tiles loaded at once on the project and participant pages
+IMPACT_PAGE_SIZE = 20
 
 
 class ProjectController(Controller):
@@ -64,18 +70,15 @@ class ProjectController(Controller):
         project = participant.project_id.sudo()
         if not project.website_published:
             return request.redirect("/projects")
-        sponsorships, donations = self.get_sponsorships_and_donations(
-            project.sponsorship_ids.filtered(
-                lambda s: s.user_id == participant.partner_id),
-            project.invoice_line_ids.filtered(
-                lambda line: line.user_id == participant.partner_id
-            )
-        )
+        impact, impact_cursor = self.get_impact(
+            project, participant.partner_id)
         values = {
             "participant": participant.sudo(),
             "main_object": participant.sudo(),
             "project": project,
-            "impact": self.get_impact(sponsorships, donations),
+            "impact": impact,
+            "impact_url": self._get_impact_url(
+                project, participant, impact_cursor),
             "model": "participant",
             "base_url": request.website.domain,
             "page": 2  # for jump to step 2 if donate from participant page
@@ -83,13 +86,12 @@ class ProjectController(Controller):
         return request.render("crowdfunding_compassion.presentation_page", values)
 
     def _prepare_project_values(self, project, page, **kwargs):
-        sponsorships, donations = self.get_sponsorships_and_donations(
-            project.sponsorship_ids, project.invoice_line_ids)
-
+        impact, impact_cursor = self.get_impact(project)
         return {
             "project": project,
             "main_object": project,
-            "impact": self.get_impact(sponsorships, donations),
+            "impact": impact,
+            "impact_url": self._get_impact_url(project, None, impact_cursor),
             "fund": project.product_id,
             "sponsorship_card_content": sponsorship_card_content(),
             "participant": project.owner_participant_id,
@@ -104,7 +106,8 @@ class ProjectController(Controller):
                 "type": "sponsorship",
                 "color": "blue",
                 "text": _("%s was sponsored") % sponsorship.child_id.preferred_name,
-                "image": sponsorship.child_id.portrait,
+                "id": sponsorship.id,
+                "image": f"/project/impact/sponsorship/{sponsorship.id}/image",
                 "benefactor": sponsorship.correspondent_id.firstname,
                 "date": sponsorship.create_date,
                 "time_ago": self.get_time_ago(sponsorship.create_date),
@@ -128,7 +131,8 @@ class ProjectController(Controller):
                 "type": "donation",
                 "color": "grey",
                 "text": f"{int(quantity)} {impact_text}",
-                "image": donation.product_id.image_small,
+                "id": donation.id,
+                "image": f"/project/impact/fund/{product.id}/image",
                 "benefactor": donation.invoice_id.partner_id.firstname,
                 "date": donation.invoice_id.create_date,
                 "time_ago": self.get_time_ago(donation.invoice_id.create_date),
@@ -137,9 +141,91 @@ class ProjectController(Controller):
             })
         return sponsorships, donations
 
-    def get_impact(self, sponsorships, donations):
-        # Chronological list of sponsorships and fund donations for impact display
-        return sorted(sponsorships + donations, key=lambda x: x["date"], reverse=True)
+    def get_impact(self, project, partner=None, cursor=None):
+        """
+        Chronological page of sponsorships and fund donations for impact
+        display. Only the records of the page are read.
+        :param project: crowdfunding.project record (sudo)
+        :param partner: res.partner of the participant, to show only his impact
+        :param cursor: cursor of the page to load, None for the first page
+        :return: tuple (list of tiles, cursor of the next page or None)
+        """
+        rows, next_cursor = project.get_impact_timeline_rows(
+            partner, IMPACT_PAGE_SIZE, cursor)
+        ids = {"sponsorship": [], "donation": []}
+        for row_type, row_id, date in rows:
+            ids[row_type].append(row_id)
+        sponsorships, donations = self.get_sponsorships_and_donations(
+            project.env["recurring.contract"].browse(ids["sponsorship"]),
+            project.env["account.invoice.line"].browse(ids["donation"]))
+        tiles = {(tile["type"], tile["id"]): tile
+                 for tile in sponsorships + donations}
+        return [tiles[row_type, row_id] for row_type, row_id, date in rows], \
+            next_cursor
+
+    def _get_impact_url(self, project, participant, cursor):
+        """ URL loading the next impact tiles, or None if all are shown. """
+        if not cursor:
+            return None
+        params = {"cursor": cursor}
+        if participant:
+            params["participant_id"] = participant.id
+        return f"/project/{project.id}/impact?{url_encode(params)}"
+
+    @route("/project/<int:project_id>/impact", type="http", auth="public",
+           website=True, sitemap=False)
+    def impact_page(self, project_id, cursor=None, participant_id=None, **kw):
+        """ Next impact tiles of a project page, loaded when scrolling. """
+        project = request.env["crowdfunding.project"].sudo().browse(project_id)
+        if not project.exists() or not project.website_published or \
+                not project.can_access_from_current_website():
+            raise werkzeug.exceptions.NotFound()
+        participant = request.env["crowdfunding.participant"]
+        if participant_id:
+            participant = participant.sudo().browse(int(participant_id))
+            if participant.project_id != project:
+                raise werkzeug.exceptions.NotFound()
+        impact, impact_cursor = self.get_impact(
+            project, participant.partner_id or None, cursor)
+        return request.render("crowdfunding_compassion.impact_tiles", {
+            "impact": impact,
+            "impact_url": self._get_impact_url(
+                project, participant, impact_cursor),
+        })
+
+    @route("/project/impact/<string:source>/<int:res_id>/image", type="http",
+           auth="public", sitemap=False)
+    def impact_image(self, source, res_id, **kw):
+        """
+        Image of an impact tile, given by URL so that the pages don't embed
+        the images. Only the children and funds of published projects are
+        served.
+        :param source: sponsorship (child portrait) or fund (product image)
+        """
+        project_obj = request.env["crowdfunding.project"].sudo()
+        image = False
+        if source == "sponsorship":
+            sponsorship = request.env["recurring.contract"].sudo().browse(res_id)
+            if sponsorship.exists() and project_obj.search_count([
+                ("campaign_id", "=", sponsorship.campaign_id.id),
+                ("website_published", "=", True),
+            ]):
+                image = sponsorship.child_id.portrait
+        elif source == "fund":
+            product = request.env["product.product"].sudo().browse(res_id)
+            if product.exists() and project_obj.search_count([
+                ("product_id", "=", product.id),
+                ("website_published", "=", True),
+            ]):
+                image = product.image_small
+        if not image:
+            raise werkzeug.exceptions.NotFound()
+        content = base64.b64decode(image)
+        return request.make_response(content, [
+            ("Content-Type", guess_mimetype(content, default="image/png")),
+            ("Content-Length", len(content)),
+            ("Cache-Control", "public, max-age=86400"),
+        ])
 
     # Utils
     def get_time_ago(self, given_date):
@@ -2,6 +2,9 @@ from . import event_compassion
 from . import crowdfunding_participant
 from . import crowdfunding_project
 from . import product_template
+from . import account_invoice
 from . import account_invoice_line
+from . import crowdfunding_project_impact
+from . import recurring_contract
 from . import res_partner
 from . import staff_notification_settings
@@ -0,0 +1,17 @@
+#    Copyright (C) 2022 Compassion CH
+
+from odoo import models, api
+
+
+class AccountInvoice(models.Model):
+    _inherit = "account.invoice"
+
+    @api.multi
+    def write(self, vals):
+        res = super().write(vals)
+        if "state" in vals:
+            projects = self.mapped(
+                "invoice_line_ids.crowdfunding_participant_id.project_id")
+            if projects:
+                self.env["crowdfunding.project.impact"].refresh(projects)
+        return res
@@ -3,6 +3,10 @@
 
 from odoo import models, fields, api
 
+# Fields changing the donations counted in crowdfunding projects
+IMPACT_FIELDS = {
+    "crowdfunding_participant_id", "quantity", "price_unit", "discount"}
+
 
 class AccountInvoiceLine(models.Model):
     _inherit = "account.invoice.line"
@@ -36,6 +40,25 @@ class AccountInvoiceLine(models.Model):
             vals["account_analytic_id"] = analytic.id
         return super().create(vals)
 
+    @api.multi
+    def write(self, vals):
+        if not IMPACT_FIELDS.intersection(vals):
+            return super().write(vals)
+        projects = self.mapped("crowdfunding_participant_id.project_id")
+        res = super().write(vals)
+        projects |= self.mapped("crowdfunding_participant_id.project_id")
+        if projects:
+            self.env["crowdfunding.project.impact"].refresh(projects)
+        return res
+
+    @api.multi
+    def unlink(self):
+        projects = self.mapped("crowdfunding_participant_id.project_id")
+        res = super().unlink()
+        if projects:
+            self.env["crowdfunding.project.impact"].refresh(projects)
+        return res
+
     @api.onchange("crowdfunding_participant_id")
     def _update_utm_data(self):
         if self.crowdfunding_participant_id:
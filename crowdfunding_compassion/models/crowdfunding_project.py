@@ -268,21 +268,14 @@ class CrowdfundingProject(models.Model):
 
     @api.multi
     def _compute_product_number_reached(self):
-        # Compute with SQL query for good performance
-        self.env.cr.execute("""
-            SELECT p.id, SUM(il.price_total), SUM(il.quantity)
-            FROM account_invoice_line il
-            JOIN crowdfunding_participant pa ON pa.id = il.crowdfunding_participant_id
-            JOIN crowdfunding_project p ON p.id = pa.project_id
-            WHERE il.state = 'paid'
-            AND p.id = ANY(%s)
-            GROUP BY p.id
-        """, [self.ids])
-        results = {r[0]: (r[1], r[2]) for r in self.env.cr.fetchall()}
+        # Read the materialized impact for good performance
+        impacts = self.env["crowdfunding.project.impact"].get_impacts(
+            self.filtered(lambda p: p.id))
+        impact_by_project = {impact.project_id.id: impact for impact in impacts}
         for project in self:
-            res = results.get(project.id, (0, 0))
-            project.amount_reached = round(res[0])
-            project.product_number_reached = round(res[1])
+            impact = impact_by_project.get(project.id)
+            project.amount_reached = impact.amount if impact else 0
+            project.product_number_reached = impact.product_number if impact else 0
 
     @api.multi
     def _compute_number_sponsorships_goal(self):
@@ -301,8 +294,13 @@ class CrowdfundingProject(models.Model):
 
     @api.multi
     def _compute_number_sponsorships_reached(self):
+        impacts = self.env["crowdfunding.project.impact"].get_impacts(
+            self.filtered(lambda p: p.id))
+        impact_by_project = {impact.project_id.id: impact for impact in impacts}
         for project in self:
-            project.number_sponsorships_reached = len(project.sponsorship_ids)
+            impact = impact_by_project.get(project.id)
+            project.number_sponsorships_reached = \
+                impact.number_sponsorships if impact else 0
 
     @api.multi
     def _compute_website_url(self):
@@ -337,6 +335,69 @@ class CrowdfundingProject(models.Model):
                 ("crowdfunding_participant_id", "in", project.participant_ids.ids)
             ])
 
+    @api.multi
+    def get_impact_timeline_rows(self, partner=None, limit=20, cursor=None):
+        """
+        Chronological feed of the sponsorships and paid donations of the
+        project, most recent first, read with one query and paginated by
+        keyset.
+        :param partner: res.partner ambassador to restrict the feed to
+        :param limit: maximum number of rows to return
+        :param cursor: cursor given with the previous page, or None
+        :return: tuple (list of (type, record id, date), next page cursor
+                 or None if there is no more row)
+        """
+        self.ensure_one()
+        before = self._parse_timeline_cursor(cursor)
+        self.env.cr.execute("""
+            SELECT type, id, date FROM (
+                SELECT 'sponsorship' AS type, c.id, c.create_date AS date
+                FROM recurring_contract c
+                WHERE c.campaign_id = %(campaign_id)s
+                AND c.type LIKE '%%S%%'
+                AND c.state != 'cancelled'
+                AND (%(partner_id)s IS NULL OR c.user_id = %(partner_id)s)
+                UNION ALL
+                SELECT 'donation' AS type, il.id, i.create_date AS date
+                FROM account_invoice_line il
+                JOIN account_invoice i ON i.id = il.invoice_id
+                JOIN crowdfunding_participant pa
+                    ON pa.id = il.crowdfunding_participant_id
+                WHERE pa.project_id = %(project_id)s
+                AND il.state = 'paid'
+                AND (%(partner_id)s IS NULL OR il.user_id = %(partner_id)s)
+            ) timeline
+            WHERE %(before_date)s IS NULL
+            OR (date, type, id) < (%(before_date)s, %(before_type)s, %(before_id)s)
+            ORDER BY date DESC, type DESC, id DESC
+            LIMIT %(limit)s
+        """, {
+            "campaign_id": self.campaign_id.id,
+            "project_id": self.id,
+            "partner_id": partner.id if partner else None,
+            "before_date": before[0],
+            "before_type": before[1],
+            "before_id": before[2],
+            "limit": limit + 1,
+        })
+        rows = self.env.cr.fetchall()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last_type, last_id, last_date = rows[-1]
+            # Keep the microseconds, rows of the same second must not be skipped
+            next_cursor = f"{last_date.isoformat()}|{last_type}|{last_id}"
+        return rows, next_cursor
+
+    @api.model
+    def _parse_timeline_cursor(self, cursor):
+        """ :return: tuple (date, type, id) or (None, None, None) """
+        try:
+            date_str, row_type, row_id = cursor.split("|")
+            return datetime.fromisoformat(date_str), row_type, int(row_id)
+        except (AttributeError, ValueError):
+            return None, None, None
+
     @api.multi
     def validate(self):
         self.write({"state": "active", "is_published": True})
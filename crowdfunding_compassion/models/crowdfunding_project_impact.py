@@ -0,0 +1,119 @@
+#    Copyright (C) 2022 Compassion CH
+
+import psycopg2
+
+from odoo import models, fields, api
+
+
+class CrowdfundingProjectImpact(models.Model):
+    """ Materialized impact of the crowdfunding projects, used by the
+    homepage and the project pages instead of counting the sponsorships and
+    the donations at each visit. The rows are refreshed when sponsorships or
+    paid donations of the projects change, and created at first read.
+    """
+    _name = "crowdfunding.project.impact"
+    _description = "Crowdfunding project impact"
+    _rec_name = "project_id"
+
+    project_id = fields.Many2one(
+        "crowdfunding.project", required=True, ondelete="cascade",
+        readonly=True)
+    product_id = fields.Many2one(
+        "product.product", related="project_id.product_id", store=True,
+        readonly=True)
+    number_sponsorships = fields.Integer(readonly=True)
+    product_number = fields.Integer(readonly=True)
+    amount = fields.Integer(readonly=True)
+
+    _sql_constraints = [
+        ("unique_project", "unique(project_id)",
+         "Only one impact per project is allowed")
+    ]
+
+    @api.model
+    def get_impacts(self, projects):
+        """
+        :param projects: crowdfunding.project recordset
+        :return: crowdfunding.project.impact recordset of the projects
+        """
+        impacts = self.sudo().search([("project_id", "in", projects.ids)])
+        missing = projects - impacts.mapped("project_id")
+        if missing:
+            impacts |= self.refresh(missing)
+        return impacts
+
+    @api.model
+    def refresh(self, projects):
+        """
+        Recompute the impact of the given projects.
+        :param projects: crowdfunding.project recordset
+        :return: crowdfunding.project.impact recordset of the projects
+        """
+        projects = projects.sudo().exists()
+        if not projects:
+            return self.browse()
+        groups = self.env["recurring.contract"].sudo().read_group([
+            ("campaign_id", "in", projects.mapped("campaign_id").ids),
+            ("type", "like", "S"),
+            ("state", "!=", "cancelled")
+        ], ["campaign_id"], ["campaign_id"])
+        sponsorships = {
+            g["campaign_id"][0]: g["campaign_id_count"] for g in groups}
+        self.env.cr.execute("""
+            SELECT pa.project_id, SUM(il.price_total), SUM(il.quantity)
+            FROM account_invoice_line il
+            JOIN crowdfunding_participant pa ON pa.id = il.crowdfunding_participant_id
+            WHERE il.state = 'paid'
+            AND pa.project_id = ANY(%s)
+            GROUP BY pa.project_id
+        """, [projects.ids])
+        donations = {r[0]: (r[1], r[2]) for r in self.env.cr.fetchall()}
+
+        impacts = self.sudo().search([("project_id", "in", projects.ids)])
+        impact_by_project = {impact.project_id.id: impact for impact in impacts}
+        for project in projects:
+            amount, quantity = donations.get(project.id, (0, 0))
+            vals = {
+                "number_sponsorships": sponsorships.get(project.campaign_id.id, 0),
+                "product_number": round(quantity),
+                "amount": round(amount),
+            }
+            impact = impact_by_project.get(project.id)
+            if impact:
+                impact.write(vals)
+            else:
+                vals["project_id"] = project.id
+                impacts |= self._create_impact(vals)
+        return impacts
+
+    @api.model
+    def _create_impact(self, vals):
+        try:
+            with self.env.cr.savepoint():
+                return self.sudo().create(vals)
+        except psycopg2.IntegrityError:
+            # Created at the same time by another visit, which is not visible
+            # in this transaction: the computed values are used as they are.
+            return self.sudo().new(vals)
+
+    @api.model
+    def refresh_campaigns(self, campaigns):
+        """ Refresh the projects of the given utm.campaign recordset. """
+        if campaigns:
+            self.refresh(self.env["crowdfunding.project"].sudo().search([
+                ("campaign_id", "in", campaigns.ids)]))
+        return True
+
+    @api.model
+    def get_year_totals(self, projects):
+        """
+        Sum of the impact of the given projects.
+        :param projects: crowdfunding.project recordset
+        :return: tuple (number of sponsorships, {fund name: product number})
+        """
+        impacts = self.get_impacts(projects)
+        products = {}
+        for impact in impacts.filtered("product_id"):
+            name = impact.product_id.name
+            products[name] = products.get(name, 0) + impact.product_number
+        return sum(impacts.mapped("number_sponsorships")), products
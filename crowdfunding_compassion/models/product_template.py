@@ -1,7 +1,9 @@
 #    Copyright (C) 2020 Compassion CH
 #    @author: Quentin Gigon
 
-from odoo import models, fields
+from odoo import models, fields, api
+
+from odoo.addons.website_compassion.tools.image_compression import compress_big_images
 
 
 class ProductTemplate(models.Model):
@@ -50,3 +52,15 @@ class ProductTemplate(models.Model):
     image_large = fields.Binary(
         "Large image", help="Image for header", attachment=True
     )
+    image_header = fields.Binary(
+        "Header image", help="Image for header, resized for the homepage",
+        compute="_compute_image_header", store=True, attachment=True
+    )
+
+    @api.depends("image_large")
+    def _compute_image_header(self):
+        for product in self:
+            # the header is a small image so we can compress it to save space
+            product.image_header = compress_big_images(
+                product.image_large, max_width=400
+            ) if product.image_large else False
@@ -0,0 +1,34 @@
+#    Copyright (C) 2022 Compassion CH
+
+from odoo import models, api
+
+# Fields changing the sponsorships counted in crowdfunding projects
+IMPACT_FIELDS = {"state", "type", "campaign_id", "origin_id"}
+
+
+class RecurringContract(models.Model):
+    _inherit = "recurring.contract"
+
+    @api.model
+    def create(self, vals):
+        res = super().create(vals)
+        self.env["crowdfunding.project.impact"].refresh_campaigns(
+            res.mapped("campaign_id"))
+        return res
+
+    @api.multi
+    def write(self, vals):
+        if not IMPACT_FIELDS.intersection(vals):
+            return super().write(vals)
+        campaigns = self.mapped("campaign_id")
+        res = super().write(vals)
+        self.env["crowdfunding.project.impact"].refresh_campaigns(
+            campaigns | self.mapped("campaign_id"))
+        return res
+
+    @api.multi
+    def unlink(self):
+        campaigns = self.mapped("campaign_id")
+        res = super().unlink()
+        self.env["crowdfunding.project.impact"].refresh_campaigns(campaigns)
+        return res
@@ -0,0 +1,22 @@
+$(document).ready(function(){
+  // Load the next impact tiles when the end of the list is reached
+  function load_more(button) {
+    if (button.data("loading")) {
+      return;
+    }
+    button.data("loading", true);
+    $.get(button.data("url"), function(html) {
+      button.replaceWith(html);
+    });
+  }
+  $("#impacts").on("click", ".impact-load-more a", function(event) {
+    event.preventDefault();
+    load_more($(this).parent());
+  });
+  $("#impacts").on("scroll", function() {
+    var button = $(this).find(".impact-load-more");
+    if (button.length && this.scrollTop + this.clientHeight >= this.scrollHeight - 50) {
+      load_more(button);
+    }
+  });
+});
@@ -1,6 +1,9 @@
 from odoo.tests.common import TransactionCase
 from odoo import fields
-from datetime import timedelta
+from odoo.addons.sponsorship_compassion.tests.test_sponsorship_compassion import (
+    BaseSponsorshipTest,
+)
+from datetime import datetime, timedelta
 
 
 class TestCrowdFunding(TransactionCase):
@@ -24,3 +27,57 @@ class TestCrowdFunding(TransactionCase):
         """Test that the project is archived at the end date"""
         end_time = fields.Date.today() + timedelta(weeks=1)
         self.assertEqual(self.test_project.deadline, end_time)
+
+    def test_project_impact(self):
+        """Test that the impact of the project is materialized at first read"""
+        impact_obj = self.env["crowdfunding.project.impact"]
+        self.assertFalse(impact_obj.search([("project_id", "=", self.test_project.id)]))
+        self.assertEqual(self.test_project.number_sponsorships_reached, 0)
+        self.assertEqual(self.test_project.product_number_reached, 0)
+        impact = impact_obj.search([("project_id", "=", self.test_project.id)])
+        self.assertEqual(len(impact), 1)
+        self.assertEqual(impact_obj.get_year_totals(self.test_project), (0, {}))
+
+    def test_project_impact_timeline(self):
+        """Test that the impact timeline is read by pages"""
+        self.assertEqual(self.test_project.get_impact_timeline_rows(), ([], None))
+        self.assertEqual(
+            self.test_project.get_impact_timeline_rows(cursor="wrong"), ([], None))
+
+
+class TestCrowdFundingTimeline(BaseSponsorshipTest):
+
+    def test_impact_timeline_same_timestamp(self):
+        """Test that pages don't skip rows created in the same second"""
+        project = self.env['crowdfunding.project'].create({
+            "name": "My timeline project",
+            "type": "collective",
+            "project_owner_id": "base.res_partner_address_15",
+            "deadline": fields.Date.today() + timedelta(weeks=1),
+        })
+        group = self.create_group({"partner_id": self.michel.id})
+        sponsorships = self.env["recurring.contract"]
+        for local_id in ("IO06790211", "IO06790212", "IO06790213", "IO06790214"):
+            sponsorships += self.create_contract({
+                "type": "S",
+                "child_id": self.create_child(local_id).id,
+                "group_id": group.id,
+                "partner_id": self.michel.id,
+                "campaign_id": project.campaign_id.id,
+            }, [{"amount": 50.0}])
+        # The last one is the most recent, by a fraction of second
+        self.env.cr.execute(
+            "UPDATE recurring_contract SET create_date = %s WHERE id IN %s",
+            [datetime(2022, 1, 1, 10, 0, 0, 123456), tuple(sponsorships[:3].ids)])
+        self.env.cr.execute(
+            "UPDATE recurring_contract SET create_date = %s WHERE id = %s",
+            [datetime(2022, 1, 1, 10, 0, 0, 654321), sponsorships[3].id])
+
+        ids = []
+        rows, cursor = project.get_impact_timeline_rows(limit=1)
+        ids += [row[1] for row in rows]
+        while cursor:
+            rows, cursor = project.get_impact_timeline_rows(limit=1, cursor=cursor)
+            ids += [row[1] for row in rows]
+        self.assertEqual(
+            ids, [sponsorships[3].id] + sorted(sponsorships[:3].ids, reverse=True))
@@ -39,6 +39,7 @@
         "security/access_rules.xml",
         "data/smart_tags.xml",
         "data/queue_job.xml",
+        "data/ir_cron.xml",
         "views/mass_mailing_view.xml",
         "views/mail_template_view.xml",
         "views/utm_view.xml",
@@ -27,3 +27,4 @@ from . import mailchimp_lists
 from . import res_partner_category
 from . import mailchimp_merge_fields
 from . import res_users
+from . import mailchimp_sync_outbox
@@ -0,0 +1,298 @@
+##############################################################################
+#
+#    Copyright (C) 2022 Compassion CH (http://www.compassion.ch)
+#    Releasing children from poverty in Jesus' name
+#
+#    The licence is in the file __manifest__.py
+#
+##############################################################################
+import json
+import logging
+import tarfile
+from collections import defaultdict
+from io import BytesIO
+
+import requests
+
+from odoo import api, models, fields
+
+_logger = logging.getLogger(__name__)
+
+
+class MailchimpSyncOutbox(models.Model):
+    """ Changes of mailing contacts waiting to be sent to Mailchimp.
+    A contact has at most one pending row per Mailchimp list and action, so
+    that successive changes are sent only once. The rows are pushed by the
+    CRON through the batch operations endpoint of Mailchimp, then the results
+    of the batch are mapped back to the rows. Failed operations are sent
+    again at the next runs, up to mailchimp_max_retries times.
+    """
+    _name = "mailchimp.sync.outbox"
+    _description = "Mailchimp synchronization outbox"
+    _order = "id"
+
+    # Archive rows must outlive the deleted contacts
+    contact_id = fields.Many2one(
+        "mail.mass_mailing.contact", "Mailing contact", ondelete="set null",
+        readonly=True)
+    mailchimp_list_id = fields.Many2one(
+        "mailchimp.lists", "Mailchimp list", required=True, ondelete="cascade",
+        readonly=True)
+    action = fields.Selection(
+        [("update", "Update"), ("archive", "Archive")], required=True,
+        readonly=True)
+    member_hash = fields.Char(
+        help="Mailchimp id of the member to archive", readonly=True)
+    state = fields.Selection(
+        [("pending", "Pending"), ("sent", "Sent"), ("failed", "Failed")],
+        default="pending", required=True, index=True, readonly=True)
+    batch_id = fields.Char("Mailchimp batch", index=True, readonly=True)
+    error = fields.Text(readonly=True)
+    retry_count = fields.Integer(readonly=True)
+
+    @api.model_cr
+    def init(self):
+        self.env.cr.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS mailchimp_sync_outbox_pending_uniq
+            ON mailchimp_sync_outbox (
+                action, mailchimp_list_id, COALESCE(contact_id, 0),
+                COALESCE(member_hash, '')
+            ) WHERE state = 'pending'
+        """)
+
+    ##########################################################################
+    #                             PUBLIC METHODS                             #
+    ##########################################################################
+    @api.model
+    def enqueue(self, contacts, action="update"):
+        """
+        Mark the contacts to be updated or archived in all Mailchimp lists
+        they are subscribed to. Contacts already waiting are skipped.
+        :param contacts: mail.mass_mailing.contact recordset
+        :param action: update or archive
+        :return: True
+        """
+        lists_by_odoo_list = {
+            mailchimp_list.odoo_list_id.id: mailchimp_list
+            for mailchimp_list in self.env["mailchimp.lists"].sudo().search([])
+        }
+        rows = []
+        for contact in contacts:
+            for subscription in contact.subscription_list_ids:
+                mailchimp_list = lists_by_odoo_list.get(subscription.list_id.id)
+                if not mailchimp_list:
+                    continue
+                if action == "update":
+                    rows.append((contact.id, mailchimp_list.id, action, None))
+                elif subscription.mailchimp_id:
+                    rows.append((contact.id, mailchimp_list.id, action,
+                                 subscription.md5_email))
+        self._insert_pending(rows)
+        return True
+
+    @api.model
+    def process_outbox(self):
+        """ CRON sending the pending rows and reading the finished batches. """
+        self._poll_batches()
+        self._send_pending()
+        return True
+
+    ##########################################################################
+    #                             PRIVATE METHODS                            #
+    ##########################################################################
+    @api.model
+    def _insert_pending(self, rows):
+        """
+        Insert pending rows, ignoring the ones already waiting.
+        :param rows: list of (contact_id, mailchimp_list_id, action, member_hash)
+        """
+        if not rows:
+            return
+        cr = self.env.cr
+        values = ",".join(
+            cr.mogrify(
+                "(%s, %s, %s, %s, 'pending', %s, %s, "
+                "(now() at time zone 'UTC'), (now() at time zone 'UTC'))",
+                row + (self.env.uid, self.env.uid),
+            ).decode("utf-8")
+            for row in rows
+        )
+        cr.execute(f"""
+            INSERT INTO mailchimp_sync_outbox (
+                contact_id, mailchimp_list_id, action, member_hash, state,
+                create_uid, write_uid, create_date, write_date)
+            VALUES {values}
+            ON CONFLICT DO NOTHING
+        """)
+
+    @api.model
+    def _send_pending(self):
+        params = self.env["ir.config_parameter"].sudo()
+        batch_size = int(params.get_param(
+            "mass_mailing_switzerland.mailchimp_batch_size", 500))
+        limit = int(params.get_param(
+            "mass_mailing_switzerland.mailchimp_outbox_limit", 5000))
+        rows = self.search([("state", "=", "pending")], limit=limit)
+        # Updates of deleted contacts are useless
+        rows.filtered(lambda r: r.action == "update" and not r.contact_id).unlink()
+        rows = rows.exists()
+
+        # Contacts never exported must be created by the export process
+        to_export = rows.filtered(
+            lambda r: r.action == "update"
+            and not r._get_subscription().mailchimp_id)
+        if to_export:
+            to_export.mapped("contact_id").with_delay().action_export_to_mailchimp()
+            to_export.unlink()
+        rows -= to_export
+
+        rows_by_account = defaultdict(lambda: self.browse())
+        for row in rows:
+            rows_by_account[row.mailchimp_list_id.account_id] += row
+        for account, account_rows in rows_by_account.items():
+            for i in range(0, len(account_rows), batch_size):
+                account_rows[i:i + batch_size]._send_batch(account)
+
+    @api.multi
+    def _send_batch(self, account):
+        operations = [row._get_operation() for row in self]
+        try:
+            batch = account._send_request(
+                "batches", {"operations": operations}, method="POST")
+        except Exception:
+            _logger.error("Mailchimp batch could not be sent, it will be "
+                          "retried at next run.", exc_info=True)
+            return
+        self.write({"state": "sent", "batch_id": batch["id"]})
+        _logger.info("Mailchimp batch %s sent with %s operations",
+                     batch["id"], len(operations))
+
+    @api.multi
+    def _get_operation(self):
+        """
+        :return: dict describing the operation in a Mailchimp batch or
+                 None if the member doesn't exist yet in Mailchimp.
+        """
+        self.ensure_one()
+        list_id = self.mailchimp_list_id.list_id
+        if self.action == "archive":
+            return {
+                "method": "DELETE",
+                "path": f"lists/{list_id}/members/{self.member_hash}",
+                "operation_id": str(self.id),
+            }
+        subscription = self._get_subscription()
+        if not subscription.mailchimp_id:
+            return None
+        return {
+            "method": "PATCH",
+            "path": f"lists/{list_id}/members/{subscription.md5_email}",
+            "operation_id": str(self.id),
+            "body": json.dumps(self.contact_id._prepare_mailchimp_member_vals(
+                self.mailchimp_list_id, subscription)),
+        }
+
+    @api.multi
+    def _get_subscription(self):
+        self.ensure_one()
+        odoo_list = self.mailchimp_list_id.odoo_list_id
+        return self.contact_id.subscription_list_ids.filtered(
+            lambda s: s.list_id == odoo_list)[:1]
+
+    @api.model
+    def _poll_batches(self):
+        rows_by_batch = defaultdict(lambda: self.browse())
+        for row in self.search([("state", "=", "sent")]):
+            rows_by_batch[row.batch_id] += row
+        for batch_id, rows in rows_by_batch.items():
+            account = rows[0].mailchimp_list_id.account_id
+            try:
+                batch = account._send_request(
+                    f"batches/{batch_id}", {}, method="GET")
+                if batch.get("status") != "finished":
+                    continue
+                results = self._fetch_batch_results(batch["response_body_url"])
+            except Exception:
+                _logger.warning("Mailchimp batch %s could not be read",
+                                batch_id, exc_info=True)
+                continue
+            rows._process_batch_results(results)
+
+    @api.model
+    def _fetch_batch_results(self, url):
+        """
+        Download the results of a finished batch.
+        :param url: response_body_url given by Mailchimp
+        :return: list of dict with operation_id, status_code and response
+        """
+        response = requests.get(url, timeout=60)
+        response.raise_for_status()
+        results = []
+        with tarfile.open(fileobj=BytesIO(response.content), mode="r:gz") as archive:
+            for member in archive.getmembers():
+                if member.isfile() and member.name.endswith(".json"):
+                    results.extend(json.load(archive.extractfile(member)))
+        return results
+
+    @api.multi
+    def _process_batch_results(self, results):
+        """
+        Map the results of a batch back to the rows. Successful rows are
+        removed. When a member to update is not found, the link to Mailchimp
+        was lost after a change of email: the contact is exported again.
+        """
+        results_by_row = {int(r["operation_id"]): r for r in results}
+        done = self.browse()
+        errors = {}
+        subscriptions_lost = self.env["mail.mass_mailing.list_contact_rel"]
+        for row in self:
+            result = results_by_row.get(row.id, {})
+            status = result.get("status_code") or 0
+            if 200 <= status < 300 or (status == 404 and row.action == "archive"):
+                done += row
+            elif status == 404 and row.contact_id:
+                subscriptions_lost += row._get_subscription()
+                done += row
+            else:
+                errors[row.id] = result.get("response") or "No result returned"
+        if errors:
+            self.browse(list(errors))._retry_failed(errors)
+        if subscriptions_lost:
+            subscriptions_lost.write({"mailchimp_id": False})
+            subscriptions_lost.mapped("contact_id").with_delay()\
+                .action_export_to_mailchimp()
+        done.unlink()
+
+    @api.multi
+    def _retry_failed(self, errors):
+        """
+        Send the failed rows again at the next run, until they failed too
+        many times. A row is useless when the same change is waiting again.
+        :param errors: {row id: error returned by Mailchimp}
+        """
+        max_retries = int(self.env["ir.config_parameter"].sudo().get_param(
+            "mass_mailing_switzerland.mailchimp_max_retries", 3))
+        for row in self:
+            error = errors[row.id]
+            if row.retry_count >= max_retries:
+                row.write({"state": "failed", "error": error})
+                _logger.error(
+                    "Mailchimp %s of contact %s failed %s times: %s",
+                    row.action, row.contact_id.id, row.retry_count + 1, error)
+                continue
+            waiting = self.search([
+                ("state", "=", "pending"),
+                ("action", "=", row.action),
+                ("mailchimp_list_id", "=", row.mailchimp_list_id.id),
+                ("contact_id", "=", row.contact_id.id),
+                ("member_hash", "=", row.member_hash),
+            ], limit=1)
+            if waiting:
+                row.unlink()
+            else:
+                row.write({
+                    "state": "pending",
+                    "batch_id": False,
+                    "error": error,
+                    "retry_count": row.retry_count + 1,
+                })
@@ -8,9 +8,12 @@
 #
 ##############################################################################
 from ast import literal_eval
+from collections import defaultdict
 from datetime import date
 import logging
 
+import psycopg2
+
 from dateutil.relativedelta import relativedelta
 
 from odoo import api, models, fields, _
@@ -18,6 +21,31 @@ from odoo.addons.queue_job.job import job
 
 logger = logging.getLogger(__name__)
 
+EMAIL_INDEX = "mail_mass_mailing_contact_email_lower_index"
+
+# Merge fields computed with the gendered translations of the children
+CHILD_KEYWORD_FIELDS = {
+    "sponsored_child_is": "is",
+    "sponsored_child_was": "was",
+    "sponsored_child_will_be": "will be",
+    "sponsored_child_he": "he",
+    "sponsored_child_his": "his",
+    "sponsored_child_sein": "sein",
+    "sponsored_child_seine": "seine",
+    "sponsored_child_seinen": "seinen",
+    "sponsored_child_seinem": "seinem",
+    "sponsored_child_seiner": "seiner",
+    "sponsored_child_ihm": "ihm",
+    "sponsored_child_ihn": "ihn",
+    "sponsored_child_son": "son",
+    "sponsored_child_sa": "sa",
+    "sponsored_child_ses": "ses",
+    "sponsored_child_lui_leur": "lui_leur",
+    "sponsored_child_lui_elle": "lui_elle",
+    "sponsored_child_le_la": "le_la",
+    "sponsored_child_your_child": "your sponsored child",
+}
+
 
 class MassMailingContact(models.Model):
     _inherit = "mail.mass_mailing.contact"
@@ -155,6 +183,13 @@ class MassMailingContact(models.Model):
     def _compute_sponsored_child_fields(self):
         country_filter_id = self.env["res.config.settings"].get_param(
             "mass_mailing_country_filter_id")
+        context_child = self.env.context.get("mailchimp_child")
+        # Load all children of the batch at once
+        all_children = context_child or self.mapped(
+            "partner_ids.sponsored_child_ids")
+        last_b2s_dates = self._get_last_b2s_letter_dates(all_children)
+        one_year_ago = date.today() - relativedelta(years=1)
+        keyword_tables = {}
         for contact in self:
             partners = contact.partner_ids.with_context(lang=contact.partner_id.lang)
             # Allow option to take a child given in context, otherwise take
@@ -170,69 +205,127 @@ class MassMailingContact(models.Model):
             contact.sponsored_child_name = child.get_list(
                 "preferred_name", 3, child.get_number(), translate=False)
             contact.sponsored_child_reference = child.get_list("local_id")
-            contact.sponsored_child_is = child.get("is")
-            contact.sponsored_child_was = child.get("was")
-            contact.sponsored_child_will_be = child.get("will be")
-            contact.sponsored_child_he = child.get("he")
-            contact.sponsored_child_his = child.get("his")
-            contact.sponsored_child_sein = child.get("sein")
-            contact.sponsored_child_seine = child.get("seine")
-            contact.sponsored_child_seinen = child.get("seinen")
-            contact.sponsored_child_seinem = child.get("seinem")
-            contact.sponsored_child_seiner = child.get("seiner")
-            contact.sponsored_child_ihm = child.get("ihm")
-            contact.sponsored_child_ihn = child.get("ihn")
-            contact.sponsored_child_son = child.get("son")
-            contact.sponsored_child_sa = child.get("sa")
-            contact.sponsored_child_ses = child.get("ses")
-            contact.sponsored_child_lui_leur = child.get("lui_leur")
-            contact.sponsored_child_lui_elle = child.get("lui_elle")
-            contact.sponsored_child_le_la = child.get("le_la")
-            contact.sponsored_child_your_child = child.get("your sponsored child")
+            # The pronouns only depend on the language, the genders and the
+            # number of children: they are translated once per combination.
+            table_key = (
+                child.env.context.get("lang"),
+                frozenset(child.mapped("gender")),
+                len(child) > 1,
+            )
+            if table_key not in keyword_tables:
+                keyword_tables[table_key] = {
+                    fname: child.get(keyword)
+                    for fname, keyword in CHILD_KEYWORD_FIELDS.items()
+                }
+            for fname, value in keyword_tables[table_key].items():
+                setattr(contact, fname, value)
             # Pending B2S letters for more than 1 year
-            pending_b2s_child = self.env["compassion.child"].with_context(
-                lang=contact.partner_id.lang)
-            one_year_ago = date.today() - relativedelta(years=1)
-            for one_child in child:
-                recent_letters = self.env["correspondence"].search_count([
-                    ("child_id", "=", one_child.id),
-                    ("direction", "=", "Beneficiary To Supporter"),
-                    ("scanned_date", ">=", one_year_ago)
-                ])
-                if not recent_letters:
-                    pending_b2s_child += one_child
+            pending_b2s_child = child.filtered(
+                lambda c: not last_b2s_dates.get(c.id)
+                or last_b2s_dates[c.id] < one_year_ago
+            ).with_context(lang=contact.partner_id.lang)
             contact.pending_letter_child_names = pending_b2s_child.get_list(
                 "preferred_name", translate=False)
 
+    @api.model
+    def _get_last_b2s_letter_dates(self, children):
+        """
+        :param children: compassion.child recordset
+        :return: {child_id: date of the last scanned B2S letter}
+        """
+        if not children:
+            return {}
+        groups = self.env["correspondence"].read_group([
+            ("child_id", "in", children.ids),
+            ("direction", "=", "Beneficiary To Supporter"),
+            ("scanned_date", "!=", False),
+        ], ["child_id", "scanned_date:max"], ["child_id"], lazy=False)
+        return {
+            group["child_id"][0]: fields.Date.to_date(group["scanned_date"])
+            for group in groups
+        }
+
     ##########################################################################
     #                              ORM METHODS                               #
     ##########################################################################
+    @api.model_cr
+    def init(self):
+        """ Case insensitive index used to find contacts by email. It can only
+        be unique once the contacts with the same email in different cases
+        are merged. """
+        cr = self.env.cr
+        cr.execute("""
+            SELECT i.indisunique FROM pg_index i
+            JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE c.relname = %s
+        """, [EMAIL_INDEX])
+        index = cr.fetchone()
+        if index and index[0]:
+            return
+        try:
+            with cr.savepoint():
+                if index:
+                    cr.execute(f"DROP INDEX {EMAIL_INDEX}")
+                cr.execute(f"""
+                    CREATE UNIQUE INDEX {EMAIL_INDEX}
+                    ON mail_mass_mailing_contact (lower(trim(email)))
+                """)
+        except psycopg2.IntegrityError:
+            logger.warning(
+                "Some mailing contacts have the same email in different cases: "
+                "the email index is not unique until they are merged.")
+            if not index:
+                cr.execute(f"""
+                    CREATE INDEX {EMAIL_INDEX}
+                    ON mail_mass_mailing_contact (lower(trim(email)))
+                """)
+
     @api.model
     def create(self, vals_list):
         if isinstance(vals_list, dict):
             vals_list = [vals_list]
+        default_partner_id = self.env.context.get("default_partner_id")
+        for vals in vals_list:
+            if vals.get("email"):
+                vals["email"] = self._normalize_email(vals["email"])
+        existing = self._get_contacts_by_email(
+            [vals.get("email") for vals in vals_list])
         records = self.env[self._name]
-        duplicates = []
+        partners_to_link = defaultdict(set)
+        new_vals_by_email = {}
+        new_vals = []
         for vals in vals_list:
-            # Search and avoid duplicates
-            contact = self.search([("email", "=", vals["email"])], limit=1)
+            email = vals.get("email")
+            contact = existing.get(email)
             if contact:
-                partner_id = vals.pop("partner_id", False) or self.env.context.get(
-                    "default_partner_id")
+                # Avoid duplicates
+                partner_id = vals.pop("partner_id", False) or default_partner_id
                 if partner_id:
-                    contact.write({"partner_ids": [(4, partner_id)]})
-                duplicates.append(vals.pop("email"))
+                    partners_to_link[contact].add(partner_id)
+                vals.pop("email")
                 if vals:
                     contact.write(vals)
                 records += contact
-            else:
-                # Push the primary partner to the Many2many field as well
-                partner_id = vals.get("partner_id") or self.env.context.get(
-                    "default_partner_id")
-                if partner_id and "partner_ids" not in vals:
-                    vals["partner_ids"] = [(4, partner_id)]
+                continue
+            # Push the primary partner to the Many2many field as well
+            partner_id = vals.get("partner_id") or default_partner_id
+            if email in new_vals_by_email:
+                # Same email twice in the batch: keep only one contact
+                first_vals = new_vals_by_email[email]
+                if partner_id:
+                    first_vals.setdefault("partner_ids", []).append(
+                        (4, partner_id))
+                for key, value in vals.items():
+                    first_vals.setdefault(key, value)
+                continue
+            if partner_id and "partner_ids" not in vals:
+                vals["partner_ids"] = [(4, partner_id)]
+            if email:
+                new_vals_by_email[email] = vals
+            new_vals.append(vals)
+        for contact, partner_ids in partners_to_link.items():
+            contact.write({"partner_ids": [(4, pid) for pid in partner_ids]})
         records.process_mailchimp_update()
-        new_vals = [vals for vals in vals_list if "email" in vals]
         if new_vals:
             new_records = super().create(new_vals)
             new_records.action_export_to_mailchimp()
@@ -242,15 +335,42 @@ class MassMailingContact(models.Model):
     @api.multi
     def write(self, values):
         """Merge with other potential existing contacts"""
-        if "email" in values:
+        if values.get("email"):
+            values["email"] = self._normalize_email(values["email"])
             # Regroup same email contacts
-            other = self.search([("email", "=", values["email"]), ("id", "not in", self.ids)], limit=1)
+            other = self._get_contacts_by_email(
+                [values["email"]], exclude_ids=self.ids).get(values["email"])
             if other:
                 other.write({"partner_ids": [(4, pid) for pid in self.partner_ids.ids]})
                 self.with_delay(eta=5).unlink()
                 return True
         return super().write(values)
 
+    @api.model
+    def _normalize_email(self, email):
+        return email.strip().lower()
+
+    @api.model
+    def _get_contacts_by_email(self, emails, exclude_ids=None):
+        """
+        Find the existing contacts of normalized emails in one query.
+        :param emails: list of normalized emails
+        :param exclude_ids: ids of contacts to ignore
+        :return: dict {email: mail.mass_mailing.contact record}
+        """
+        emails = tuple({email for email in emails if email})
+        if not emails:
+            return {}
+        self.env.cr.execute("""
+            SELECT lower(trim(email)), min(id) FROM mail_mass_mailing_contact
+            WHERE lower(trim(email)) IN %s AND NOT id = ANY(%s)
+            GROUP BY lower(trim(email))
+        """, [emails, list(exclude_ids or [])])
+        return {
+            email: self.browse(contact_id)
+            for email, contact_id in self.env.cr.fetchall()
+        }
+
     @api.multi
     def unlink(self):
         try:
@@ -269,25 +389,10 @@ class MassMailingContact(models.Model):
 
     @api.multi
     def process_mailchimp_update(self):
-        """Update contacts to mailchimp in asynchronous job."""
+        """Update contacts to mailchimp through the synchronization outbox."""
         if not self or self.env.context.get("skip_mailchimp"):
             return True
-
-        mailchimp_channel = self.env.ref("mass_mailing_switzerland.channel_mailchimp")
-        queue_job = self.env["queue.job"].sudo().search([
-            ("job_function_id.channel_id", "=", mailchimp_channel.id),
-            ("state", "!=", "done")
-        ])
-        to_update = self
-        if queue_job:
-            args = [
-                item for sublist in queue_job.mapped("args") for item in sublist]
-            for contact in self:
-                if contact.id in args:
-                    to_update -= contact
-        for contact in to_update:
-            contact.with_delay().action_update_to_mailchimp()
-        return True
+        return self.env["mailchimp.sync.outbox"].sudo().enqueue(self, "update")
 
     @api.multi
     def action_export_to_mailchimp(self):
@@ -336,24 +441,23 @@ class MassMailingContact(models.Model):
 
     @api.multi
     def action_archive_from_mailchimp(self):
-        available_mailchimp_lists = self.env['mailchimp.lists'].search([])
-        lists = available_mailchimp_lists.mapped('odoo_list_id').ids
-        for record in self:
-            lists_to_export = record.subscription_list_ids.filtered(
-                lambda x: x.list_id.id in lists and x.mailchimp_id)
-            for list in lists_to_export:
-                mailchimp_list_id = list.list_id.mailchimp_list_id
-                val = mailchimp_list_id.account_id._send_request(
-                    'search-members?query=%s&field=exact_matches'
-                    % list.contact_id.email, {}, method='GET')
-                for member in val['exact_matches']['members']:
-                    if member['id'] == list.md5_email and \
-                            member['status'] != 'archived':
-                        mailchimp_list_id.account_id._send_request(
-                            'lists/%s/members/%s' % (
-                                mailchimp_list_id.list_id, list.md5_email),
-                            {}, method='DELETE')
-        return True
+        """Archive members in mailchimp through the synchronization outbox."""
+        return self.env["mailchimp.sync.outbox"].sudo().enqueue(self, "archive")
+
+    @api.multi
+    def _prepare_mailchimp_member_vals(self, mailchimp_list, subscription):
+        """
+        Values of the member sent to Mailchimp in the batch operations.
+        :param mailchimp_list: mailchimp.lists record
+        :param subscription: mail.mass_mailing.list_contact_rel record
+        :return: dict
+        """
+        self.ensure_one()
+        return {
+            "email_address": self.email,
+            "status": "unsubscribed" if subscription.opt_out else "subscribed",
+            "merge_fields": mailchimp_list.merge_field_ids.get_value(self),
+        }
 
     def _invalid_contact(self, bounced):
         for invalid_contact in self:
@@ -128,7 +128,7 @@ class ResPartner(models.Model):
                 # Dissociate this partner from others inside the mass_mailing.contact
                 mailchimp_lists = mailing_contacts.mapped("subscription_list_ids.mailchimp_list_id")
                 mailing_contacts.write({"partner_ids": [(3, partner.id)]})
-                mailing_contacts.with_delay(eta=6).action_update_to_mailchimp()
+                mailing_contacts.process_mailchimp_update()
                 partner.with_delay(eta=5).action_export_partner_mailchimp(mailchimp_lists)
             else:
                 super(ResPartner, partner).update_contact_email(email)
@@ -0,0 +1,63 @@
+##############################################################################
+#
+#    Copyright (C) 2022 Compassion CH (http://www.compassion.ch)
+#    Releasing children from poverty in Jesus' name
+#
+#    The licence is in the file __manifest__.py
+#
+##############################################################################
+import json
+
+
+class MailchimpStandIn:
+    """ Local stand-in of the Mailchimp API answering the batch operations.
+    The batches are executed immediately on the members dictionary and
+    finished at the first poll. The first `errors` operations fail.
+    """
+
+    def __init__(self, members=None, errors=0):
+        # {(list_id, member_hash): member values}
+        self.members = members or {}
+        self.errors = errors
+        # {batch_id: list of operation results}
+        self.batches = {}
+        self.requests = []
+
+    def send_request(self, request, data, method="GET"):
+        self.requests.append((method, request))
+        if request == "batches" and method == "POST":
+            batch_id = "batch%s" % (len(self.batches) + 1)
+            self.batches[batch_id] = [
+                self._run_operation(operation) for operation in data["operations"]]
+            return {"id": batch_id, "status": "pending"}
+        if request.startswith("batches/") and method == "GET":
+            batch_id = request.split("/")[1]
+            return {
+                "id": batch_id,
+                "status": "finished",
+                "response_body_url": batch_id,
+            }
+        raise NotImplementedError(f"{method} {request}")
+
+    def fetch_batch_results(self, url):
+        return self.batches[url]
+
+    def _run_operation(self, operation):
+        _lists, list_id, _members, member_hash = operation["path"].split("/")
+        key = (list_id, member_hash)
+        if self.errors:
+            self.errors -= 1
+            status, response = 500, {"status": 500, "title": "Internal Error"}
+        elif key not in self.members:
+            status, response = 404, {"status": 404, "title": "Resource Not Found"}
+        elif operation["method"] == "DELETE":
+            del self.members[key]
+            status, response = 204, {}
+        else:
+            self.members[key].update(json.loads(operation["body"]))
+            status, response = 200, self.members[key]
+        return {
+            "operation_id": operation["operation_id"],
+            "status_code": status,
+            "response": json.dumps(response),
+        }
@@ -0,0 +1,110 @@
+##############################################################################
+#
+#    Copyright (C) 2022 Compassion CH (http://www.compassion.ch)
+#    Releasing children from poverty in Jesus' name
+#
+#    The licence is in the file __manifest__.py
+#
+##############################################################################
+from mock import patch
+
+from odoo.tests import SavepointCase
+
+from .mailchimp_stand_in import MailchimpStandIn
+
+
+class TestMailchimpSync(SavepointCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.odoo_list = cls.env["mail.mass_mailing.list"].create({
+            "name": "Newsletter"})
+        account = cls.env["mailchimp.accounts"].create({
+            "name": "Test account", "api_key": "test-us1"})
+        cls.mailchimp_list = cls.env["mailchimp.lists"].create({
+            "name": "Newsletter",
+            "list_id": "list1",
+            "account_id": account.id,
+            "odoo_list_id": cls.odoo_list.id,
+        })
+        cls.contact = cls.env["mail.mass_mailing.contact"].with_context(
+            skip_mailchimp=True).create({
+                "email": "sync@example.com",
+                "list_ids": [(4, cls.odoo_list.id)],
+            })
+        cls.subscription = cls.contact.subscription_list_ids
+        cls.subscription.write({
+            "mailchimp_id": "member1", "md5_email": "hash1"})
+        cls.outbox = cls.env["mailchimp.sync.outbox"]
+
+    def _run_outbox(self, stand_in):
+        with patch.object(
+                type(self.env["mailchimp.accounts"]), "_send_request",
+                side_effect=stand_in.send_request), \
+            patch.object(
+                type(self.outbox), "_fetch_batch_results",
+                side_effect=stand_in.fetch_batch_results):
+            # First run sends the batch, second run reads its results
+            self.outbox.process_outbox()
+            self.outbox.process_outbox()
+
+    def _get_rows(self):
+        return self.outbox.search([("contact_id", "=", self.contact.id)])
+
+    def test_changes_are_coalesced(self):
+        self.contact.process_mailchimp_update()
+        self.contact.process_mailchimp_update()
+        self.assertEqual(len(self._get_rows()), 1)
+
+    def test_update_in_batch(self):
+        stand_in = MailchimpStandIn({("list1", "hash1"): {}})
+        self.contact.process_mailchimp_update()
+        self._run_outbox(stand_in)
+
+        self.assertEqual(len(stand_in.batches), 1)
+        self.assertEqual(
+            stand_in.members[("list1", "hash1")]["email_address"],
+            "sync@example.com")
+        self.assertFalse(self._get_rows())
+
+    def test_lost_member_is_exported_again(self):
+        stand_in = MailchimpStandIn()
+        self.contact.process_mailchimp_update()
+        self._run_outbox(stand_in)
+
+        self.assertFalse(self.subscription.mailchimp_id)
+        self.assertFalse(self._get_rows())
+
+    def test_archive_in_batch(self):
+        stand_in = MailchimpStandIn({("list1", "hash1"): {}})
+        self.contact.action_archive_from_mailchimp()
+        self._run_outbox(stand_in)
+
+        self.assertNotIn(("list1", "hash1"), stand_in.members)
+        self.assertFalse(self._get_rows())
+
+    def test_failed_operation_is_retried(self):
+        stand_in = MailchimpStandIn({("list1", "hash1"): {}}, errors=1)
+        self.contact.process_mailchimp_update()
+        self._run_outbox(stand_in)
+        self._run_outbox(stand_in)
+
+        self.assertEqual(len(stand_in.batches), 2)
+        self.assertEqual(
+            stand_in.members[("list1", "hash1")]["email_address"],
+            "sync@example.com")
+        self.assertFalse(self._get_rows())
+
+    def test_failed_operation_is_kept_after_retries(self):
+        self.env["ir.config_parameter"].sudo().set_param(
+            "mass_mailing_switzerland.mailchimp_max_retries", 1)
+        stand_in = MailchimpStandIn({("list1", "hash1"): {}}, errors=5)
+        self.contact.process_mailchimp_update()
+        self._run_outbox(stand_in)
+        self._run_outbox(stand_in)
+
+        self.assertEqual(len(stand_in.batches), 2)
+        row = self._get_rows()
+        self.assertEqual(row.state, "failed")
+        self.assertEqual(row.retry_count, 1)
+        self.assertIn("Internal Error", row.error)
@@ -8,6 +8,9 @@
 #
 ##############################################################################
 import logging
+import threading
+from contextlib import contextmanager
+
 from odoo.tools.config import config
 
 logger = logging.getLogger(__name__)
@@ -17,11 +20,75 @@ try:
 except ImportError:
     logger.warning("Please install MySQLdb")
 
+# MySQL errors for which the connection must be reopened
+# (server has gone away, lost connection).
+RECONNECT_ERRORS = (2006, 2013)
+
+
+class MysqlConnectionPool(object):
+    """ Process-wide pool of MySQL connections, keyed by connection settings.
+    Idle connections are checked before being reused and reopened if the
+    server closed them.
+    The maximum number of idle connections kept for each server can be set
+    with the option mysql_pool_size in the .conf file of Odoo (default 5).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._idle = {}
+
+    def acquire(self, key):
+        """ Get a connection to the server given by key (host, user, pw, db).
+        """
+        while True:
+            with self._lock:
+                idle = self._idle.get(key)
+                con = idle.pop() if idle else None
+            if con is None:
+                return self._connect(key)
+            try:
+                con.ping()
+                return con
+            except MySQLdb.Error:
+                self._close(con)
+
+    def release(self, key, con):
+        """ Give back a connection to the pool. Uncommitted work is lost. """
+        try:
+            con.rollback()
+        except MySQLdb.Error:
+            self._close(con)
+            return
+        max_size = int(config.get("mysql_pool_size") or 5)
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < max_size:
+                idle.append(con)
+                return
+        self._close(con)
+
+    @staticmethod
+    def _connect(key):
+        host, user, password, db = key
+        return MySQLdb.connect(host, user, password, db, charset="utf8")
+
+    @staticmethod
+    def _close(con):
+        try:
+            con.close()
+        except MySQLdb.Error:
+            logger.debug("MySQL connection already closed", exc_info=True)
+
+
+_pool = MysqlConnectionPool()
+
 
 class MysqlConnector(object):
 
     """ Contains all the utility methods needed to talk with a MySQL server
     which connection settings are stored in the object mysql.config.settings.
+    Connections are taken from a process-wide pool and given back when the
+    connector is deleted or closed.
     """
 
     def __init__(
@@ -36,20 +103,65 @@ class MysqlConnector(object):
         mu = config.get(mysql_user)
         mp = config.get(mysql_pw)
         md = config.get(mysql_db)
+        self._key = (mh, mu, mp, md)
         self._con = False
+        self._in_transaction = False
         try:
-            self._con = MySQLdb.connect(mh, mu, mp, md, charset="utf8")
+            self._con = _pool.acquire(self._key)
             self._cur = self._con.cursor(MySQLdb.cursors.DictCursor)
         except MySQLdb.Error as e:
             logger.debug(f"Error {e.args[0]}: {e.args[1]}")
 
     def __del__(self):
-        """ Close the MySQL connection. """
+        """ Give back the MySQL connection to the pool. """
+        self.close()
+
+    def close(self):
+        """ Give back the MySQL connection to the pool. """
         if self._con:
-            self._con.close()
+            _pool.release(self._key, self._con)
+            self._con = False
+
+    @contextmanager
+    def transaction(self):
+        """ Group several queries in one transaction, committed at the end
+        of the block or rolled back if an error occurs.
+        Usage:
+            with connector.transaction():
+                connector.query(...)
+                connector.upsert_many(...)
+        """
+        if self._in_transaction:
+            # Nested blocks are part of the outer transaction
+            yield self
+            return
+        self._in_transaction = True
+        try:
+            yield self
+            self._con.commit()
+        except Exception:
+            self._con.rollback()
+            raise
+        finally:
+            self._in_transaction = False
+
+    def _execute(self, statement, args=None):
+        """ Execute a statement, reconnecting once if the server closed the
+        connection (only outside of transactions, where nothing is lost). """
+        try:
+            self._cur.execute(statement, args)
+        except MySQLdb.OperationalError as e:
+            if self._in_transaction or e.args[0] not in RECONNECT_ERRORS:
+                raise
+            logger.info("MySQL connection lost, reconnecting.")
+            MysqlConnectionPool._close(self._con)
+            self._con = _pool.acquire(self._key)
+            self._cur = self._con.cursor(MySQLdb.cursors.DictCursor)
+            self._cur.execute(statement, args)
 
     def query(self, statement, args=None):
         """ Performs a MySQL query that has no return value.
+        The query is committed, unless it is run inside a transaction block.
         Args:
             - statement (string) : the query to be executed.
             - args (list or dict) : the arguments of the query. If args is a
@@ -62,8 +174,9 @@ class MysqlConnector(object):
         """
         if args and not isinstance(args, (list, tuple, dict)):
             args = [args]
-        self._cur.execute(statement, args)
-        self._con.commit()
+        self._execute(statement, args)
+        if not self._in_transaction:
+            self._con.commit()
         return self._cur.lastrowid or True
 
     def select_one(self, statement, args=None):
@@ -83,7 +196,7 @@ class MysqlConnector(object):
         """
         if args and not isinstance(args, (list, tuple, dict)):
             args = [args]
-        self._cur.execute(statement, args)
+        self._execute(statement, args)
         return self._cur.fetchone() or dict()
 
     def select_all(self, statement, args=None):
@@ -105,7 +218,7 @@ class MysqlConnector(object):
         """
         if args and not isinstance(args, (list, tuple, dict)):
             args = [args]
-        self._cur.execute(statement, args)
+        self._execute(statement, args)
         return self._cur.fetchall() or list()
 
     def is_alive(self):
@@ -139,3 +252,27 @@ class MysqlConnector(object):
         log_string = "UPSERT {0}({1}) WITH VALUES ({2})"
         logger.debug(log_string.format(table, col_string, val_string) % tuple(values))
         return self.query(sql_query, values)
+
+    def upsert_many(self, table, rows, chunk_size=500):
+        """Inserts or updates several rows (given as a list of dictionaries
+        having the same keys) with multi-rows UPSERT queries of at most
+        chunk_size rows.
+        :return: number of rows sent
+        """
+        if not rows:
+            return 0
+        cols = list(rows[0].keys())
+        col_string = ",".join(cols)
+        row_string = "(" + ",".join(["%s"] * len(cols)) + ")"
+        update_string = ",".join([key + "=VALUES(" + key + ")" for key in cols])
+        with self.transaction():
+            for i in range(0, len(rows), chunk_size):
+                chunk = rows[i: i + chunk_size]
+                sql_query = "INSERT INTO {0}({1}) VALUES {2} ON DUPLICATE KEY " \
+                    "UPDATE {3}".format(
+                        table, col_string, ",".join([row_string] * len(chunk)),
+                        update_string)
+                values = [row[col] for row in chunk for col in cols]
+                logger.debug("UPSERT %s rows in %s(%s)", len(chunk), table, col_string)
+                self.query(sql_query, values)
+        return len(rows)
@@ -70,6 +70,7 @@
         "data/ir.advanced.translation.csv",
         "data/label_print.xml",
         "data/queue_job.xml",
+        "data/static_document.xml",
         "data/sponsorship_action_rules.xml",
         "data/utm_data.xml",
         "report/onboarding_photo_by_post.xml",
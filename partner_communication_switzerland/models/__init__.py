@@ -28,3 +28,4 @@ from . import res_partner_zoom_session
 from . import res_partner_zoom_attendee
 from . import field_office
 from . import partner_communication_config
+from . import static_document
@@ -12,8 +12,6 @@ import time
 import logging
 import re
 
-import requests
-
 from ..wizards.generate_communication_wizard import SMS_CHAR_LIMIT, SMS_COST
 from math import ceil
 from collections import OrderedDict
@@ -22,6 +20,7 @@ from io import BytesIO
 
 from dateutil.relativedelta import relativedelta
 from odoo.addons.sponsorship_compassion.models.product_names import GIFT_REF
+from .static_document import LSV_DD_FORM_URL
 
 from odoo import api, models, _, fields
 from odoo.exceptions import MissingError, UserError
@@ -401,32 +400,28 @@ class PartnerCommunication(models.Model):
         """
         self.ensure_one()
         sponsorships = self.get_objects()
-        payment_mode_bvr = self.env.ref("sponsorship_switzerland.payment_mode_bvr")
-        pm_permanent = self.env.ref(
-            "sponsorship_switzerland.payment_mode_permanent_order")
         attachments = dict()
         # IF payment mode is BVR and partner is paying
         # attach sponsorship payment slips
-        # Year 2022 only: we send Permanent Orders again for QR-update!
-        pay_bvr = sponsorships.filtered(
-            lambda s: s.payment_mode_id in (payment_mode_bvr, pm_permanent)
-            and s.partner_id == self.partner_id
-        )
-        if pay_bvr and pay_bvr.must_pay_next_year():
-            today = date.today()
-            date_start = today.replace(today.year + 1, 1, 1)
-            date_stop = date_start.replace(month=12, day=31)
+        pay_bvr = self._get_yearly_bvr_sponsorships(sponsorships, self.partner_id)
+        if pay_bvr:
             report_name = f"report_compassion.2bvr_sponsorship"
-            data = {
-                "doc_ids": pay_bvr.ids,
-                "date_start": date_start,
-                "date_stop": date_stop,
-                "background": self.send_mode != "physical",
-            }
-            pdf = self._get_pdf_from_data(
-                data, self.env.ref(
-                    f"report_compassion.report_2bvr_sponsorship")
-            )
+            background = self.send_mode != "physical"
+            # Slips may have been rendered in batch for the yearly run
+            pdf = self.env.context.get("yearly_payment_slips", {}).get(
+                (tuple(sorted(pay_bvr.ids)), background))
+            if not pdf:
+                date_start, date_stop = self._get_yearly_slips_period()
+                data = {
+                    "doc_ids": pay_bvr.ids,
+                    "date_start": date_start,
+                    "date_stop": date_stop,
+                    "background": background,
+                }
+                pdf = self._get_pdf_from_data(
+                    data, self.env.ref(
+                        f"report_compassion.report_2bvr_sponsorship")
+                )
             attachments.update({_("sponsorship payment slips.pdf"): [report_name, pdf]})
         # Attach gifts for correspondents
         pays_gift = self.env["recurring.contract"]
@@ -449,6 +444,116 @@ class PartnerCommunication(models.Model):
             attachments.update({_("sponsorship gifts.pdf"): [report_name, pdf]})
         return attachments
 
+    @api.model
+    def _get_yearly_bvr_sponsorships(self, sponsorships, partner):
+        """
+        Sponsorships for which the partner receives the yearly payment slips.
+        :return: recurring.contract recordset (empty if nothing to pay)
+        """
+        payment_mode_bvr = self.env.ref("sponsorship_switzerland.payment_mode_bvr")
+        pm_permanent = self.env.ref(
+            "sponsorship_switzerland.payment_mode_permanent_order")
+        # Year 2022 only: we send Permanent Orders again for QR-update!
+        pay_bvr = sponsorships.filtered(
+            lambda s: s.payment_mode_id in (payment_mode_bvr, pm_permanent)
+            and s.partner_id == partner
+        )
+        if pay_bvr and pay_bvr.must_pay_next_year():
+            return pay_bvr
+        return sponsorships.browse()
+
+    @api.model
+    def _get_yearly_slips_period(self):
+        today = date.today()
+        date_start = today.replace(today.year + 1, 1, 1)
+        return date_start, date_start.replace(month=12, day=31)
+
+    @api.model
+    def render_yearly_payment_slips(self, slip_requests, background):
+        """
+        Render the yearly payment slips of many communications with one
+        report rendering, then split the PDF per communication. Each
+        document starts on a new page, so that its pages can be cut from
+        the rendered PDF.
+        :param slip_requests: list of recurring.contract recordsets, the
+                              sponsorships of the slips of each communication
+        :param background: True to print the background of the slips
+        :return: dict {(sorted sponsorship ids, background): base64 pdf}.
+                 Documents that could not be rendered in batch are missing
+                 and must be rendered alone.
+        """
+        start_time = time.time()
+        date_start, date_stop = self._get_yearly_slips_period()
+        months = []
+        month = date_start
+        while month <= date_stop:
+            months.append(month)
+            month += relativedelta(months=1)
+
+        # Keep the documents whose slips can be computed and whose payment
+        # groups are not shared with another document
+        documents = []
+        group_owners = {}
+        for slip_request in slip_requests:
+            sponsorships = slip_request.filtered(
+                lambda s: s.state not in ("terminated", "cancelled"))
+            groups = sponsorships.mapped("group_id")
+            if not groups or any(g.id in group_owners for g in groups):
+                continue
+            try:
+                with self.env.cr.savepoint():
+                    slips = groups.get_payment_slips(list(months), sponsorships)
+            except (UserError, ValueError):
+                continue
+            slip_count = sum(len(group_slips) for group_slips in slips.values())
+            if not slip_count:
+                continue
+            for group in groups:
+                group_owners[group.id] = sponsorships
+            documents.append((
+                slip_request, sponsorships, groups, int(ceil(slip_count / 2.0))))
+        if not documents:
+            return {}
+
+        all_sponsorships = self.env["recurring.contract"].union(
+            *[document[1] for document in documents])
+        report = self.env.ref(
+            "report_compassion.report_2bvr_sponsorship").with_context(
+            must_skip_send_to_printer=True)
+        pdf_data = report.render_qweb_pdf(all_sponsorships.ids, {
+            "doc_ids": all_sponsorships.ids,
+            "date_start": date_start,
+            "date_stop": date_stop,
+            "background": background,
+            "page_break_groups": [document[2][0].id for document in documents],
+        })[0]
+        pdf = PdfFileReader(BytesIO(pdf_data))
+        total_pages = sum(document[3] for document in documents)
+        if pdf.numPages != total_pages:
+            _logger.warning(
+                "Payment slips batch gave %s pages instead of %s: the "
+                "documents will be rendered one by one.",
+                pdf.numPages, total_pages)
+            return {}
+
+        result = dict()
+        page = 0
+        for slip_request, sponsorships, groups, page_count in documents:
+            writer = PdfFileWriter()
+            for i in range(page, page + page_count):
+                writer.addPage(pdf.getPage(i))
+            page += page_count
+            output = BytesIO()
+            writer.write(output)
+            result[(tuple(sorted(slip_request.ids)), background)] = \
+                base64.encodebytes(output.getvalue())
+        duration = time.time() - start_time
+        _logger.info(
+            "Rendered payment slips of %s communications (%s pages) in %.1fs "
+            "(%.1f communications/s)", len(documents), total_pages, duration,
+            len(documents) / (duration or 1))
+        return result
+
     def get_photo_by_post_attachment(self):
         self.ensure_one()
         attachments = self.get_child_picture_attachment()
@@ -793,10 +898,8 @@ class PartnerCommunication(models.Model):
             lambda s: s.payment_mode_id in lsv_dd_modes)
         if lsv_dd_sponsorships and not self.partner_id.valid_mandate_id:
             lang = self.env.lang[:2].upper() if self.env.lang != "en_US" else "DE"
-            pdf_form = base64.b64encode(requests.get(
-                f"https://compassion.ch/wp-content/uploads/documents_compassion/"
-                f"Formulaire_LSV_DD_{lang}.pdf"
-            ).content)
+            pdf_form = self.env["partner.communication.static.document"]\
+                .get_document("lsv_dd_form", lang, LSV_DD_FORM_URL.format(lang=lang))
             attachments.update({_("bank authorization form.pdf"): [
                 "partner_communication.a4_no_margin", pdf_form]
             })
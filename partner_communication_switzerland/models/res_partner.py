@@ -266,6 +266,14 @@ class ResPartner(models.Model):
         )
         total = len(partners)
         count = 1
+        amounts = self._get_receipt_amounts(today.year - 1, partners.ids)
+        email_limit = int(
+            self.env["ir.config_parameter"]
+                .sudo()
+                .get_param(
+                "partner_communication_switzerland.tax_receipt_email_limit", "1000"
+            )
+        )
         for partner in partners:
             _logger.info(f"Generating tax receipts: {count}/{total}")
             comm_vals = {
@@ -278,14 +286,7 @@ class ResPartner(models.Model):
             }
 
             self.env["partner.communication.job"].create(comm_vals)
-            donation_amount = partner.get_receipt(today.year - 1)
-            email_limit = int(
-                self.env["ir.config_parameter"]
-                    .sudo()
-                    .get_param(
-                    "partner_communication_switzerland.tax_receipt_email_limit", "1000"
-                )
-            )
+            donation_amount = amounts.get(partner.id, 0.0)
             if (
                     partner.tax_certificate != "only_email"
                     and donation_amount > email_limit
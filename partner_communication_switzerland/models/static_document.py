@@ -0,0 +1,172 @@
+##############################################################################
+#
+#    Copyright (C) 2022 Compassion CH (http://www.compassion.ch)
+#    Releasing children from poverty in Jesus' name
+#
+#    The licence is in the file __manifest__.py
+#
+##############################################################################
+import base64
+import logging
+from datetime import timedelta
+
+import psycopg2
+import requests
+
+from odoo import api, models, fields, _
+from odoo.exceptions import UserError
+from odoo.tools import file_open
+
+_logger = logging.getLogger(__name__)
+
+LSV_DD_FORM_URL = (
+    "https://compassion.ch/wp-content/uploads/documents_compassion/"
+    "Formulaire_LSV_DD_{lang}.pdf"
+)
+# (connect, read) timeouts when downloading a document
+DOWNLOAD_TIMEOUT = (5, 30)
+
+
+class StaticDocument(models.Model):
+    """ Copy of a document published on the website and attached to the
+    communications, for instance the bank authorization form. A document is
+    first stored from the copy shipped with the module, then downloaded and
+    revalidated with its ETag and Last-Modified headers by the CRON. The
+    communications only use the stored copy and never wait for the website.
+    """
+    _name = "partner.communication.static.document"
+    _description = "Communication static document"
+    _rec_name = "url"
+
+    code = fields.Char(required=True, readonly=True)
+    lang_code = fields.Char(required=True, readonly=True)
+    url = fields.Char(required=True, readonly=True)
+    file_path = fields.Char(
+        readonly=True, help="Copy shipped with the module, used until the "
+                            "document is downloaded.")
+    attachment_id = fields.Many2one(
+        "ir.attachment", "Document", ondelete="set null", readonly=True)
+    etag = fields.Char(readonly=True)
+    last_modified = fields.Char(readonly=True)
+    last_check = fields.Datetime(readonly=True)
+
+    _sql_constraints = [
+        ("unique_document", "unique(code, lang_code)",
+         "Only one document per language is allowed")
+    ]
+
+    ##########################################################################
+    #                             PUBLIC METHODS                             #
+    ##########################################################################
+    @api.model
+    def get_document(self, code, lang_code, url):
+        """
+        Get the stored copy of a document. A document which was never stored
+        is registered for the CRON, the website is never called here.
+        :param code: identifier of the document
+        :param lang_code: language of the document (DE, FR, IT)
+        :param url: address of the document on the website
+        :return: base64 encoded document
+        """
+        document = self.sudo().search([
+            ("code", "=", code), ("lang_code", "=", lang_code)])
+        if not document:
+            document = self._create_document(code, lang_code, url)
+        if not document.attachment_id:
+            document._store_module_file()
+        if not document.attachment_id:
+            _logger.error("Document %s is not available", url)
+            raise UserError(
+                _("The document %s is not available yet, please retry when "
+                  "it is downloaded.") % url)
+        return document.attachment_id.datas
+
+    @api.model
+    def store_module_files(self):
+        """ Store the copies shipped with the module of the documents which
+        were never downloaded. Called at installation. """
+        self.sudo().search([
+            ("attachment_id", "=", False), ("file_path", "!=", False)
+        ])._store_module_file()
+        return True
+
+    @api.model
+    def refresh_documents(self):
+        """ CRON revalidating the documents older than the refresh interval. """
+        hours = int(self.env["ir.config_parameter"].sudo().get_param(
+            "partner_communication_switzerland.static_document_refresh_hours", 24))
+        limit = fields.Datetime.now() - timedelta(hours=hours)
+        self.sudo().search([
+            "|", ("last_check", "=", False), ("last_check", "<", limit)
+        ])._download()
+        return True
+
+    ##########################################################################
+    #                             PRIVATE METHODS                            #
+    ##########################################################################
+    @api.model
+    def _create_document(self, code, lang_code, url):
+        try:
+            with self.env.cr.savepoint():
+                return self.sudo().create({
+                    "code": code, "lang_code": lang_code, "url": url})
+        except psycopg2.IntegrityError:
+            # Created at the same time by another communication
+            return self.sudo().search([
+                ("code", "=", code), ("lang_code", "=", lang_code)])
+
+    @api.multi
+    def _store_module_file(self):
+        for document in self.filtered("file_path"):
+            try:
+                with file_open(document.file_path, "rb") as document_file:
+                    data = base64.b64encode(document_file.read())
+            except (IOError, ValueError):
+                _logger.warning("Document %s is missing in the module",
+                                document.file_path)
+                continue
+            document.attachment_id = self._create_attachment(document, data)
+
+    @api.model
+    def _create_attachment(self, document, data):
+        return self.env["ir.attachment"].create({
+            "name": document.url.split("/")[-1],
+            "datas_fname": document.url.split("/")[-1],
+            "datas": data,
+            "res_model": self._name,
+            "res_id": document.id,
+        })
+
+    @api.multi
+    def _download(self):
+        """ Download the documents which changed since the last check. """
+        for document in self:
+            headers = {}
+            if document.attachment_id:
+                if document.etag:
+                    headers["If-None-Match"] = document.etag
+                if document.last_modified:
+                    headers["If-Modified-Since"] = document.last_modified
+            try:
+                response = requests.get(
+                    document.url, headers=headers, timeout=DOWNLOAD_TIMEOUT)
+                if response.status_code != 304:
+                    response.raise_for_status()
+            except requests.RequestException:
+                _logger.warning("Document %s could not be checked, the stored "
+                                "copy is kept.", document.url, exc_info=True)
+                continue
+            vals = {"last_check": fields.Datetime.now()}
+            if response.status_code == 200:
+                vals.update({
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                })
+                data = base64.b64encode(response.content)
+                if document.attachment_id:
+                    document.attachment_id.datas = data
+                else:
+                    vals["attachment_id"] = self._create_attachment(
+                        document, data).id
+                _logger.info("Document %s was updated", document.url)
+            document.write(vals)
@@ -14,3 +14,5 @@ from . import test_sms_provider
 from . import test_hold_expiration
 from . import test_lifecycle_events
 from . import test_onboarding
+from . import test_static_document
+from . import test_yearly_payment_slips
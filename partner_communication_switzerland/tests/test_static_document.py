@@ -0,0 +1,85 @@
+##############################################################################
+#
+#    Copyright (C) 2022 Compassion CH (http://www.compassion.ch)
+#    Releasing children from poverty in Jesus' name
+#
+#    The licence is in the file __manifest__.py
+#
+##############################################################################
+import base64
+
+import mock
+import requests
+
+from odoo.exceptions import UserError
+from odoo.tests import SavepointCase
+
+mock_get = (
+    "odoo.addons.partner_communication_switzerland.models.static_document"
+    ".requests.get"
+)
+URL = "https://example.com/form_DE.pdf"
+
+
+def _response(status_code, content=b"", headers=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = content
+    response.headers.update(headers or {})
+    return response
+
+
+class TestStaticDocument(SavepointCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.document_obj = cls.env["partner.communication.static.document"]
+
+    def _download(self, get, content=b"form", headers=None):
+        """ Store the document as the CRON would do it. """
+        get.return_value = _response(200, content, headers)
+        document = self.document_obj._create_document("test_form", "DE", URL)
+        self.document_obj.refresh_documents()
+        return document
+
+    @mock.patch(mock_get)
+    def test_document_is_never_downloaded_by_communications(self, get):
+        with self.assertRaises(UserError):
+            self.document_obj.get_document("test_form", "DE", URL)
+        self._download(get)
+        call_count = get.call_count
+        data = self.document_obj.get_document("test_form", "DE", URL)
+        self.assertEqual(base64.b64decode(data), b"form")
+        self.assertEqual(get.call_count, call_count)
+
+    @mock.patch(mock_get)
+    def test_module_file_is_used_before_download(self, get):
+        self.document_obj.create({
+            "code": "test_form", "lang_code": "DE", "url": URL,
+            "file_path": "partner_communication_switzerland/static/src/test.pdf",
+        })
+        data = self.document_obj.get_document("test_form", "DE", URL)
+        self.assertTrue(base64.b64decode(data).startswith(b"%PDF"))
+        get.assert_not_called()
+
+    @mock.patch(mock_get)
+    def test_document_is_revalidated(self, get):
+        document = self._download(get, headers={"ETag": '"v1"'})
+        document.last_check = False
+
+        get.return_value = _response(304)
+        self.document_obj.refresh_documents()
+        self.assertEqual(
+            get.call_args[1]["headers"]["If-None-Match"], '"v1"')
+        self.assertTrue(document.last_check)
+
+    @mock.patch(mock_get)
+    def test_offline_fallback(self, get):
+        document = self._download(get)
+        document.last_check = False
+
+        get.side_effect = requests.ConnectionError()
+        self.document_obj.refresh_documents()
+        data = self.document_obj.get_document("test_form", "DE", URL)
+        self.assertEqual(base64.b64decode(data), b"form")
+        self.assertFalse(document.last_check)
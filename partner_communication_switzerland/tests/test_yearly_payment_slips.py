@@ -0,0 +1,114 @@
+##############################################################################
+#
+#    Copyright (C) 2022 Compassion CH (http://www.compassion.ch)
+#    Releasing children from poverty in Jesus' name
+#
+#    The licence is in the file __manifest__.py
+#
+##############################################################################
+import base64
+from io import BytesIO
+
+import mock
+from PyPDF2 import PdfFileReader, PdfFileWriter
+
+from odoo.addons.sponsorship_compassion.tests.test_sponsorship_compassion import (
+    BaseSponsorshipTest,
+)
+
+mock_get_pdf = (
+    "odoo.addons.base_report_to_printer."
+    "models.ir_actions_report.IrActionsReport.render_qweb_pdf"
+)
+mock_get_slips = (
+    "odoo.addons.report_compassion.models.contract_group"
+    ".ContractGroup.get_payment_slips"
+)
+
+
+def _pdf(page_count):
+    """ PDF whose pages can be recognized by their width. """
+    writer = PdfFileWriter()
+    for i in range(page_count):
+        writer.addBlankPage(100 + i, 842)
+    output = BytesIO()
+    writer.write(output)
+    return output.getvalue()
+
+
+def _page_widths(pdf_data):
+    pdf = PdfFileReader(BytesIO(base64.b64decode(pdf_data)))
+    return [int(pdf.getPage(i).mediaBox.getWidth()) for i in range(pdf.numPages)]
+
+
+class TestYearlyPaymentSlips(BaseSponsorshipTest):
+    def setUp(self):
+        super().setUp()
+        self.job_obj = self.env["partner.communication.job"]
+        self.slip_counts = {}
+        self.documents = []
+        for i, slip_count in enumerate((3, 1, 2)):
+            group = self.create_group({"partner_id": self.michel.id})
+            sponsorship = self.create_contract({
+                "child_id": self.create_child(f"UG7232{i:04d}").id,
+                "group_id": group.id,
+                "partner_id": self.michel.id,
+            }, [{"amount": 50.0}])
+            self.slip_counts[group.id] = slip_count
+            self.documents.append(sponsorship)
+
+    def _get_slips(self, months, sponsorships):
+        return {
+            group.id: [{}] * self.slip_counts[group.id]
+            for group in sponsorships.mapped("group_id")
+        }
+
+    def _key(self, sponsorships):
+        return tuple(sorted(sponsorships.ids)), True
+
+    @mock.patch(mock_get_slips)
+    @mock.patch(mock_get_pdf)
+    def test_each_communication_gets_its_pages(self, get_pdf, get_slips):
+        get_slips.side_effect = self._get_slips
+        # Odd slip counts start the next communication on a new page
+        get_pdf.return_value = (_pdf(4), "pdf")
+        slips = self.job_obj.render_yearly_payment_slips(self.documents, True)
+
+        args, kwargs = get_pdf.call_args
+        data = kwargs.get("data") or args[-1]
+        self.assertEqual(
+            data["doc_ids"], [sponsorship.id for sponsorship in self.documents])
+        self.assertEqual(
+            data["page_break_groups"],
+            [sponsorship.group_id.id for sponsorship in self.documents])
+        self.assertEqual(len(slips), 3)
+        self.assertEqual(_page_widths(slips[self._key(self.documents[0])]),
+                         [100, 101])
+        self.assertEqual(_page_widths(slips[self._key(self.documents[1])]),
+                         [102])
+        self.assertEqual(_page_widths(slips[self._key(self.documents[2])]),
+                         [103])
+
+    @mock.patch(mock_get_slips)
+    @mock.patch(mock_get_pdf)
+    def test_communication_without_slip_is_rendered_alone(
+            self, get_pdf, get_slips):
+        # Group without bvr_reference
+        self.slip_counts[self.documents[1].group_id.id] = 0
+        get_slips.side_effect = self._get_slips
+        get_pdf.return_value = (_pdf(3), "pdf")
+        slips = self.job_obj.render_yearly_payment_slips(self.documents, True)
+
+        self.assertNotIn(self._key(self.documents[1]), slips)
+        self.assertEqual(_page_widths(slips[self._key(self.documents[0])]),
+                         [100, 101])
+        self.assertEqual(_page_widths(slips[self._key(self.documents[2])]),
+                         [102])
+
+    @mock.patch(mock_get_slips)
+    @mock.patch(mock_get_pdf)
+    def test_unexpected_page_count_renders_one_by_one(self, get_pdf, get_slips):
+        get_slips.side_effect = self._get_slips
+        get_pdf.return_value = (_pdf(3), "pdf")
+        slips = self.job_obj.render_yearly_payment_slips(self.documents, True)
+        self.assertEqual(slips, {})
@@ -8,6 +8,7 @@
 #
 ##############################################################################
 import logging
+from collections import OrderedDict, defaultdict
 
 from math import ceil
 
@@ -129,6 +130,9 @@ class GenerateCommunicationWizard(models.TransientModel):
             default_utm_campaign_id=self.campaign_id.id,
             default_sms_provider_id=self.sms_provider_id.id,
         )
+        if self.res_model == "recurring.contract" and \
+                self.model_id.attachments_function == "get_yearly_payment_slips":
+            return wizard._generate_yearly_payment_slips(async_mode)
         if self.res_model == "recurring.contract":
             for sponsorship in self.sponsorship_ids:
                 if self.partner_source == "send_gifts_to":
@@ -154,3 +158,68 @@ class GenerateCommunicationWizard(models.TransientModel):
             return super(GenerateCommunicationWizard, wizard).generate_communications(
                 async_mode
             )
+
+    def _generate_yearly_payment_slips(self, async_mode=True):
+        """
+        Create the yearly payment slips communications by chunks of
+        partners, so that the slips of a chunk are rendered together.
+        """
+        batch_size = int(self.env["ir.config_parameter"].sudo().get_param(
+            "partner_communication_switzerland.payment_slips_batch_size", 100))
+        vals_by_partner = OrderedDict()
+        for sponsorship in self.sponsorship_ids:
+            if self.partner_source == "send_gifts_to":
+                partner = sponsorship.mapped(sponsorship.send_gifts_to)
+            else:
+                partner = sponsorship.mapped(self.partner_source)
+            if partner.id in vals_by_partner:
+                vals_by_partner[partner.id]["object_ids"].append(sponsorship.id)
+                continue
+            vals = {
+                "partner_id": partner.id,
+                "object_ids": [sponsorship.id],
+                "config_id": self.model_id.id,
+            }
+            if self.send_mode:
+                vals.update({
+                    "send_mode": self.send_mode,
+                    "auto_send": False,
+                })
+            vals_by_partner[partner.id] = vals
+        vals_list = list(vals_by_partner.values())
+        for i in range(0, len(vals_list), batch_size):
+            if async_mode:
+                self.with_delay().create_yearly_payment_slips(
+                    vals_list[i:i + batch_size])
+            else:
+                self.create_yearly_payment_slips(vals_list[i:i + batch_size])
+        return True
+
+    @api.multi
+    def create_yearly_payment_slips(self, vals_list):
+        """
+        Create communications of the yearly payment slips, after rendering
+        the slips of all of them in batch.
+        :param vals_list: list of values for creating the communications
+        :return: True
+        """
+        job_obj = self.env["partner.communication.job"]
+        slip_requests = defaultdict(list)
+        for vals in vals_list:
+            partner = self.env["res.partner"].browse(vals["partner_id"])
+            pay_bvr = job_obj._get_yearly_bvr_sponsorships(
+                self.env["recurring.contract"].browse(vals["object_ids"]),
+                partner)
+            if pay_bvr:
+                # Same send mode as the communication will get, which can
+                # come from the partner preferences
+                send_mode = vals.get("send_mode") or \
+                    self.model_id.get_inform_mode(partner)[0]
+                slip_requests[send_mode != "physical"].append(pay_bvr)
+        slips = dict()
+        for background, requests in slip_requests.items():
+            slips.update(job_obj.render_yearly_payment_slips(requests, background))
+        wizard = self.with_context(yearly_payment_slips=slips)
+        for vals in vals_list:
+            wizard.create_communication(vals)
+        return True
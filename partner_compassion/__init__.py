@@ -9,6 +9,7 @@
 ##############################################################################
 from . import controllers
 from . import models
+from . import tools
 from . import wizards
 from . import forms
 from .hooks import post_init_hook
@@ -23,3 +23,4 @@ from . import mail_activity
 from . import partner_segment
 from . import parter_segment_affinity
 from . import res_users
+from . import secure_partner_data
@@ -8,7 +8,6 @@
 #
 ##############################################################################
 import logging
-import tempfile
 import uuid
 import base64
 import re
@@ -18,6 +17,8 @@ from odoo.exceptions import UserError
 from odoo.tools import mod10r
 from odoo.tools.config import config
 
+from ..tools.sftp_pool import sftp_pool
+
 # fields that are synced if 'use_parent_address' is checked
 ADDRESS_FIELDS = [
     "street",
@@ -45,8 +46,6 @@ regex_order = re.compile('^similarity\((.*),.*\)(\s+(desc|asc))?$', re.I)
 try:
     import magic
     MAGIC_INSTALLED = True
-    import pyminizip
-    import csv
     import pysftp
     from pysftp import RSAKey
 except ImportError:
@@ -777,53 +776,24 @@ class ResPartner(models.Model):
 
     def _secure_save_data(self):
         """
-        Stores partner name and address in a CSV file on NAS,
-        inside a password-protected ZIP file.
+        Queues partner name and address to be stored in a CSV file on NAS,
+        inside a password-protected ZIP file. The rows are written on the NAS
+        by the CRON of res.partner.secure.data.
         :return: None
         """
-        sftp = self._get_sftp_connection()
-        if sftp:
-            config_obj = self.env["ir.config_parameter"].sudo()
-            store_path = config_obj.get_param("partner_compassion.store_path")
-            src_zip_file = tempfile.NamedTemporaryFile()
-            file_size = sftp.getfo(store_path, src_zip_file)
-            if file_size:
-                src_zip_file.flush()
-                zip_dir = tempfile.mkdtemp()
-                pyminizip.uncompress(src_zip_file.name, SftpConfig.file_pw, zip_dir, 0)
-                csv_path = zip_dir + "/partner_data.csv"
-                with open(csv_path, "a", newline="", encoding="utf-8") as csv_file:
-                    csv_writer = csv.writer(csv_file)
-                    csv_writer.writerow(
-                        [
-                            str(self.id),
-                            self.ref,
-                            self.contact_address,
-                            fields.Date.today(),
-                        ]
-                    )
-                dst_zip_file = tempfile.NamedTemporaryFile()
-                pyminizip.compress(csv_path, "", dst_zip_file.name, SftpConfig.file_pw, 5)
-                try:
-                    sftp.putfo(dst_zip_file, store_path)
-                except Exception:
-                    logger.error(
-                        "Couldn't store secure partner data on NAS. "
-                        "Please do it manually by replicating the following "
-                        "file: " + dst_zip_file.name
-                    )
-                finally:
-                    src_zip_file.close()
-                    dst_zip_file.close()
+        if not SftpConfig.is_configured():
+            return
+        self.env["res.partner.secure.data"].sudo().create([{
+            "partner_id": partner.id,
+            "ref": partner.ref,
+            "contact_address": partner.contact_address,
+        } for partner in self])
 
     def _get_sftp_connection(self):
-        """" Retrieve configuration SMB """
-        if not (
-                SftpConfig.username
-                and SftpConfig.password
-                and SftpConfig.host
-                and SftpConfig.port
-        ):
+        """" Retrieve configuration SMB
+        :return: context manager giving a connection from the SFTP pool
+        """
+        if not SftpConfig.is_configured():
             return False
         else:
 
@@ -839,8 +809,9 @@ class ResPartner(models.Model):
                     "No hostkeys defined in StfpConnection. Connection will be unsecured. "
                     "Please configure parameter sbc_switzerland.nas_ssh_key with ssh_key data.")
 
-            return pysftp.Connection(username=SftpConfig.username, password=SftpConfig.password, port=SftpConfig.port,
-                                     host=SftpConfig.host, cnopts=cnopts)
+            return sftp_pool.connection(
+                username=SftpConfig.username, password=SftpConfig.password,
+                port=SftpConfig.port, host=SftpConfig.host, cnopts=cnopts)
 
     def _get_active_sponsorships_domain(self):
         """
@@ -888,3 +859,7 @@ class SftpConfig:
     host = config.get("sftp_ip")
     port = int(config.get("sftp_port", 22))
     file_pw = config.get("partner_data_password")
+
+    @classmethod
+    def is_configured(cls):
+        return bool(cls.username and cls.password and cls.host and cls.port)
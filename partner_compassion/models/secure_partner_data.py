@@ -0,0 +1,114 @@
+##############################################################################
+#
+#    Copyright (C) 2022 Compassion CH (http://www.compassion.ch)
+#    Releasing children from poverty in Jesus' name
+#
+#    The licence is in the file __manifest__.py
+#
+##############################################################################
+import logging
+import os
+import shutil
+import tempfile
+import uuid
+
+from odoo import api, fields, models
+
+from .partner_compassion import SftpConfig
+from ..tools.sftp_pool import sftp_pool
+
+_logger = logging.getLogger(__name__)
+
+try:
+    import csv
+    import pyminizip
+except ImportError:
+    _logger.warning("Please install python dependencies.")
+
+
+class SecurePartnerData(models.Model):
+    """ Partner data waiting to be stored on the NAS. The rows are written
+    periodically in a new password-protected ZIP segment placed next to the
+    archive given by partner_compassion.store_path, and then deleted.
+    The existing segments are never downloaded nor rewritten.
+    """
+    _name = "res.partner.secure.data"
+    _description = "Partner data to store on NAS"
+    _order = "id"
+
+    # Not a relation: the partner is anonymized after its data is queued.
+    partner_id = fields.Integer(required=True, readonly=True)
+    ref = fields.Char(readonly=True)
+    contact_address = fields.Text(readonly=True)
+    date = fields.Date(default=fields.Date.today, readonly=True)
+
+    @api.model
+    def flush_to_nas(self):
+        """
+        CRON writing all queued rows in a new segment on the NAS.
+        Concurrent flushes never take the same rows, and rows are kept for
+        the next run if the upload fails.
+        :return: number of rows stored
+        """
+        self.env.cr.execute("""
+            SELECT id FROM res_partner_secure_data
+            ORDER BY id
+            FOR UPDATE SKIP LOCKED
+        """)
+        rows = self.browse([r[0] for r in self.env.cr.fetchall()])
+        if not rows:
+            return 0
+        sftp_connection = self.env["res.partner"]._get_sftp_connection()
+        if not sftp_connection:
+            _logger.warning(
+                "SFTP is not configured: %s partner data rows are kept in "
+                "queue.", len(rows))
+            return 0
+
+        store_path = self.env["ir.config_parameter"].sudo().get_param(
+            "partner_compassion.store_path")
+        segment_path = self._get_segment_path(store_path)
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            csv_path = os.path.join(tmp_dir, "partner_data.csv")
+            with open(csv_path, "w", newline="", encoding="utf-8") as csv_file:
+                csv.writer(csv_file).writerows(rows._get_csv_rows())
+            zip_path = os.path.join(tmp_dir, "segment.zip")
+            pyminizip.compress(csv_path, "", zip_path, SftpConfig.file_pw, 5)
+            with sftp_connection as sftp, \
+                    sftp_pool.timed("upload of secure partner data"):
+                sftp.put(zip_path, segment_path)
+        except Exception:
+            _logger.error(
+                "Couldn't store secure partner data on NAS. The rows are "
+                "kept for the next run.", exc_info=True)
+            return 0
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        count = len(rows)
+        rows.unlink()
+        _logger.info("%s partner data rows stored in %s", count, segment_path)
+        return count
+
+    @api.model
+    def _get_segment_path(self, store_path):
+        """
+        :param store_path: path of the main archive on the NAS
+        :return: path of a new segment in the same folder, sortable by date
+        """
+        base_path, ext = os.path.splitext(store_path)
+        return "{}_{}_{}{}".format(
+            base_path,
+            fields.Datetime.now().strftime("%Y%m%d%H%M%S"),
+            uuid.uuid4().hex[:8],
+            ext or ".zip",
+        )
+
+    @api.multi
+    def _get_csv_rows(self):
+        return [
+            [str(row.partner_id), row.ref or "", row.contact_address or "",
+             row.date]
+            for row in self
+        ]
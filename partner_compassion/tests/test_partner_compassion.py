@@ -122,6 +122,26 @@ class TestMessages(BaseSponsorshipTest):
             self.assertEqual(self.partner.number_sponsorships, i + 1)
             self.assertEqual(self.church.number_sponsorships, i + 1)
 
+    def test_secure_save_data_is_queued(self):
+        config_patch = patch(
+            "odoo.addons.partner_compassion.models.partner_compassion"
+            ".SftpConfig.is_configured", return_value=True)
+        with config_patch:
+            self.partner._secure_save_data()
+        secure_data = self.env["res.partner.secure.data"].search([
+            ("partner_id", "=", self.partner.id)])
+        self.assertEqual(secure_data.ref, "Test")
+        self.assertEqual(secure_data.contact_address,
+                         self.partner.contact_address)
+
+        # Without connection, the rows are kept for the next flush
+        connection_patch = patch(
+            "odoo.addons.partner_compassion.models.partner_compassion"
+            ".ResPartner._get_sftp_connection", return_value=False)
+        with connection_patch:
+            self.assertEqual(secure_data.flush_to_nas(), 0)
+        self.assertTrue(secure_data.exists())
+
     # things with duplicated partners and onchange method don't work
     # def test_duplicate(self):
     #     # test if duplicated is in self.partner
@@ -0,0 +1,168 @@
+##############################################################################
+#
+#    Copyright (C) 2022 Compassion CH (http://www.compassion.ch)
+#    Releasing children from poverty in Jesus' name
+#
+#    The licence is in the file __manifest__.py
+#
+##############################################################################
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from odoo.tools.config import config
+
+_logger = logging.getLogger(__name__)
+
+try:
+    import pysftp
+except ImportError:
+    _logger.warning("Please install pysftp.")
+
+
+class SftpPool(object):
+    """ Process-wide pool of SFTP connections to the NAS, keyed by host and
+    credentials. Opening a connection costs a SSH handshake, so connections
+    are kept alive and reused between the transfers.
+    - Idle connections are closed after sftp_pool_idle_timeout seconds
+      (option of the .conf file of Odoo, default 300).
+    - Connections closed by the server are replaced transparently.
+    - Handshakes and transfers timings are counted (see stats()) and logged
+      every sftp_pool_stats_interval seconds (default 3600) by each process
+      using the pool.
+    A connection is only used by one thread at a time.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # {key: [(connection, release time)]}
+        self._idle = {}
+        self._stats = {
+            "handshakes": 0,
+            "reused": 0,
+            "transfers": 0,
+            "transfer_time": 0.0,
+        }
+        self._stats_logged = time.time()
+
+    @contextmanager
+    def connection(self, host, port, username, password, cnopts=None,
+                   starting_dir=None):
+        """
+        Context manager giving a connection from the pool.
+        :param starting_dir: (optional) starting dir for the connection
+        :return: pysftp.Connection
+        """
+        key = (host, port, username, password)
+        conn = self._acquire(key, cnopts)
+        reusable = False
+        try:
+            if starting_dir:
+                conn.chdir(starting_dir)
+            yield conn
+            reusable = True
+        finally:
+            if reusable:
+                self._release(key, conn)
+            else:
+                # The connection state is unknown: don't reuse it.
+                self._close(conn)
+
+    @contextmanager
+    def timed(self, name):
+        """ Context manager measuring the time of a transfer. """
+        start = time.time()
+        try:
+            yield
+        finally:
+            duration = time.time() - start
+            with self._lock:
+                self._stats["transfers"] += 1
+                self._stats["transfer_time"] += duration
+            _logger.debug("SFTP %s done in %.3f seconds", name, duration)
+            self._log_stats()
+
+    def stats(self):
+        """ :return: dict with counters for monitoring """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["idle"] = sum(len(idle) for idle in self._idle.values())
+        return stats
+
+    def _log_stats(self):
+        interval = int(config.get("sftp_pool_stats_interval") or 3600)
+        with self._lock:
+            if time.time() - self._stats_logged < interval:
+                return
+            self._stats_logged = time.time()
+        stats = self.stats()
+        _logger.info(
+            "SFTP pool: %s handshakes, %s reused connections, %s idle, "
+            "%s transfers in %.1f seconds", stats["handshakes"],
+            stats["reused"], stats["idle"], stats["transfers"],
+            stats["transfer_time"])
+
+    def _acquire(self, key, cnopts):
+        self._evict_idle()
+        while True:
+            with self._lock:
+                idle = self._idle.get(key)
+                conn = idle.pop()[0] if idle else None
+            if conn is None:
+                break
+            if self._is_alive(conn):
+                with self._lock:
+                    self._stats["reused"] += 1
+                return conn
+            self._close(conn)
+
+        host, port, username, password = key
+        conn = pysftp.Connection(
+            host=host, port=port, username=username, password=password,
+            cnopts=cnopts)
+        conn._transport.set_keepalive(
+            int(config.get("sftp_pool_keepalive") or 30))
+        with self._lock:
+            self._stats["handshakes"] += 1
+        return conn
+
+    def _release(self, key, conn):
+        if not self._is_alive(conn):
+            self._close(conn)
+            return
+        # Reset working directory for the next user
+        conn.chdir(None)
+        with self._lock:
+            self._idle.setdefault(key, []).append((conn, time.time()))
+        self._evict_idle()
+        self._log_stats()
+
+    def _evict_idle(self):
+        timeout = int(config.get("sftp_pool_idle_timeout") or 300)
+        limit = time.time() - timeout
+        to_close = []
+        with self._lock:
+            for key, idle in self._idle.items():
+                to_close.extend(conn for conn, released in idle if released < limit)
+                idle[:] = [(conn, released) for conn, released in idle
+                           if released >= limit]
+        for conn in to_close:
+            self._close(conn)
+
+    @staticmethod
+    def _is_alive(conn):
+        try:
+            return conn._transport.is_active()
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.close()
+        except Exception:
+            _logger.debug("SFTP connection already closed", exc_info=True)
+
+
+sftp_pool = SftpPool()
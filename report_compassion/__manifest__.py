@@ -41,6 +41,7 @@
     ],
     "external_dependencies": {"python": ["pyquery", "babel"]},
     "data": [
+        "security/ir.model.access.csv",
         "report/compassion_layout.xml",
         "report/paperformats.xml",
         "report/childpack.xml",
@@ -60,7 +61,9 @@
         "views/communication_config_view.xml",
         "views/generate_communication_wizard_view.xml",
         "views/print_tax_receipt_view.xml",
+        "views/tax_receipt_batch_view.xml",
         "data/tax_receipt_email_template.xml",
+        "data/queue_job.xml",
     ],
     "demo": [],
     "installable": True,
@@ -20,3 +20,4 @@ from . import report_bvr_sponsorship_gift
 from . import report_bvr_fund
 from . import report_childpack
 from . import report_tax_receipt
+from . import tax_receipt_batch
@@ -8,6 +8,7 @@
 #
 ##############################################################################
 import logging
+from collections import defaultdict
 from datetime import datetime
 
 from babel.dates import format_date
@@ -82,18 +83,58 @@ class ContractGroup(models.Model):
             return result
 
     @api.multi
-    def get_communication(self, start, stop, sponsorships):
+    def get_payment_slips(self, months, sponsorships):
+        """
+        Compute the payment slips of all groups at once, reading the data
+        of the groups and of the sponsorships in a few queries instead of
+        one pass per group and per slip.
+        :param months: list of dates to print
+        :param sponsorships: recordset of included sponsorships
+        :return: dict {group id: list of dict with keys date, communication
+                 and amount}
+        """
+        sponsorships.mapped("first_open_invoice")
+        sponsorships.mapped("total_amount")
+        sponsorships.mapped("child_id.preferred_name")
+        self.mapped("bvr_reference")
+        self.mapped("partner_id.lang")
+        self.with_context(lang="en_US").mapped("payment_mode_id.name")
+        sponsorships_by_group = defaultdict(lambda: sponsorships.browse())
+        for sponsorship in sponsorships:
+            sponsorships_by_group[sponsorship.group_id.id] |= sponsorship
+        slips = dict()
+        for group in self:
+            group = group.with_context(lang=group.partner_id.lang)
+            group_sponsorships = sponsorships_by_group[group.id]
+            slips[group.id] = []
+            if not group.bvr_reference:
+                continue
+            for date in group.get_months(list(months), group_sponsorships):
+                start, stop = date.split(" - ")[0], date.split(" - ")[-1]
+                amount = group.get_amount(start, stop, group_sponsorships)
+                slips[group.id].append({
+                    "date": date,
+                    "communication": group.get_communication(
+                        start, stop, group_sponsorships, amount=amount),
+                    "amount": amount,
+                })
+        return slips
+
+    @api.multi
+    def get_communication(self, start, stop, sponsorships, amount=None):
         """
         Get the communication to print on the payment slip for sponsorship
         :param start: the month start for which we print the payment slip (string)
         :param stop: the month stop for which we print the payment slip (string)
         :param sponsorships: recordset of sponsorships for which to print the
                              payment slips
+        :param amount: amount of the slip if already computed
         :return: string of the communication
         """
         self.ensure_one()
         payment_mode = self.with_context(lang="en_US").payment_mode_id
-        amount = self.get_amount(start, stop, sponsorships)
+        if amount is None:
+            amount = self.get_amount(start, stop, sponsorships)
         valid = sponsorships
         number_sponsorship = len(sponsorships)
         date_start = fields.Date.to_date(start)
@@ -86,6 +86,8 @@ class BvrSponsorship(models.AbstractModel):
                 "doc_ids": groups.ids,
                 "docs": docs,
                 "months": months,
+                "slips": groups.get_payment_slips(months, sponsorships),
+                "bank_account": groups.get_company_qrr_account(),
             }
         )
         return final_data
@@ -30,9 +30,14 @@ class ReportTaxReceipt(models.AbstractModel):
             }
         if not docids and data["doc_ids"]:
             docids = data["doc_ids"]
+        # Amounts of all receipts are computed at once for the rendering
+        amounts = self.env.context.get("tax_receipt_amounts")
+        if amounts is None:
+            amounts = self.env["res.partner"]._get_receipt_amounts(
+                data["year"], list(docids))
         # We must retrieve the text of the receipt from the mail_template
         template = self.env.ref("report_compassion.tax_receipt_template").with_context(
-            year=data["year"], lang=data["lang"]
+            year=data["year"], lang=data["lang"], tax_receipt_amounts=amounts
         )
         texts = template._render_template(template.body_html, "res.partner", docids)
         lang = data.get("lang", self.env.lang)
@@ -27,32 +27,91 @@ class ResPartner(models.Model):
     @api.multi
     def get_receipt(self, year):
         """
-        Return the amount paid from the partner in the given year
+        Return the amount paid from the partner in the given year.
+        Amounts computed in advance can be given in context key
+        tax_receipt_amounts ({partner id: amount}).
         :param year: int: year of selection
         :return: float: total amount
         """
         self.ensure_one()
-        start_date = date(year, 1, 1)
-        end_date = date(year, 12, 31)
-        invoice_lines = self.env["account.invoice.line"].search(
-            [
-                ("last_payment", ">=", start_date),
-                ("last_payment", "<=", end_date),
-                ("state", "=", "paid"),
-                ("product_id.requires_thankyou", "=", True),
-                # invoice from either the partner, the company or the employee
-                # to obtain the same results when tax receipt is computed from companies or employees
-                "|",
-                # invoice from the partner (when self is either an company or an employee)
-                ("partner_id", "=", self.id),
-                "|",
-                # invoice from the company (when self is an employee)
-                ("partner_id.parent_id", "=", self.id),
-                # invoice from the employees (when self is a company)
-                ("partner_id.child_ids", "=", self.id),
-            ]
-        )
-        return sum(invoice_lines.mapped("price_subtotal"))
+        amounts = self.env.context.get("tax_receipt_amounts")
+        if amounts is None:
+            amounts = self._get_receipt_amounts(year, self.ids)
+        return amounts.get(self.id, 0.0)
+
+    @api.model
+    def _get_receipt_partner_ids(self, year):
+        """
+        Get the partners receiving a tax receipt for the given year: the
+        commercial partners of the donors who accept tax receipts.
+        :param year: int: year of selection
+        :return: list of res.partner ids
+        """
+        self.env.cr.execute("""
+            SELECT DISTINCT donor.commercial_partner_id
+            FROM account_invoice_line il
+            JOIN product_product pp ON pp.id = il.product_id
+            JOIN product_template pt ON pt.id = pp.product_tmpl_id
+            JOIN res_partner donor ON donor.id = il.partner_id
+            WHERE il.last_payment BETWEEN %s AND %s
+            AND il.state = 'paid'
+            AND pt.requires_thankyou
+            AND donor.tax_certificate != 'no'
+        """, [date(year, 1, 1), date(year, 12, 31)])
+        return [row[0] for row in self.env.cr.fetchall()]
+
+    @api.model
+    def _get_receipt_amounts(self, year, partner_ids=None):
+        """
+        Compute the tax receipts of the given year in one query. A receipt
+        counts the invoices from either the partner, its company or its
+        employees, to obtain the same results when the tax receipt is
+        computed from companies or employees.
+        :param year: int: year of selection
+        :param partner_ids: restrict to these partners (all donors if None)
+        :return: dict {partner id: amount}
+        """
+        params = {
+            "start": date(year, 1, 1),
+            "end": date(year, 12, 31),
+            "partner_ids": partner_ids,
+        }
+        partner_filter = receiver_filter = ""
+        if partner_ids is not None:
+            if not partner_ids:
+                return {}
+            receiver_filter = "WHERE receiver.id = ANY(%(partner_ids)s)"
+            partner_filter = """
+                AND il.partner_id IN (
+                    SELECT id FROM res_partner
+                    WHERE id = ANY(%(partner_ids)s)
+                    OR parent_id = ANY(%(partner_ids)s)
+                    OR id IN (SELECT parent_id FROM res_partner
+                              WHERE id = ANY(%(partner_ids)s))
+                )
+            """
+        self.env.cr.execute(f"""
+            WITH donations AS (
+                SELECT il.partner_id, SUM(il.price_subtotal) AS amount
+                FROM account_invoice_line il
+                JOIN product_product pp ON pp.id = il.product_id
+                JOIN product_template pt ON pt.id = pp.product_tmpl_id
+                WHERE il.last_payment BETWEEN %(start)s AND %(end)s
+                AND il.state = 'paid'
+                AND pt.requires_thankyou
+                {partner_filter}
+                GROUP BY il.partner_id
+            )
+            SELECT receiver.id, SUM(d.amount)
+            FROM donations d
+            JOIN res_partner donor ON donor.id = d.partner_id
+            JOIN res_partner receiver ON receiver.id = donor.id
+                OR receiver.id = donor.parent_id
+                OR receiver.parent_id = donor.id
+            {receiver_filter}
+            GROUP BY receiver.id
+        """, params)
+        return {row[0]: float(row[1]) for row in self.env.cr.fetchall()}
 
     @api.multi
     def _compute_date_communication(self):
@@ -0,0 +1,222 @@
+##############################################################################
+#
+#    Copyright (C) 2022 Compassion CH (http://www.compassion.ch)
+#    Releasing children from poverty in Jesus' name
+#
+#    The licence is in the file __manifest__.py
+#
+##############################################################################
+import base64
+import logging
+from datetime import date
+
+from odoo import api, models, fields, _
+from odoo.exceptions import UserError
+
+_logger = logging.getLogger(__name__)
+
+
+class TaxReceiptBatch(models.Model):
+    """ Year-end tax receipts of all donors. The amounts of the receipts are
+    computed for the whole year at once and kept in the lines, then the
+    receipts are rendered by chunks of partners speaking the same language
+    in queue jobs. Each chunk gives one PDF attached to the batch, which is
+    also sent to the printer if the report is configured for it.
+    """
+    _name = "tax.receipt.batch"
+    _description = "Tax receipts batch"
+    _order = "year desc, id desc"
+
+    name = fields.Char(compute="_compute_name")
+    year = fields.Integer(
+        required=True, default=lambda s: date.today().year - 1,
+        readonly=True, states={"draft": [("readonly", False)]})
+    state = fields.Selection([
+        ("draft", "Draft"),
+        ("computed", "Computed"),
+        ("printing", "Printing"),
+        ("done", "Done"),
+    ], default="draft", required=True, readonly=True)
+    line_ids = fields.One2many(
+        "tax.receipt.line", "batch_id", "Receipts", readonly=True)
+    receipt_count = fields.Integer(compute="_compute_progress")
+    printed_count = fields.Integer(compute="_compute_progress")
+    progress = fields.Float(compute="_compute_progress")
+    total_amount = fields.Float(compute="_compute_progress")
+    attachment_ids = fields.One2many(
+        "ir.attachment", "res_id", "Printed receipts", readonly=True,
+        domain=[("res_model", "=", "tax.receipt.batch")])
+
+    @api.multi
+    def _compute_name(self):
+        for batch in self:
+            batch.name = _("Tax receipts %s") % batch.year
+
+    @api.multi
+    def _compute_progress(self):
+        groups = self.env["tax.receipt.line"].read_group(
+            [("batch_id", "in", self.ids)],
+            ["batch_id", "state", "amount"], ["batch_id", "state"], lazy=False)
+        counts = {}
+        for group in groups:
+            batch_counts = counts.setdefault(group["batch_id"][0], {})
+            batch_counts[group["state"]] = (group["__count"], group["amount"])
+        for batch in self:
+            batch_counts = counts.get(batch.id, {})
+            pending_count, pending_amount = batch_counts.get("pending", (0, 0))
+            printed_count, printed_amount = batch_counts.get("printed", (0, 0))
+            batch.receipt_count = pending_count + printed_count
+            batch.printed_count = printed_count
+            batch.total_amount = pending_amount + printed_amount
+            batch.progress = (
+                printed_count * 100.0 / batch.receipt_count
+                if batch.receipt_count else 0.0)
+
+    ##########################################################################
+    #                             VIEW CALLBACKS                             #
+    ##########################################################################
+    @api.multi
+    def action_compute(self):
+        """ Compute the receipts of all partners who donated in the year. """
+        partner_obj = self.env["res.partner"]
+        for batch in self:
+            if batch.state not in ("draft", "computed"):
+                raise UserError(_("The receipts are already being printed."))
+            amounts = partner_obj._get_receipt_amounts(
+                batch.year, partner_obj._get_receipt_partner_ids(batch.year))
+            self.env.cr.execute(
+                "DELETE FROM tax_receipt_line WHERE batch_id = %s", [batch.id])
+            self.env["tax.receipt.line"]._insert_lines(batch, amounts)
+            batch.state = "computed"
+            _logger.info("Tax receipts %s: %s receipts computed",
+                         batch.year, len(amounts))
+        self.invalidate_cache()
+        return True
+
+    @api.multi
+    def action_print(self):
+        """ Render the pending receipts in queue jobs. """
+        chunk_size = int(self.env["ir.config_parameter"].sudo().get_param(
+            "report_compassion.tax_receipt_chunk_size", 200))
+        for batch in self:
+            if batch.state == "draft":
+                raise UserError(_("Please compute the receipts first."))
+            lines = batch.line_ids.filtered(lambda l: l.state == "pending")
+            lines_by_lang = {}
+            for line in lines.sorted(lambda l: (l.lang or "", l.zip or "")):
+                lines_by_lang.setdefault(line.lang, []).append(line.id)
+            for lang, line_ids in lines_by_lang.items():
+                for i in range(0, len(line_ids), chunk_size):
+                    batch.with_delay(
+                        description=f"Tax receipts {batch.year} ({lang})"
+                    ).print_receipts_job(line_ids[i:i + chunk_size])
+            batch.state = "printing" if lines else "done"
+        return True
+
+    @api.multi
+    def action_reset(self):
+        self.mapped("line_ids").write({"state": "pending"})
+        self.mapped("attachment_ids").unlink()
+        return self.write({"state": "computed"})
+
+    ##########################################################################
+    #                             PUBLIC METHODS                             #
+    ##########################################################################
+    @api.multi
+    def print_receipts_job(self, line_ids):
+        """
+        Queue job rendering the receipts of a chunk of partners.
+        :param line_ids: ids of tax.receipt.line of the same language
+        :return: True
+        """
+        self.ensure_one()
+        lines = self.env["tax.receipt.line"].browse(line_ids).filtered(
+            lambda l: l.state == "pending")
+        if not lines:
+            return True
+        lang = lines[0].lang
+        partners = lines.mapped("partner_id")
+        report = self.env.ref("report_compassion.tax_receipt_report").with_context(
+            lang=lang,
+            tax_receipt_amounts={line.partner_id.id: line.amount for line in lines},
+        )
+        pdf = report.render_qweb_pdf(partners.ids, data={
+            "doc_ids": partners.ids,
+            "year": self.year,
+            "lang": lang,
+        })[0]
+        attachment = self.env["ir.attachment"].create({
+            "name": f"tax_receipts_{self.year}_{lang}_{lines[0].id}.pdf",
+            "datas_fname": f"tax_receipts_{self.year}_{lang}_{lines[0].id}.pdf",
+            "datas": base64.b64encode(pdf),
+            "res_model": self._name,
+            "res_id": self.id,
+        })
+        lines.write({"state": "printed", "attachment_id": attachment.id})
+        # Chunks run in parallel and can't see the lines printed by each
+        # other: the batch is closed by a job starting after this commit.
+        self.with_delay(
+            description=f"Close tax receipts {self.year}").close_batch_job()
+        return True
+
+    @api.multi
+    def close_batch_job(self):
+        """ Queue job closing the batch when all receipts are printed. """
+        self.ensure_one()
+        if self.state != "printing":
+            return True
+        self.env.cr.execute("""
+            SELECT COUNT(*) FROM tax_receipt_line
+            WHERE batch_id = %s AND state = 'pending'
+        """, [self.id])
+        if not self.env.cr.fetchone()[0]:
+            self.state = "done"
+        return True
+
+
+class TaxReceiptLine(models.Model):
+    """ Amount of the tax receipt of a partner for the year of the batch. """
+    _name = "tax.receipt.line"
+    _description = "Tax receipt"
+    _rec_name = "partner_id"
+    _order = "lang, zip, id"
+
+    batch_id = fields.Many2one(
+        "tax.receipt.batch", required=True, ondelete="cascade", readonly=True)
+    year = fields.Integer(related="batch_id.year", store=True, readonly=True)
+    partner_id = fields.Many2one(
+        "res.partner", required=True, ondelete="cascade", readonly=True,
+        index=True)
+    lang = fields.Char(readonly=True)
+    zip = fields.Char(readonly=True)
+    amount = fields.Float(readonly=True)
+    state = fields.Selection(
+        [("pending", "Pending"), ("printed", "Printed")],
+        default="pending", required=True, readonly=True)
+    attachment_id = fields.Many2one(
+        "ir.attachment", "Printed PDF", ondelete="set null", readonly=True)
+
+    _sql_constraints = [
+        ("unique_partner", "unique(batch_id, partner_id)",
+         "Only one receipt per partner is allowed")
+    ]
+
+    @api.model
+    def _insert_lines(self, batch, amounts):
+        """
+        Insert the receipts of a batch in one query.
+        :param batch: tax.receipt.batch record
+        :param amounts: {partner id: amount}
+        """
+        if not amounts:
+            return
+        self.env.cr.execute("""
+            INSERT INTO tax_receipt_line (
+                batch_id, year, partner_id, lang, zip, amount, state,
+                create_uid, write_uid, create_date, write_date)
+            SELECT %s, %s, p.id, p.lang, p.zip, a.amount, 'pending', %s, %s,
+                   (now() at time zone 'UTC'), (now() at time zone 'UTC')
+            FROM unnest(%s, %s) AS a(partner_id, amount)
+            JOIN res_partner p ON p.id = a.partner_id
+        """, [batch.id, batch.year, self.env.uid, self.env.uid,
+              list(amounts.keys()), list(amounts.values())])
@@ -10,3 +10,4 @@
 
 from . import test_contract
 from . import test_report_bvr
+from . import test_tax_receipt
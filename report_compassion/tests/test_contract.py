@@ -60,3 +60,48 @@ class TestContract(TestContractsSwitzerland):
 
         expected = u"ISR for standing order CHF 50<br/>Test (IO06790211)<br/>"
         self.assertEqual(payment_slip, expected)
+
+    def test_group__get_payment_slips__matches_group_methods(self):
+        self.michel.ref = "reference"
+        bvr_group = self.create_group({
+            "partner_id": self.michel.id,
+            "payment_mode_id": self.env.ref(
+                "sponsorship_switzerland.payment_mode_bvr").id,
+            "advance_billing_months": 3,
+        })
+        bvr_group.bvr_reference = bvr_group.compute_partner_bvr_ref()
+        no_ref_group = self.create_group({"partner_id": self.michel.id})
+        no_ref_group.bvr_reference = False
+        sponsorships = self.env["recurring.contract"]
+        for i, group in enumerate((bvr_group, bvr_group, no_ref_group)):
+            sponsorships += self.create_contract({
+                "type": "SC",
+                "child_id": self.create_child(f"IO0679022{i}").id,
+                "group_id": group.id,
+                "partner_id": self.michel.id,
+            }, [{"amount": 50.0}])
+
+        months = ["2050-01-01", "2050-02-01", "2050-03-01", "2050-04-01",
+                  "2050-05-01", "2050-06-01", "2050-07-01"]
+        groups = sponsorships.mapped("group_id")
+        slips = groups.get_payment_slips(list(months), sponsorships)
+
+        self.assertEqual(slips[no_ref_group.id], [])
+        for group in groups:
+            group = group.with_context(lang=group.partner_id.lang)
+            group_sponsorships = sponsorships.filtered(
+                lambda s: s.group_id == group)
+            expected = []
+            if group.bvr_reference:
+                for date in group.get_months(list(months), group_sponsorships):
+                    start, stop = date.split(" - ")[0], date.split(" - ")[-1]
+                    expected.append({
+                        "date": date,
+                        "communication": group.get_communication(
+                            start, stop, group_sponsorships),
+                        "amount": group.get_amount(
+                            start, stop, group_sponsorships),
+                    })
+            self.assertEqual(slips[group.id], expected)
+        # 7 months by 3: the last month doesn't complete a period
+        self.assertEqual(len(slips[bvr_group.id]), 2)
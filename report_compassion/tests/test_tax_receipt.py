@@ -0,0 +1,107 @@
+##############################################################################
+#
+#    Copyright (C) 2022 Compassion CH (http://www.compassion.ch)
+#    Releasing children from poverty in Jesus' name
+#
+#    The licence is in the file __manifest__.py
+#
+##############################################################################
+from datetime import date
+
+from odoo.tests import SavepointCase
+
+
+class TestTaxReceipt(SavepointCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.company = cls.env["res.partner"].create({
+            "name": "Receipt company", "is_company": True})
+        cls.employee = cls.env["res.partner"].create({
+            "name": "Receipt employee", "parent_id": cls.company.id})
+        cls.person = cls.env["res.partner"].create({"name": "Receipt person"})
+        cls.no_receipt = cls.env["res.partner"].create({
+            "name": "No receipt person", "tax_certificate": "no"})
+        cls.product = cls.env["product.product"].create({
+            "name": "Receipt donation", "requires_thankyou": True})
+        cls.account = cls.env["account.account"].search([
+            ("user_type_id", "=",
+             cls.env.ref("account.data_account_type_revenue").id)], limit=1)
+        # Donations paid in 1991
+        cls._create_paid_line(cls.company, 100.0)
+        cls._create_paid_line(cls.employee, 50.0)
+        cls._create_paid_line(cls.person, 30.0)
+        cls._create_paid_line(cls.no_receipt, 20.0)
+
+    @classmethod
+    def _create_paid_line(cls, partner, amount):
+        invoice = cls.env["account.invoice"].create({
+            "partner_id": partner.id,
+            "invoice_line_ids": [(0, 0, {
+                "name": "Donation",
+                "product_id": cls.product.id,
+                "account_id": cls.account.id,
+                "price_unit": amount,
+                "quantity": 1,
+            })],
+        })
+        cls.env.cr.execute("""
+            UPDATE account_invoice_line SET state = 'paid', last_payment = %s
+            WHERE invoice_id = %s
+        """, [date(1991, 6, 1), invoice.id])
+        cls.env["account.invoice.line"].invalidate_cache()
+
+    def _get_receipt_from_domain(self, partner, year):
+        """ Amount given by the search domain used before the receipts were
+        computed in SQL. """
+        invoice_lines = self.env["account.invoice.line"].search([
+            ("last_payment", ">=", date(year, 1, 1)),
+            ("last_payment", "<=", date(year, 12, 31)),
+            ("state", "=", "paid"),
+            ("product_id.requires_thankyou", "=", True),
+            "|",
+            ("partner_id", "=", partner.id),
+            "|",
+            ("partner_id.parent_id", "=", partner.id),
+            ("partner_id.child_ids", "=", partner.id),
+        ])
+        return sum(invoice_lines.mapped("price_subtotal"))
+
+    def test_receipt_without_donation(self):
+        self.assertEqual(self.company.get_receipt(1990), 0.0)
+        self.assertEqual(self.env["res.partner"]._get_receipt_amounts(
+            1990, (self.company | self.employee).ids), {})
+
+    def test_receipt_amounts_match_domain(self):
+        partners = self.company | self.employee | self.person
+        amounts = self.env["res.partner"]._get_receipt_amounts(
+            1991, partners.ids)
+        self.assertEqual(amounts, {
+            self.company.id: 150.0,
+            self.employee.id: 150.0,
+            self.person.id: 30.0,
+        })
+        for partner in partners:
+            self.assertEqual(
+                amounts[partner.id], self._get_receipt_from_domain(partner, 1991))
+            self.assertEqual(partner.get_receipt(1991), amounts[partner.id])
+
+    def test_receipt_amounts_from_context(self):
+        employee = self.employee.with_context(
+            tax_receipt_amounts={self.employee.id: 1000.0})
+        self.assertEqual(employee.get_receipt(1990), 1000.0)
+        self.assertEqual(employee.get_receipt_text(1990), "1'000.-")
+
+    def test_batch_without_donation(self):
+        batch = self.env["tax.receipt.batch"].create({"year": 1990})
+        batch.action_compute()
+        self.assertEqual(batch.state, "computed")
+        self.assertEqual(batch.receipt_count, 0)
+        batch.action_print()
+        self.assertEqual(batch.state, "done")
+
+    def test_batch_receipts_of_commercial_partners(self):
+        batch = self.env["tax.receipt.batch"].create({"year": 1991})
+        batch.action_compute()
+        amounts = {line.partner_id: line.amount for line in batch.line_ids}
+        self.assertEqual(amounts, {self.company: 150.0, self.person: 30.0})
@@ -10,6 +10,7 @@
 import sys
 import base64
 import logging
+from contextlib import ExitStack
 from importlib import reload
 
 from io import BytesIO
@@ -18,7 +19,8 @@ from . import translate_connector
 
 from odoo import models, api, fields, _
 from odoo.tools.config import config
-from odoo.exceptions import UserError, CacheMiss
+from odoo.exceptions import UserError
+from odoo.addons.partner_compassion.tools.sftp_pool import sftp_pool
 from odoo.addons.sbc_compassion.models.correspondence_page import BOX_SEPARATOR
 
 logger = logging.getLogger(__name__)
@@ -189,56 +191,67 @@ class Correspondence(models.Model):
             ]
         )
         logger.info(len(supporter_lettres))
-        cpt = 1
-        for letter in supporter_lettres:
-            translation_id = tc.upsert(
-                "translation",
-                {"letter_odoo_id": letter.id, "createdat": letter.scanned_date},
-            )
-            text_id = tc.select_one(
-                "SELECT text_id FROM translation WHERE id = %s", [translation_id]
-            ).get("text_id")
-            if text_id:
-                tc.upsert("text", {"id": text_id, "priority_id": 3})
-                logger.info(str(cpt) + "/" + str(len(supporter_lettres)))
-            else:
-                logger.info("Not found letter")
-            cpt += 1
-        return True
+        tc.upsert_many("translation", [
+            {"letter_odoo_id": letter.id, "createdat": letter.scanned_date}
+            for letter in supporter_lettres
+        ])
+        text_ids = list({
+            translation["text_id"]
+            for translation in tc.get_translations(supporter_lettres.ids)
+            if translation["text_id"]
+        })
+        if text_ids:
+            tc.update_texts_priority(text_ids, 3)
+        report = {
+            "found": len(supporter_lettres),
+            "changed": len(text_ids),
+        }
+        logger.info(f"Fix priority: {report}")
+        return report
 
     @api.model
     def clean_translate(self):
+        """ Mark as treated the translations waiting on translation platform
+        for letters that are no more in translation queue. """
         tc = translate_connector.TranslateConnect()
-        letters = self.search([("state", "!=", "Global Partner translation queue")])
-        for letter in letters:
-            translation = tc.select_one(
-                "SELECT t.id as id, s.id as status "
-                "FROM translation t join translation_status s on "
-                "s.translation_id = t.id "
-                "WHERE t.letter_odoo_id = %s AND s.status_id = 1",
-                [letter.id],
-            )
-            letter_id = translation.get("id")
-            status = translation.get("status")
-            if letter_id and status:
-                tc.update_translation_to_treated(letter_id)
-                tc.upsert("translation_status", {"id": status, "status_id": 3})
-                logger.info("Correct " + str(letter.id))
-        return True
+        pending = tc.get_pending_translations()
+        letters_done = self.search([
+            ("id", "in", list({t["letter_odoo_id"] for t in pending})),
+            ("state", "!=", "Global Partner translation queue"),
+        ])
+        done_ids = set(letters_done.ids)
+        to_clean = [t for t in pending if t["letter_odoo_id"] in done_ids]
+        if to_clean:
+            tc.update_translations_to_treated([t["id"] for t in to_clean])
+            tc.update_translations_status([t["status"] for t in to_clean], 3)
+        for letter in letters_done:
+            logger.info("Correct " + str(letter.id))
+        report = {
+            "found": len(pending),
+            "changed": len(to_clean),
+        }
+        logger.info(f"Clean translate: {report}")
+        return report
 
     @api.model
     def check_missing_translate(self):
         tc = translate_connector.TranslateConnect()
         letters = self.search([("state", "=", "Global Partner translation queue")])
         logger.info(f"Found {len(letters)} letters to translate.")
-        for letter in letters:
-            letter_id = tc.select_one(
-                "SELECT id FROM translation WHERE letter_odoo_id = %s", [letter.id]
-            ).get("id")
-            if not letter_id:
-                letter.send_local_translate()
-                logger.info("Send missing: " + letter.kit_identifier)
-        return True
+        on_platform = {
+            translation["letter_odoo_id"]
+            for translation in tc.get_translations(letters.ids)
+        }
+        missing = letters.filtered(lambda l: l.id not in on_platform)
+        for letter in missing:
+            letter.send_local_translate()
+            logger.info("Send missing: " + letter.kit_identifier)
+        report = {
+            "found": len(letters),
+            "changed": len(missing),
+        }
+        logger.info(f"Check missing translate: {report}")
+        return report
 
     @api.multi
     def remove_local_translate(self):
@@ -268,19 +281,9 @@ class Correspondence(models.Model):
         :return: None
         """
         self.ensure_one()
-        translate_lang_id = (
-            self.env["res.lang.compassion"]
-                .search([("code_iso", "=", translate_lang),
-                         ("translatable", "=", True)])
-                .id
-        )
-        src_lang_id = (
-            self.env["res.lang.compassion"].search([
-                ("code_iso", "=", src_lang),
-                ("translatable", "=", True)
-            ]).id
-        )
-        translator_partner = self.env["res.partner"].search([("ref", "=", translator)])
+        translate_lang_id = self._get_translatable_lang(translate_lang).id
+        src_lang_id = self._get_translatable_lang(src_lang).id
+        translator_partner = self._get_translator(translator)
 
         letter_vals = {
             "translation_language_id": translate_lang_id,
@@ -427,51 +430,136 @@ class Correspondence(models.Model):
             logger.warning("No hostkeys defined in StfpConnection. Connection will be unsecured.")
 
         # Copy file in the imported letter folder
-        try:
-            sftp_conn = pysftp.Connection(host=sftp_ip, password=sftp_pass, username=sftp_user,
-                                          port=sftp_port, cnopts=cnopts)
-        except Exception:
-            raise UserError(_("Connection to NAS failed."))
+        with ExitStack() as stack:
+            try:
+                sftp = stack.enter_context(sftp_pool.connection(
+                    host=sftp_ip, password=sftp_pass, username=sftp_user,
+                    port=sftp_port, cnopts=cnopts))
+            except Exception:
+                raise UserError(_("Connection to NAS failed."))
 
-        with sftp_conn as sftp:
             file_ = BytesIO(self.get_image())
             with sftp.cd(self.env.ref("sbc_switzerland.nas_share_name").value):
                 nas_letters_store_path = (
                         self.env.ref(
                             "sbc_switzerland.nas_letters_store_path").value + file_name
                 )
-                sftp.putfo(file_, nas_letters_store_path)
+                with sftp_pool.timed("upload of letter " + file_name):
+                    sftp.putfo(file_, nas_letters_store_path)
 
     # CRON Methods
     ##############
     @api.model
     def check_local_translation_done(self):
+        """
+        Fetch the translations done on the translation platform and put them
+        in the letters. Letters are processed by chunks (system parameter
+        sbc_switzerland.translation_sync_chunk_size), with one commit and one
+        update of the translation platform per chunk. Letters failing are
+        retried once at the end, and are otherwise left for the next run.
+        """
         reload(sys)
         tc = translate_connector.TranslateConnect()
         letters_to_update = tc.get_translated_letters()
-
-        for letter in letters_to_update:
-            try:
-                correspondence = self.browse(letter["letter_odoo_id"])
-                logger.info(
-                    f".....CHECK TRANSLATION FOR LETTER {correspondence.id}"
-                )
-                correspondence.update_translation(
-                    letter["target_lang"],
-                    letter["text"],
-                    letter["translator"],
-                    letter["src_lang"],
+        chunk_size = int(self.env["ir.config_parameter"].sudo().get_param(
+            "sbc_switzerland.translation_sync_chunk_size", 50))
+
+        # Languages and translators are fetched once for all letters
+        lang_codes = {letter["target_lang"] for letter in letters_to_update} | {
+            letter["src_lang"] for letter in letters_to_update}
+        translator_refs = {letter["translator"] for letter in letters_to_update}
+        existing_ids = set(self.browse(
+            [letter["letter_odoo_id"] for letter in letters_to_update]
+        ).exists().ids)
+        correspondence_obj = self.with_context(translation_lookup={
+            "langs": {
+                lang.code_iso: lang.id
+                for lang in self.env["res.lang.compassion"].search([
+                    ("code_iso", "in", list(lang_codes)),
+                    ("translatable", "=", True),
+                ])
+            },
+            "translators": self._get_translators_by_ref(translator_refs),
+        })
+
+        retry = []
+        for i in range(0, len(letters_to_update), chunk_size):
+            retry += correspondence_obj._update_translations(
+                tc, letters_to_update[i: i + chunk_size], existing_ids)
+        if retry:
+            logger.info(f"Retry {len(retry)} translations that failed")
+            failed = correspondence_obj._update_translations(tc, retry, existing_ids)
+            if failed:
+                logger.error(
+                    f"{len(failed)} translations couldn't be fetched from "
+                    "translation platform and will be retried on next run."
                 )
-                tc.update_translation_to_treated(letter["id"])
-                self.env.cr.commit()
-            except (KeyError, CacheMiss):
+        return True
+
+    @api.model
+    def _update_translations(self, tc, letters, existing_ids):
+        """
+        Put a chunk of translations in the letters, then mark them as treated
+        on the translation platform and commit.
+        :param tc: TranslateConnect
+        :param letters: list of translations from get_translated_letters
+        :param existing_ids: ids of the letters existing in Odoo
+        :return: list of translations that failed
+        """
+        treated_ids = []
+        failed = []
+        for letter in letters:
+            if letter["letter_odoo_id"] not in existing_ids:
                 # In that case the letter doesn't exist in Odoo
-                self.env.clear()
                 tc.remove_translation_with_odoo_id(letter["letter_odoo_id"])
+                continue
+            try:
+                with self.env.cr.savepoint():
+                    correspondence = self.browse(letter["letter_odoo_id"])
+                    logger.info(
+                        f".....CHECK TRANSLATION FOR LETTER {correspondence.id}"
+                    )
+                    correspondence.update_translation(
+                        letter["target_lang"],
+                        letter["text"],
+                        letter["translator"],
+                        letter["src_lang"],
+                    )
+                treated_ids.append(letter["id"])
             except:
                 logger.error(
                     "Error fetching a translation on translation platform",
                     exc_info=True,
                 )
-                self.env.clear()
-        return True
+                self.invalidate_cache()
+                failed.append(letter)
+        if treated_ids:
+            tc.update_translations_to_treated(treated_ids)
+        self.env.cr.commit()
+        return failed
+
+    @api.model
+    def _get_translatable_lang(self, code_iso):
+        lookup = self.env.context.get("translation_lookup") or {}
+        if code_iso in lookup.get("langs", {}):
+            return self.env["res.lang.compassion"].browse(lookup["langs"][code_iso])
+        return self.env["res.lang.compassion"].search([
+            ("code_iso", "=", code_iso),
+            ("translatable", "=", True)
+        ])
+
+    @api.model
+    def _get_translator(self, ref):
+        lookup = self.env.context.get("translation_lookup") or {}
+        if ref in lookup.get("translators", {}):
+            return self.env["res.partner"].browse(lookup["translators"][ref])
+        return self.env["res.partner"].search([("ref", "=", ref)])
+
+    @api.model
+    def _get_translators_by_ref(self, refs):
+        """ :return: dict {ref: list of partner ids} """
+        translators = {ref: [] for ref in refs}
+        for partner in self.env["res.partner"].search_read(
+                [("ref", "in", list(refs))], ["ref"]):
+            translators[partner["ref"]].append(partner["id"])
+        return translators
@@ -13,7 +13,11 @@ between the database and the mail.
 """
 import base64
 import logging
+import time
 import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 from pathlib import Path
 
 from paramiko.ssh_exception import SSHException
@@ -21,6 +25,7 @@ from paramiko.ssh_exception import SSHException
 from odoo import fields, models, api, _
 from odoo.exceptions import UserError
 from odoo.tools.config import config
+from odoo.addons.partner_compassion.tools.sftp_pool import sftp_pool
 
 logger = logging.getLogger(__name__)
 
@@ -79,22 +84,23 @@ class SftpConnection:
         raise AssertionError if credential are not set or IOError if
         starting_dir is not None and points to a not existing directory
         :param starting_dir: (optional) starting dir for the connection
-        :return: Return a pysftp connection object
+        :return: Return a context manager giving a pooled pysftp connection
         """
 
         assert self.credential_ok, "Missing credentials for sftp connection to NAS."
 
-        conn = pysftp.Connection(**self.sftp_config)
-        if starting_dir:
-            conn.chdir(starting_dir)
-
-        return conn
+        return sftp_pool.connection(starting_dir=starting_dir, **self.sftp_config)
 
 
 class ImportLettersHistory(models.Model):
     _inherit = "import.letters.history"
 
     manual_import = fields.Boolean("Manual import", default=False)
+    nas_last_imported_file = fields.Char(readonly=True)
+    nas_import_duration = fields.Float(
+        "Import duration (s)", readonly=True, group_operator="max")
+    nas_import_speed = fields.Float(
+        "Import speed (letters/min)", readonly=True, group_operator="avg")
 
     @api.onchange("data", "import_folder_path")
     def _compute_nber_letters(self):
@@ -121,14 +127,26 @@ class ImportLettersHistory(models.Model):
         return super().unlink()
 
     def _get_connection(self):
+        return self._get_connection_factory()()
+
+    def _get_connection_factory(self):
+        """
+        :return: function without arguments giving a pooled connection to the
+                 share on the NAS, usable outside of the Odoo environment.
+        """
         key = self.env.ref("sbc_switzerland.nas_ssh_key").value
         share = self.env.ref("sbc_switzerland.share_on_nas").value
-        return SftpConnection(key).get_connection(share)
+        sftp_connection = SftpConnection(key)
+        return lambda: sftp_connection.get_connection(share)
 
     def sftp_generator(self):
         """
         Generator function for the sftp imports
-        Read the files from the specified stfp directory and analyse them
+        Read the files from the specified stfp directory and analyse them.
+        The next files are downloaded in advance by a pool of workers while
+        the current one is analysed, and the analysed files are moved in the
+        done folder by batches. The analysis is committed after each batch
+        so that a crashed import resumes with the files left in the folder.
 
         yield:
             int: the current step in the analysis
@@ -140,26 +158,96 @@ class ImportLettersHistory(models.Model):
             imported_letter_path = Path(self.env.ref("sbc_switzerland.scan_letter_done").value)
         except TypeError:
             return
+        params = self.env["ir.config_parameter"].sudo()
+        workers = int(params.get_param(
+            "sbc_switzerland.import_download_workers", 4))
+        batch_size = int(params.get_param(
+            "sbc_switzerland.import_move_batch_size", 20))
+        start = time.time()
         try:
-            with self._get_connection() as sftp:
-                files = sftp.listdir(str(import_letter_path))
-                for i, file in enumerate(files):
-                    file = Path(file)
-                    import_full_path = str(import_letter_path / file)
-                    imported_full_path = str(imported_letter_path / file)
+            get_connection = self._get_connection_factory()
+            with get_connection() as sftp:
+                files = sorted(sftp.listdir(str(import_letter_path)))
+        except (AssertionError, IOError) as e:
+            logger.error("Could not establish connection with sftp server")
+            return
+
+        analysed = []
+        nb_analysed = 0
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+            downloads = self._prefetch_files(
+                executor, get_connection, import_letter_path, files, workers * 2)
+            for i, (file, pdf_data) in enumerate(downloads):
+                yield i + 1, len(files), str(import_letter_path / file)
+
+                if pdf_data is None:
+                    continue
+                self._analyze_pdf(pdf_data, file)
+                analysed.append(file)
+                if len(analysed) >= batch_size:
+                    nb_analysed += len(analysed)
+                    self._move_imported_files(
+                        get_connection, import_letter_path,
+                        imported_letter_path, analysed, nb_analysed, start)
+                    analysed = []
+        if analysed:
+            nb_analysed += len(analysed)
+            self._move_imported_files(
+                get_connection, import_letter_path, imported_letter_path,
+                analysed, nb_analysed, start)
 
-                    yield i + 1, len(files), import_full_path
+    @staticmethod
+    def _prefetch_files(executor, get_connection, folder, files, depth):
+        """
+        Downloads the files with the executor, keeping at most depth files
+        in advance of the one being analysed.
+        :return: generator of (file path, file data or None if it failed)
+        """
+        def download(file):
+            with get_connection() as sftp:
+                return sftp.open(str(folder / file)).read()
 
-                    pdf_data = sftp.open(import_full_path).read()
-                    self._analyze_pdf(pdf_data, file)
+        pending = deque()
+        files = iter(files)
+        for file in islice(files, max(depth, 1)):
+            pending.append((file, executor.submit(download, file)))
+        while pending:
+            file, future = pending.popleft()
+            next_file = next(files, None)
+            if next_file is not None:
+                pending.append((next_file, executor.submit(download, next_file)))
+            try:
+                pdf_data = future.result()
+            except (IOError, SSHException):
+                logger.warning(f"Failed to read a file on NAS :\n{traceback.format_exc()}")
+                pdf_data = None
+            yield Path(file), pdf_data
 
+    def _move_imported_files(self, get_connection, import_letter_path,
+                             imported_letter_path, files, nb_analysed, start):
+        """
+        Stores the progress of the import and commits it, then moves the
+        batch of analysed files in the done folder. Committing first keeps the
+        files in the import folder if the analysed letters are lost.
+        """
+        duration = time.time() - start
+        self.write({
+            "nas_last_imported_file": str(files[-1]),
+            "nas_import_duration": duration,
+            "nas_import_speed": nb_analysed * 60 / duration if duration else 0,
+        })
+        if not self.pool.in_test_mode():
+            self.env.cr.commit()  # pylint: disable=invalid-commit
+        try:
+            with get_connection() as sftp:
+                for file in files:
                     try:
-                        sftp.rename(import_full_path, imported_full_path)
+                        sftp.rename(str(import_letter_path / file),
+                                    str(imported_letter_path / file))
                     except Exception as e:
                         logger.warning(f"Failed to move a file on NAS :\n{traceback.format_exc()}")
-        except (AssertionError, IOError) as e:
-            logger.error("Could not establish connection with sftp server")
-            return
+        except (AssertionError, IOError, SSHException):
+            logger.warning(f"Failed to move files on NAS :\n{traceback.format_exc()}")
 
     def run_analyze(self):
         """
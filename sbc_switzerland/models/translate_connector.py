@@ -158,6 +158,76 @@ class TranslateConnect(MysqlConnector):
         }
         return self.upsert("translation", vals)
 
+    def update_translations_to_treated(self, translation_ids):
+        """update several translations to set toDo_id in state "Traité"
+        with one query per chunk
+        """
+        with self.transaction():
+            for chunk in _chunks(translation_ids):
+                self.query(
+                    "UPDATE translation SET toDo_id = 4, updatedat = %s "
+                    "WHERE id IN ({})".format(_placeholders(chunk)),
+                    [self.current_time] + chunk,
+                )
+        return True
+
+    def update_translations_status(self, status_ids, status_id):
+        """update several translation_status (db table) to the given status
+        """
+        with self.transaction():
+            for chunk in _chunks(status_ids):
+                self.query(
+                    "UPDATE translation_status SET status_id = %s "
+                    "WHERE id IN ({})".format(_placeholders(chunk)),
+                    [status_id] + chunk,
+                )
+        return True
+
+    def update_texts_priority(self, text_ids, priority_id):
+        """update the priority of several texts (db table)
+        """
+        with self.transaction():
+            for chunk in _chunks(text_ids):
+                self.query(
+                    "UPDATE text SET priority_id = %s WHERE id IN ({})"
+                    .format(_placeholders(chunk)),
+                    [priority_id] + chunk,
+                )
+        return True
+
+    def get_translations(self, letter_odoo_ids):
+        """ Returns the translations, with their status, of the given Odoo
+        letters. The rows are fetched by chunks of letters.
+        """
+        res = []
+        for chunk in _chunks(letter_odoo_ids):
+            res.extend(self.select_all(
+                """
+                SELECT tr.id, tr.letter_odoo_id, tr.text_id,
+                trs.id AS status, trs.status_id
+
+                FROM translation tr
+                LEFT JOIN translation_status trs ON trs.translation_id = tr.id
+                WHERE tr.letter_odoo_id IN ({})
+                """.format(_placeholders(chunk)),
+                chunk,
+            ))
+        return res
+
+    def get_pending_translations(self):
+        """ Returns the translations linked to an Odoo letter that have
+        translation_status 'A traduire' (id = 1). """
+        return self.select_all(
+            """
+            SELECT tr.id, tr.letter_odoo_id, trs.id AS status
+
+            FROM translation tr
+            INNER JOIN translation_status trs ON trs.translation_id = tr.id
+            WHERE tr.letter_odoo_id IS NOT NULL
+            AND trs.status_id = 1
+        """
+        )
+
     def remove_letter(self, text_id):
         """ Delete a letter record with the text_id given """
         self.remove_from_text(text_id)
@@ -218,3 +288,13 @@ class TranslateConnect(MysqlConnector):
             ).replace(tzinfo=None),
         }
         return self.upsert("user", vals)
+
+
+def _chunks(ids, size=1000):
+    """ Splits a list of ids in chunks used in IN (...) clauses. """
+    ids = list(ids)
+    return [ids[i: i + size] for i in range(0, len(ids), size)]
+
+
+def _placeholders(values):
+    return ",".join(["%s"] * len(values))
@@ -0,0 +1,35 @@
+##############################################################################
+#
+#    Copyright (C) 2022 Compassion CH (http://www.compassion.ch)
+#    Releasing children from poverty in Jesus' name
+#
+#    The licence is in the file __manifest__.py
+#
+##############################################################################
+
+from odoo import models
+
+
+class AccountBankStatementImport(models.TransientModel):
+    _inherit = "account.bank.statement.import"
+
+    def _complete_stmts_vals(self, stmts_vals, journal, account_number):
+        """ Resolve the references of all imported lines at once, so that
+        the completion rules don't search them line by line, and generate
+        the invoices of the completed lines in one batch. """
+        st_lines = [
+            line
+            for st_vals in stmts_vals
+            for line in st_vals.get("transactions", [])
+        ]
+        rule_obj = self.env["account.statement.completion.rule"]
+        lookup = rule_obj._prepare_completion_lookup(st_lines)
+        batch_import = self.with_context(completion_lookup=lookup)
+        stmts_vals = super(
+            AccountBankStatementImport, batch_import
+        )._complete_stmts_vals(
+            stmts_vals, journal.with_context(completion_lookup=lookup),
+            account_number
+        )
+        rule_obj._create_pending_invoices(lookup)
+        return stmts_vals
@@ -9,7 +9,8 @@
 ##############################################################################
 
 import re
-from odoo import models, fields
+from odoo import api, models, fields
+from odoo.osv import expression
 from odoo.addons.sponsorship_compassion.models.product_names import (
     GIFT_CATEGORY,
     GIFT_REF,
@@ -68,6 +69,23 @@ class StatementCompletionRule(models.Model):
     #                             PUBLIC METHODS                             #
     ##########################################################################
 
+    @api.multi
+    def auto_complete_batch(self, stmts_vals, st_lines):
+        """
+        Batch version of auto_complete: the references and names of all
+        statement lines are resolved with a few set-based queries, and the
+        rules are then applied on each line using these lookup tables.
+        The result is identical to calling auto_complete on each line.
+        :param stmts_vals: bank statement values
+        :param st_lines: list of statement line values
+        :return: list of dict of values (one for each statement line)
+        """
+        lookup = self._prepare_completion_lookup(st_lines)
+        rules = self.with_context(completion_lookup=lookup)
+        res = [rules.auto_complete(stmts_vals, st_line) for st_line in st_lines]
+        self._create_pending_invoices(lookup)
+        return res
+
     def get_from_partner_ref(self, stmts_vals, st_line):
         """
         If line ref match a partner reference, update partner and account
@@ -89,10 +107,7 @@ class StatementCompletionRule(models.Model):
         ref_index_end = 16  # position where the partner ref ends in the BVR
         partner_ref = ref[ref_index_end-7:ref_index_end]  # get standard 7 numbers ref
         old_partner_ref = ref[ref_index_end-6:ref_index_end]  # get legacy 6 numbers ref
-        partner_obj = self.env["res.partner"]
-        partner = partner_obj.search(["|",
-                                      ("ref", "=", partner_ref),
-                                      ("ref", "=", old_partner_ref)])
+        partner = self._search_partner_by_ref([partner_ref, old_partner_ref])
         if not partner:
             # Some bvr reference have a wrong number of leading zeros,
             # resulting in the partner reference to be offset.
@@ -101,7 +116,7 @@ class StatementCompletionRule(models.Model):
                 flexible_ref = flexible_ref_match.group(1)
                 if int(flexible_ref) != int(partner_ref):
                     logger.warning(f"The partner reference might be misaligned: {ref}")
-                    partner = partner_obj.search([("ref", "=", str(int(flexible_ref)))])
+                    partner = self._search_partner_by_ref([str(int(flexible_ref))])
                     ref_index_start = flexible_ref_match.start(1)
         if len(partner) > 1:
             # Take only those who have active sponsorships
@@ -143,9 +158,8 @@ class StatementCompletionRule(models.Model):
         name = st_line['name']
         res = dict()
 
-        wire_transfer_mode = self.env['account.payment.mode'].with_context(lang="en_US").search([
-            ("name", "=", "wire transfer")
-        ])
+        wire_transfer_mode = self.env['account.payment.mode'].browse(
+            self.with_context(lang="en_US")._get_payment_mode_ids("wire transfer"))
 
         if not wire_transfer_mode:
             logger.warning("Unable to find wire transfer payment mode")
@@ -193,17 +207,6 @@ class StatementCompletionRule(models.Model):
 
     def get_from_lsv_dd(self, stmts_vals, st_line):
         """ If line is a LSV or DD credit, change the account to 1098. """
-
-        def get_postfinance_id():
-            return (
-                self.env["res.partner"]
-                    .search([("name", "=", "Postfinance SA")], limit=1)
-                    .commercial_partner_id.id
-            )
-
-        def fetch_account_id_by_code(code):
-            return self.env["account.account"].search([("code", "=", code)], limit=1).id
-
         label = (
             st_line["name"].replace("\n", " ")
             if st_line["name"] != "/"
@@ -219,68 +222,39 @@ class StatementCompletionRule(models.Model):
         if st_line["amount"] >= 0:
             if "KREDITKARTEN" in label:
                 return {
-                    "account_id": fetch_account_id_by_code("2000"),
-                    "partner_id": get_postfinance_id(),
+                    "account_id": self._get_account_id_by_code("2000"),
+                    "partner_id": self._get_postfinance_partner_id(),
                 }
             elif "CRÉDIT TRANSACTIONS E-PAYMENT POSTFINANCE CARD" in label:
                 return {
-                    "account_id": fetch_account_id_by_code("1015"),
-                    "partner_id": get_postfinance_id(),
+                    "account_id": self._get_account_id_by_code("1015"),
+                    "partner_id": self._get_postfinance_partner_id(),
                 }
             else:
                 is_lsv_dd = any(s in label for s in lsv_dd_strings)
                 if is_lsv_dd:
-                    account_id = fetch_account_id_by_code("1098")
+                    account_id = self._get_account_id_by_code("1098")
                     if account_id:
-                        return {"account_id": fetch_account_id_by_code("1098")}
+                        return {"account_id": self._get_account_id_by_code("1098")}
         return {}
 
     def get_sponsor_name(self, st_vals, st_line):
         res = {}
-        name = st_line["name"]
-        wire_transfer_pattern = "VIREMENT DU COMPTE "
-        patterns_lookup = [" EXPÉDITEUR: ", " DONNEUR D'ORDRE: ", wire_transfer_pattern]
-
-        def search_partner(criteria):
-            return self.env["res.partner"].search(criteria)
-
-        for pattern in patterns_lookup:
-            if pattern in name:
-                sender_info = name.split(pattern)[1]
-                if pattern == wire_transfer_pattern:
-                    # First the account of partner, then the name
-                    # (lastname is at first)
-                    name_guess = sender_info.split(" ")[1:3]
-                    name_guess.reverse()
-                else:
-                    # Guess the name with the two first words (following words
-                    # could be part of the address (firstname is at first)
-                    name_guess = sender_info.split(" ")[:2]
-                partner = (
-                    search_partner(
-                        [
-                            ("firstname", "ilike", name_guess[0]),
-                            ("lastname", "=ilike", name_guess[1]),
-                        ]
-                    )
-                    if len(name_guess) >= 2
-                    else []
-                )
-                if len(partner) > 1:
-                    # Try to do exact search on firstname
-                    partner = search_partner(
-                        [
-                            ("firstname", "=ilike", name_guess[0]),
-                            ("lastname", "=ilike", name_guess[1]),
-                        ]
-                    )
-                if not partner:
-                    # Try to find a company
-                    partner = search_partner(
-                        [("name", "ilike", name_guess[0]), ("is_company", "=", True)]
-                    )
-                if partner and len(partner) == 1:
-                    res["partner_id"] = partner.commercial_partner_id.id
+        for name_guess in self._get_sponsor_name_guesses(st_line["name"]):
+            partner = (
+                self._search_partner_by_name(name_guess[0], name_guess[1])
+                if len(name_guess) >= 2
+                else []
+            )
+            if len(partner) > 1:
+                # Try to do exact search on firstname
+                partner = self._search_partner_by_name(
+                    name_guess[0], name_guess[1], exact=True)
+            if not partner:
+                # Try to find a company
+                partner = self._search_company_by_name(name_guess[0])
+            if partner and len(partner) == 1:
+                res["partner_id"] = partner.commercial_partner_id.id
 
         return res
 
@@ -346,9 +320,7 @@ class StatementCompletionRule(models.Model):
             return res, False
 
         # Setup invoice data
-        journal_id = (
-            self.env["account.journal"].search([("type", "=", "sale")], limit=1).id
-        )
+        journal_id = self._get_sale_journal_id()
 
         inv_data = {
             "account_id": partner.property_account_receivable_id.id,
@@ -358,12 +330,22 @@ class StatementCompletionRule(models.Model):
             "date_invoice": st_line["date"],
             "payment_term_id": 1,  # Immediate payment
             "payment_mode_id": self.env["account.payment.mode"]
-            .search([("name", "=", "BVR")])
+            .browse(self._get_payment_mode_ids("BVR"))
             .id,
             "reference": ref,
             "origin": stmts_vals["name"],
         }
 
+        lookup = self.env.context.get("completion_lookup") or {}
+        if "pending_invoices" in lookup:
+            # Batch completion: the invoice is created and validated together
+            # with the others at the end of the completion.
+            inv_data["invoice_line_ids"] = [(0, 0, self._prepare_invoice_line(
+                product, st_line, partner.id))]
+            lookup["pending_invoices"].append(inv_data)
+            res["name"] = product.name
+            return res, True
+
         # Create invoice and generate invoice lines
         invoice = (
             self.env["account.invoice"].with_context(lang="en_US").create(inv_data)
@@ -378,6 +360,17 @@ class StatementCompletionRule(models.Model):
         return res, True
 
     def _generate_invoice_line(self, invoice_id, product, st_line, partner_id):
+        inv_line_data = self._prepare_invoice_line(product, st_line, partner_id)
+        inv_line_data["invoice_id"] = invoice_id
+
+        res = {}
+        res["name"] = product.name
+
+        self.env["account.invoice.line"].create(inv_line_data)
+
+        return res
+
+    def _prepare_invoice_line(self, product, st_line, partner_id):
         inv_line_data = {
             "name": st_line.get("note") or product.name,
             "account_id": product.property_account_income_id.id,
@@ -385,11 +378,8 @@ class StatementCompletionRule(models.Model):
             "price_subtotal": st_line["amount"],
             "quantity": 1,
             "product_id": product.id or False,
-            "invoice_id": invoice_id,
         }
 
-        res = {}
-
         # Define analytic journal
         analytic = self.env["account.analytic.default"].account_get(
             product.id, partner_id, date=fields.Date.today()
@@ -399,15 +389,30 @@ class StatementCompletionRule(models.Model):
         if analytic.analytic_tag_ids:
             inv_line_data["analytic_tag_ids"] = [(6, 0, analytic.analytic_tag_ids.ids)]
 
-        res["name"] = product.name
-
-        self.env["account.invoice.line"].create(inv_line_data)
+        return inv_line_data
 
-        return res
+    @api.model
+    def _create_pending_invoices(self, lookup):
+        """
+        Creates and validates in one batch all invoices generated during a
+        batch completion.
+        :param lookup: the completion lookup given to the rules
+        :return: account.invoice recordset
+        """
+        pending_invoices = lookup.pop("pending_invoices", [])
+        invoices = self.env["account.invoice"].with_context(lang="en_US").create(
+            pending_invoices)
+        if invoices:
+            invoices.action_invoice_open()
+        return invoices
 
     def _search_partner_by_bvr_ref(self, bvr_ref, search_old_invoices=False):
         """ Finds a partner given its bvr reference. """
         partner = None
+        lookup = self.env.context.get("completion_lookup") or {}
+        if bvr_ref in lookup.get("bvr_refs", []):
+            return self._lookup_partner_by_bvr_ref(
+                lookup, bvr_ref, search_old_invoices)
         contract_group_obj = self.env["recurring.contract.group"]
         contract_groups = contract_group_obj.search([("bvr_reference", "=", bvr_ref)]).filtered('contains_sponsorship')
         if contract_groups:
@@ -435,6 +440,195 @@ class StatementCompletionRule(models.Model):
 
         return partner
 
+    def _lookup_partner_by_bvr_ref(self, lookup, bvr_ref, search_old_invoices):
+        """ Same as _search_partner_by_bvr_ref, using the prefetched data of
+        a batch completion. The invoices are kept in their search order,
+        so that the same invoice is picked as with the search. """
+        group_ids = lookup["contract_group_ids_by_bvr"].get(bvr_ref)
+        if group_ids:
+            return self.env["recurring.contract.group"].browse(
+                group_ids[0]).partner_id
+        states = ("open", "cancel", "paid") if search_old_invoices else ("open",)
+        invoices = lookup["invoices_by_bvr"].get(bvr_ref, [])
+        invoice_id = next((
+            inv["id"] for inv in invoices
+            if inv["reference"] == bvr_ref and inv["state"] in states
+        ), None) or next((
+            inv["id"] for inv in invoices if inv["state"] == "open"
+        ), None)
+        if invoice_id:
+            return self.env["account.invoice"].browse(invoice_id).partner_id
+        # Invoices generated for previous lines of the batch would have been
+        # found if they were already created.
+        partner_id = next((
+            inv_data["partner_id"] for inv_data in lookup.get("pending_invoices", [])
+            if inv_data["reference"] == bvr_ref
+        ), None)
+        if partner_id:
+            return self.env["res.partner"].browse(partner_id)
+        return None
+
+    def _search_partner_by_ref(self, refs):
+        """ Finds the partners having one of the given references. """
+        partner_obj = self.env["res.partner"]
+        lookup = self.env.context.get("completion_lookup") or {}
+        partner_ids_by_ref = lookup.get("partner_ids_by_ref", {})
+        if all(ref in partner_ids_by_ref for ref in refs):
+            partner_ids = []
+            for ref in refs:
+                partner_ids.extend(
+                    pid for pid in partner_ids_by_ref[ref] if pid not in partner_ids)
+            return partner_obj.browse(partner_ids)
+        return partner_obj.search([("ref", "in", refs)])
+
+    def _search_partner_by_name(self, firstname, lastname, exact=False):
+        """ Finds the partners matching the guessed firstname and lastname
+        of a statement line. """
+        lookup = self.env.context.get("completion_lookup") or {}
+        candidates = lookup.get("partners_by_lastname", {})
+        if lastname.lower() in candidates and _is_plain_pattern(firstname):
+            firstname = firstname.lower()
+            return self.env["res.partner"].browse([
+                partner["id"] for partner in candidates[lastname.lower()]
+                if partner["firstname"] and (
+                    partner["firstname"].lower() == firstname if exact
+                    else firstname in partner["firstname"].lower()
+                )
+            ])
+        return self.env["res.partner"].search([
+            ("firstname", "=ilike" if exact else "ilike", firstname),
+            ("lastname", "=ilike", lastname),
+        ])
+
+    def _search_company_by_name(self, name):
+        """ Finds the companies matching the guessed name of a statement line.
+        """
+        lookup = self.env.context.get("completion_lookup") or {}
+        if name.lower() in lookup.get("company_names", []):
+            name = name.lower()
+            return self.env["res.partner"].browse([
+                company["id"] for company in lookup["companies"]
+                if name in company["name"].lower()
+            ])
+        return self.env["res.partner"].search(
+            [("name", "ilike", name), ("is_company", "=", True)])
+
+    @api.model
+    def _get_sponsor_name_guesses(self, name):
+        """ Guess the firstname and lastname of the sender of a payment
+        given the label of the statement line.
+        :return: list of [firstname, lastname] guesses
+        """
+        wire_transfer_pattern = "VIREMENT DU COMPTE "
+        patterns_lookup = [" EXPÉDITEUR: ", " DONNEUR D'ORDRE: ", wire_transfer_pattern]
+        guesses = []
+        for pattern in patterns_lookup:
+            if pattern in name:
+                sender_info = name.split(pattern)[1]
+                if pattern == wire_transfer_pattern:
+                    # First the account of partner, then the name
+                    # (lastname is at first)
+                    name_guess = sender_info.split(" ")[1:3]
+                    name_guess.reverse()
+                else:
+                    # Guess the name with the two first words (following words
+                    # could be part of the address (firstname is at first)
+                    name_guess = sender_info.split(" ")[:2]
+                guesses.append(name_guess)
+        return guesses
+
+    @api.model
+    def _prepare_completion_lookup(self, st_lines):
+        """
+        Resolves the references and names of all given statement lines with
+        set-based queries. The result is used by the rules when it is found
+        in the context under the key `completion_lookup`.
+        Only ids and plain values are stored, so that the context stays
+        lightweight.
+        :param st_lines: list of statement line values
+        :return: dict of lookup tables
+        """
+        partner_refs = set()
+        bvr_refs = set()
+        lastnames = set()
+        company_names = set()
+        for st_line in st_lines:
+            ref = st_line.get("ref")
+            if ref and isinstance(ref, str):
+                bvr_refs.add(ref)
+                partner_refs.update((ref[9:16], ref[10:16]))
+                flexible_ref_match = re.search(r"^0{,10}([1-9]\d{4,6})0", ref)
+                if flexible_ref_match:
+                    partner_refs.add(str(int(flexible_ref_match.group(1))))
+            name = st_line.get("name")
+            if name and isinstance(name, str):
+                for name_guess in self._get_sponsor_name_guesses(name):
+                    if name_guess and _is_plain_pattern(name_guess[0]):
+                        company_names.add(name_guess[0].lower())
+                    if len(name_guess) >= 2 and _is_plain_pattern(name_guess[1]):
+                        lastnames.add(name_guess[1].lower())
+
+        partner_obj = self.env["res.partner"]
+        lookup = {
+            "partner_ids_by_ref": {ref: [] for ref in partner_refs},
+            "bvr_refs": bvr_refs,
+            "contract_group_ids_by_bvr": {},
+            "invoices_by_bvr": {},
+            "partners_by_lastname": {lastname: [] for lastname in lastnames},
+            "company_names": set(),
+            "companies": [],
+            # Invoices generated by the rules, created at the end of the batch
+            "pending_invoices": [],
+        }
+        if partner_refs:
+            for partner in partner_obj.search_read(
+                    [("ref", "in", list(partner_refs))], ["ref"]):
+                lookup["partner_ids_by_ref"][partner["ref"]].append(partner["id"])
+
+        if bvr_refs:
+            groups = self.env["recurring.contract.group"].search(
+                [("bvr_reference", "in", list(bvr_refs))]
+            ).filtered("contains_sponsorship")
+            for group in groups:
+                lookup["contract_group_ids_by_bvr"].setdefault(
+                    group.bvr_reference, []).append(group.id)
+            invoice_refs = list(bvr_refs - set(lookup["contract_group_ids_by_bvr"]))
+            if invoice_refs:
+                for invoice in self.env["account.invoice"].search_read([
+                    "|",
+                    ("reference", "in", invoice_refs),
+                    ("isr_reference", "in", invoice_refs),
+                    ("state", "in", ("open", "cancel", "paid")),
+                ], ["reference", "isr_reference", "state"]):
+                    for ref in {invoice["reference"], invoice["isr_reference"]}:
+                        if ref in bvr_refs:
+                            lookup["invoices_by_bvr"].setdefault(
+                                ref, []).append(invoice)
+
+        # The in-memory matching of names reproduces the ilike operator,
+        # which is not possible when the unaccent extension is used.
+        if not self.pool.has_unaccent:
+            if lastnames:
+                for partner in partner_obj.search_read(expression.OR([
+                    [("lastname", "=ilike", lastname)] for lastname in lastnames
+                ]), ["firstname", "lastname"]):
+                    lookup["partners_by_lastname"].setdefault(
+                        partner["lastname"].lower(), []).append(partner)
+            else:
+                lookup["partners_by_lastname"] = {}
+            if company_names:
+                lookup["company_names"] = company_names
+                lookup["companies"] = partner_obj.search_read(
+                    expression.AND([
+                        expression.OR([
+                            [("name", "ilike", name)] for name in company_names
+                        ]),
+                        [("is_company", "=", True)],
+                    ]), ["name"])
+        else:
+            lookup["partners_by_lastname"] = {}
+        return lookup
+
     def _find_product_id(self, partner_ref, ref):
         """ Finds what kind of payment it is,
             based on the reference of the statement line. """
@@ -452,21 +646,77 @@ class StatementCompletionRule(models.Model):
         product = 0
         if payment_type in range(1, 6):
             # Sponsor Gift
-            products = product_obj.search(
-                [("default_code", "=", GIFT_REF[payment_type - 1])]
+            products = product_obj.browse(
+                self._get_product_ids("default_code", GIFT_REF[payment_type - 1])
             )
             product = products[0] if products else 0
         elif payment_type in range(6, 8):
             # Fund donation
-            products = product_obj.search(
-                [
-                    (
-                        "fund_id",
-                        "=",
-                        int(ref[payment_type_index + 1: payment_type_index + 5]),
-                    )
-                ]
+            products = product_obj.browse(
+                self._get_product_ids(
+                    "fund_id",
+                    int(ref[payment_type_index + 1: payment_type_index + 5]),
+                )
             )
             product = products[0] if products else 0
 
         return product
+
+    ##########################################################################
+    #                         CACHED LOOKUP METHODS                          #
+    ##########################################################################
+    # The following records are searched for every statement line, but almost
+    # never change. They are kept in the lookup of the current import, so
+    # that a modification is taken into account by the next import.
+
+    @api.model
+    def _get_cached_lookup(self, key, search):
+        lookup = self.env.context.get("completion_lookup")
+        if lookup is None:
+            return search()
+        cache = lookup.setdefault("cached_ids", {})
+        if key not in cache:
+            cache[key] = search()
+        return cache[key]
+
+    @api.model
+    def _get_product_ids(self, field_name, value):
+        return self._get_cached_lookup(
+            ("product", field_name, value),
+            lambda: tuple(self.env["product.product"].search(
+                [(field_name, "=", value)]).ids))
+
+    @api.model
+    def _get_sale_journal_id(self):
+        return self._get_cached_lookup(
+            ("sale_journal",),
+            lambda: self.env["account.journal"].search(
+                [("type", "=", "sale")], limit=1).id)
+
+    @api.model
+    def _get_payment_mode_ids(self, name):
+        return self._get_cached_lookup(
+            ("payment_mode", self.env.context.get("lang"), name),
+            lambda: tuple(self.env["account.payment.mode"].search(
+                [("name", "=", name)]).ids))
+
+    @api.model
+    def _get_account_id_by_code(self, code):
+        return self._get_cached_lookup(
+            ("account", code),
+            lambda: self.env["account.account"].search(
+                [("code", "=", code)], limit=1).id)
+
+    @api.model
+    def _get_postfinance_partner_id(self):
+        return self._get_cached_lookup(
+            ("postfinance_partner",),
+            lambda: self.env["res.partner"].search(
+                [("name", "=", "Postfinance SA")], limit=1
+            ).commercial_partner_id.id)
+
+
+def _is_plain_pattern(value):
+    """ Tells if a value can be compared in memory like the ilike operator
+    would do in the database (no empty value and no wildcards). """
+    return bool(value) and not any(c in value for c in "%_\\")
@@ -116,6 +116,39 @@ class TestCompletionRulesSwitzerland(TransactionCase):
 
         self.assertEqual(completion_result, {})
 
+    def test_batch_completion_gives_same_result_as_line_completion(self):
+        partner_ref = self._insert_partner()
+        st_lines = [
+            {"ref": "xxxxxxxxx1111111", "name": "/"},
+            {"ref": "x" * 9 + partner_ref + "11111" + "4" + "0" * 5, "name": "/"},
+            {"ref": "", "name": u" EXPÉDITEUR: Kim Snyder"},
+            {"ref": "", "name": u" EXPÉDITEUR: marc demo"},
+            {"ref": "", "name": u" DONNEUR D'ORDRE: Gemini"},
+            {"ref": "", "name": u"VIREMENT DU COMPTE CH01 snyder kim"},
+        ]
+        rules = self.env["account.statement.completion.rule"].search([
+            ("function_to_call", "in", [
+                "get_from_partner_ref", "get_from_bvr_ref", "get_sponsor_name"])
+        ])
+        for rule in rules:
+            expected = [rule.auto_complete([], dict(line)) for line in st_lines]
+            self.assertEqual(
+                rule.auto_complete_batch([], [dict(line) for line in st_lines]),
+                expected,
+            )
+
+    def test_cached_product_lookup_is_kept_for_one_import(self):
+        rule_obj = self.env["account.statement.completion.rule"]
+        import_rule_obj = rule_obj.with_context(completion_lookup={})
+        product = self.env["product.product"].create(
+            {"name": "Test fund", "fund_id": 9876})
+        self.assertEqual(
+            import_rule_obj._get_product_ids("fund_id", 9876), (product.id,))
+        product.product_tmpl_id.fund_id = 9875
+        self.assertEqual(
+            import_rule_obj._get_product_ids("fund_id", 9876), (product.id,))
+        self.assertEqual(rule_obj._get_product_ids("fund_id", 9876), ())
+
     def _fetch_rule_by_function_name(self, rule_function_name):
         completion_rule_obj = self.env["account.statement.completion.rule"]
         return completion_rule_obj.search(
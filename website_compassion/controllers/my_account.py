@@ -6,17 +6,15 @@
 #    The licence is in the file __manifest__.py
 #
 ##############################################################################
-from urllib.error import HTTPError
-
 from .auto_texts import CHRISTMAS_TEXTS
 
 import base64
 from datetime import datetime, timedelta
 from base64 import b64decode, b64encode
-from os import path, remove
+from os import path
+from shutil import rmtree
+from tempfile import mkdtemp
 from urllib.parse import urlparse, urlencode
-from zipfile import ZipFile
-from urllib.request import urlretrieve, urlopen
 from math import ceil
 import secrets
 from passlib.context import CryptContext
@@ -32,8 +30,7 @@ from odoo.addons.cms_form_compassion.controllers.payment_controller import (
 )
 
 from ..tools.image_compression import compress_big_images
-
-IMG_URL = "https://erp.compassion.ch/web/image/compassion.child.pictures/{id}/fullshot/"
+from ..tools.zip_stream import ZipStream, archive_slots
 
 
 def _get_user_children(state=None):
@@ -45,40 +42,8 @@ def _get_user_children(state=None):
     :return: a recordset of child.compassion which the connected user sponsors
     """
     env = request.env
-    partner = env.user.partner_id
-    end_reason_child_depart = env.ref("sponsorship_compassion.end_reason_depart")
-
-    def filter_sponsorships(sponsorship):
-        can_show = True
-        is_active = sponsorship.state not in ["draft", "cancelled", "terminated"]
-        is_recent_terminated = (
-                sponsorship.state == "terminated"
-                and sponsorship.can_write_letter
-                and sponsorship.end_reason_id == end_reason_child_depart
-        )
-        exit_communication_sent = (
-                sponsorship.state == "terminated"
-                and sponsorship.sds_state != "sub_waiting"
-        )
-
-        if state == "active":
-            can_show = (
-                is_active or is_recent_terminated
-                and not exit_communication_sent
-            )
-        elif state == "terminated":
-            can_show = (
-                sponsorship.state == "terminated"
-                and not is_recent_terminated or exit_communication_sent
-            )
-        elif state == "write":
-            can_show = sponsorship.can_write_letter
-
-        return can_show
-
-    return partner.get_portal_sponsorships().with_context(
-        allow_during_suspension=True).filtered(filter_sponsorships).mapped(
-        "child_id").sorted("preferred_name")
+    snapshot = env["portal.children.snapshot"].get_snapshot(env.user.partner_id)
+    return env["compassion.child"].browse(snapshot["children"][state or "all"])
 
 
 def _fetch_images_from_child(child):
@@ -100,43 +65,76 @@ def _fetch_images_from_child(child):
     return images
 
 
+def _get_pictures_files(images, tmp_dir):
+    """
+    Find the files of the pictures in the filestore. The pictures stored in
+    the database are written in the temporary folder.
+    :param images: a list of tuples of the form [(image1, full_path1), ...]
+    :param tmp_dir: temporary folder unique to the request
+    :return: a list of tuples of the form [(disk_path1, full_path1), ...]
+    """
+    pictures = request.env["compassion.child.pictures"].sudo().browse(
+        [img.id for (img, full_path) in images])
+    attachments = request.env["ir.attachment"].sudo().search([
+        ("res_model", "=", pictures._name),
+        ("res_field", "=", "fullshot"),
+        ("res_id", "in", pictures.ids),
+    ])
+    disk_paths = {
+        attachment.res_id: attachment._full_path(attachment.store_fname)
+        for attachment in attachments
+        if attachment.store_fname
+    }
+    files = []
+    for (img, full_path) in images:
+        disk_path = disk_paths.get(img.id)
+        if not disk_path:
+            data = pictures.browse(img.id).fullshot
+            if not data:
+                continue
+            disk_path = path.join(tmp_dir, str(img.id))
+            with open(disk_path, "wb") as tmp_file:
+                tmp_file.write(b64decode(data))
+        files.append((disk_path, full_path))
+    return files
+
+
 def _create_archive(images, archive_name):
     """
     Create an archive from a list of images and the name of the future archive.
-    Some files are created locally but are deleted after they are used by the
-    method.
+    The archive is streamed to the client while it is built from the files of
+    the pictures. Each worker builds a limited number of archives at the same
+    time.
     :param images: a list of tuples of the form [(image1, full_path1), ...]
     :param archive_name: the name of the future archive
     :return: a response for the client to download the created archive
     """
-    with ZipFile(archive_name, "w") as archive:
-        for (img, full_path) in images:
-            filename = path.basename(full_path)
-
-            # Create file, write to archive and delete it from os
-            img_url = IMG_URL.format(id=img.id)
-            try:
-                urlretrieve(img_url, filename)
-            except HTTPError:
-                continue
-            archive.write(filename, full_path)
-            remove(filename)
-
-    # Get binary content of the archive, then delete the latter
-    with open(archive_name, "rb") as archive:
-        zip_data = archive.read()
-    remove(archive_name)
-
-    return request.make_response(
-        zip_data,
-        [("Content-Type", "application/zip"),
-         ("Content-Disposition", content_disposition(archive_name))]
+    if not archive_slots.acquire(timeout=5):
+        return request.make_response(
+            _("Too many downloads are running, please try again later."),
+            status=503)
+    tmp_dir = None
+    try:
+        tmp_dir = mkdtemp(prefix="child_pictures_")
+        files = _get_pictures_files(images, tmp_dir)
+    except Exception:
+        if tmp_dir:
+            rmtree(tmp_dir, ignore_errors=True)
+        archive_slots.release()
+        raise
+    headers = Headers()
+    headers.add("Content-Disposition", content_disposition(archive_name))
+    return Response(
+        ZipStream(files, tmp_dir, archive_slots),
+        content_type="application/zip",
+        headers=headers,
+        direct_passthrough=True,
     )
 
 
 def _single_image_response(image):
     ext = image.image_url.split(".")[-1]
-    data = urlopen(IMG_URL.format(id=image.id)).read()
+    data = b64decode(image.sudo().fullshot or b"")
     filename = f"{image.child_id.preferred_name}_{image.date}.{ext}"
 
     return request.make_response(
@@ -167,8 +165,8 @@ def _download_image(child_id, obj_id):
     if child_id < 0:
         return False
 
-    # One child
-    child = request.env["compassion.child"].browse(child_id)
+    # One child, among the children of the sponsor
+    child = _get_user_children().filtered(lambda c: c.id == child_id)
 
     # All images from a child
     if child and obj_id < 0:
@@ -343,8 +341,11 @@ class MyAccountController(PaymentFormController):
         :param kwargs: optional additional arguments
         :return: a redirection to a webpage
         """
-        actives = _get_user_children("active")
-        terminated = _get_user_children("terminated") - actives
+        partner = request.env.user.partner_id
+        snapshot = request.env["portal.children.snapshot"].get_snapshot(partner)
+        child_obj = request.env["compassion.child"]
+        actives = child_obj.browse(snapshot["children"]["active"])
+        terminated = child_obj.browse(snapshot["children"]["terminated"]) - actives
 
         display_state = True
         # User can choose among groups if none of the two is empty
@@ -374,37 +375,16 @@ class MyAccountController(PaymentFormController):
             return request.redirect(f"/my/children?state={state}&child_id={children[0].id}")
 
         # This child is sponsored by this user and is selected
-        partner = request.env.user.partner_id
         correspondence_obj = request.env["correspondence"]
-        correspondent = partner
-
         if partner.portal_sponsorships == "all_info":
-            correspondent |= child.sponsorship_ids.filtered(
-                lambda x: x.is_active).mapped("correspondent_id")
             correspondence_obj = correspondence_obj.sudo()
-
-        letters = correspondence_obj.search([
-            ("partner_id", "in", correspondent.ids),
-            ("child_id", "=", int(child_id)),
-            "|",
-            "&", ("direction", "=", "Supporter To Beneficiary"),
-            ("state", "!=", "Quality check unsuccessful"),
-            "&", "&", ("state", "=", "Published to Global Partner"),
-            ("letter_image", "!=", False),
-            "|", ("communication_id", "=", False), ("sent_date", "!=", False)
-        ])
-        gift_categ = request.env.ref("sponsorship_compassion.product_category_gift")
-        lines = request.env["account.invoice.line"].sudo().search([
-            ("partner_id", "=", partner.id),
-            ("state", "=", "paid"),
-            ("contract_id.child_id", "=", child.id),
-            ("product_id.categ_id", "=", gift_categ.id),
-            ("price_total", "!=", 0),
-        ])
+        letters = correspondence_obj.browse(snapshot["letters"].get(child.id, []))
+        lines = request.env["account.invoice.line"].sudo().browse(
+            snapshot["gift_lines"].get(child.id, []))
         request.session['child_id'] = child.id
 
         gift_base_url = _("https://compassion.ch/de/geschenkformular")
-        child_gift_params = partner.with_context({'mailchimp_child': child}).wordpress_form_data
+        child_gift_params = snapshot["gift_params"].get(child.id, "")
         url_child_gift = f"{gift_base_url}?{child_gift_params}"
 
         context = {
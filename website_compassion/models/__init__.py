@@ -12,4 +12,5 @@ from . import invoice_line
 from . import mail_activity
 from . import compassion_child_pictures
 from . import res_user
-from . import password_security_home_requirements
\ No newline at end of file
+from . import password_security_home_requirements
+from . import portal_children_snapshot
\ No newline at end of file
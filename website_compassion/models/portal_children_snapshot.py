@@ -0,0 +1,341 @@
+##############################################################################
+#
+#    Copyright (C) 2022 Compassion CH (http://www.compassion.ch)
+#    Releasing children from poverty in Jesus' name
+#
+#    The licence is in the file __manifest__.py
+#
+##############################################################################
+import json
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from odoo import api, models, fields
+
+_logger = logging.getLogger(__name__)
+
+# States of the sponsorships that can be displayed in "my children"
+CHILDREN_STATES = ["all", "active", "terminated", "write"]
+# Fields used by the snapshot: a write on other fields keeps it.
+SNAPSHOT_PARTNER_FIELDS = {
+    "portal_sponsorships", "lang", "name", "firstname", "lastname",
+    "preferred_name", "email", "street", "city", "zip", "country_id", "ref",
+}
+SNAPSHOT_CONTRACT_FIELDS = {
+    "state", "partner_id", "correspondent_id", "child_id", "end_reason_id",
+    "sds_state", "can_write_letter",
+}
+SNAPSHOT_LETTER_FIELDS = {
+    "partner_id", "child_id", "sponsorship_id", "direction", "state",
+    "letter_image", "communication_id", "sent_date",
+}
+
+
+def _can_show_sponsorship(sponsorship, state, end_reason_child_depart):
+    """
+    Tells if the child of a sponsorship is displayed for the given state.
+    :param state: all, active (with children who departed recently),
+                  terminated or write (children who can receive letters)
+    """
+    is_active = sponsorship.state not in ["draft", "cancelled", "terminated"]
+    is_recent_terminated = (
+            sponsorship.state == "terminated"
+            and sponsorship.can_write_letter
+            and sponsorship.end_reason_id == end_reason_child_depart
+    )
+    exit_communication_sent = (
+            sponsorship.state == "terminated"
+            and sponsorship.sds_state != "sub_waiting"
+    )
+
+    if state == "active":
+        return (
+            is_active or is_recent_terminated
+            and not exit_communication_sent
+        )
+    elif state == "terminated":
+        return (
+            sponsorship.state == "terminated"
+            and not is_recent_terminated or exit_communication_sent
+        )
+    elif state == "write":
+        return sponsorship.can_write_letter
+    return True
+
+
+class PortalChildrenSnapshot(models.Model):
+    """ What the donor portal displays about the children of a sponsor:
+    the children by state, the letters and the paid gifts of each child.
+    It is computed at the first view and emptied when the sponsorships, the
+    letters or the paid invoices of the sponsor change.
+
+    The snapshots are written with their own cursor in autocommit, after the
+    commit of the changes for the invalidations, so that the portal and the
+    backend jobs never wait for each other. A snapshot is only stored if it
+    was computed after the last invalidation (invalidate_date).
+    """
+    _name = "portal.children.snapshot"
+    _description = "Donor portal children snapshot"
+
+    partner_id = fields.Many2one(
+        "res.partner", required=True, ondelete="cascade", readonly=True)
+    data = fields.Text(readonly=True)
+    invalidate_date = fields.Datetime(readonly=True)
+
+    _sql_constraints = [
+        ("unique_partner", "unique(partner_id)",
+         "Only one snapshot per partner is allowed")
+    ]
+
+    @api.model
+    def get_snapshot(self, partner):
+        """
+        Get the snapshot of the sponsor, computed with the rights of the
+        current user if it is missing or outdated.
+        :param partner: res.partner record
+        :return: dict with keys
+                 - children: {state: [child ids sorted by name]}
+                 - letters: {child id: [correspondence ids]}
+                 - gift_lines: {child id: [account.invoice.line ids]}
+                 - gift_params: {child id: wordpress gift form parameters}
+        """
+        ttl = int(self.env["ir.config_parameter"].sudo().get_param(
+            "website_compassion.portal_snapshot_ttl", 60))
+        snapshot = self.sudo().search([
+            ("partner_id", "=", partner.id),
+            ("data", "!=", False),
+            ("write_date", ">=", fields.Datetime.now() - timedelta(minutes=ttl)),
+        ])
+        if snapshot:
+            return self._decode(snapshot.data)
+        # The snapshot sees the changes committed before the transaction began
+        self.env.cr.execute(
+            "SELECT %s at time zone 'UTC'" % self._get_date_function())
+        compute_date = self.env.cr.fetchone()[0]
+        data = json.dumps(self._compute_snapshot(partner))
+        self._execute_apart("""
+            INSERT INTO portal_children_snapshot (
+                partner_id, data, create_uid, write_uid, create_date, write_date)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            ON CONFLICT (partner_id) DO UPDATE
+            SET data = EXCLUDED.data, write_uid = EXCLUDED.write_uid,
+                write_date = EXCLUDED.write_date
+            WHERE portal_children_snapshot.invalidate_date IS NULL
+               OR portal_children_snapshot.invalidate_date < EXCLUDED.write_date
+        """, [partner.id, data, self.env.uid, self.env.uid,
+              compute_date, compute_date])
+        return self._decode(data)
+
+    @api.model
+    def invalidate(self, partners):
+        """ Empty the snapshots of the given partners once the current
+        transaction is committed. """
+        if not partners:
+            return True
+        if self.pool.in_test_mode():
+            self._invalidate_snapshots(partners.ids)
+            return True
+        cr = self.env.cr
+        pending = getattr(cr, "portal_snapshot_partner_ids", None)
+        if pending is None:
+            pending = cr.portal_snapshot_partner_ids = set()
+
+            def invalidate_after_commit():
+                partner_ids = cr.__dict__.pop("portal_snapshot_partner_ids", ())
+                try:
+                    self._invalidate_snapshots(list(partner_ids))
+                except Exception:
+                    _logger.error("Portal snapshots of partners %s could not "
+                                  "be invalidated", partner_ids, exc_info=True)
+
+            cr.after("commit", invalidate_after_commit)
+            cr.after("rollback", lambda: cr.__dict__.pop(
+                "portal_snapshot_partner_ids", None))
+        pending.update(partners.ids)
+        return True
+
+    @api.model
+    def _invalidate_snapshots(self, partner_ids):
+        # Only the users can view a snapshot: no row is created for the
+        # other partners.
+        self._execute_apart("""
+            INSERT INTO portal_children_snapshot (
+                partner_id, invalidate_date, create_uid, write_uid,
+                create_date, write_date)
+            SELECT p.id, {now}, %s, %s, {now}, {now}
+            FROM unnest(%s) AS p(id)
+            WHERE EXISTS (SELECT 1 FROM res_users u WHERE u.partner_id = p.id)
+               OR EXISTS (SELECT 1 FROM portal_children_snapshot s
+                          WHERE s.partner_id = p.id)
+            ON CONFLICT (partner_id) DO UPDATE
+            SET data = NULL, invalidate_date = EXCLUDED.invalidate_date
+        """.format(now=f"({self._get_date_function()} at time zone 'UTC')"),
+            [self.env.uid, self.env.uid, partner_ids])
+
+    @api.model
+    def _execute_apart(self, query, params):
+        """ Execute a query with its own cursor, in autocommit. """
+        if self.pool.in_test_mode():
+            self.env.cr.execute(query, params)
+            return
+        with self.pool.cursor() as cr:
+            cr.autocommit(True)
+            cr.execute(query, params)
+
+    @api.model
+    def _get_date_function(self):
+        # Tests run in one transaction, where now() never changes.
+        return "clock_timestamp()" if self.pool.in_test_mode() else "now()"
+
+    @api.model
+    def _decode(self, data):
+        # JSON gives string keys for the dictionaries indexed by child
+        data = json.loads(data)
+        for key in ("letters", "gift_lines", "gift_params"):
+            data[key] = {int(k): v for k, v in data[key].items()}
+        return data
+
+    @api.model
+    def _compute_snapshot(self, partner):
+        end_reason_child_depart = self.env.ref(
+            "sponsorship_compassion.end_reason_depart")
+        sponsorships = partner.get_portal_sponsorships().with_context(
+            allow_during_suspension=True)
+        children = {}
+        for state in CHILDREN_STATES:
+            children[state] = sponsorships.filtered(
+                lambda s: _can_show_sponsorship(s, state, end_reason_child_depart)
+            ).mapped("child_id").sorted("preferred_name")
+        all_children = children["all"]
+
+        # Letters of all children in one search
+        correspondence_obj = self.env["correspondence"]
+        correspondents = {child.id: partner for child in all_children}
+        if partner.portal_sponsorships == "all_info":
+            for child in all_children:
+                correspondents[child.id] |= child.sponsorship_ids.filtered(
+                    lambda x: x.is_active).mapped("correspondent_id")
+            correspondence_obj = correspondence_obj.sudo()
+        all_correspondents = self.env["res.partner"].union(
+            *correspondents.values())
+        letters = correspondence_obj.search([
+            ("partner_id", "in", all_correspondents.ids),
+            ("child_id", "in", all_children.ids),
+            "|",
+            "&", ("direction", "=", "Supporter To Beneficiary"),
+            ("state", "!=", "Quality check unsuccessful"),
+            "&", "&", ("state", "=", "Published to Global Partner"),
+            ("letter_image", "!=", False),
+            "|", ("communication_id", "=", False), ("sent_date", "!=", False)
+        ])
+        letters_by_child = defaultdict(list)
+        for letter in letters:
+            if letter.partner_id in correspondents[letter.child_id.id]:
+                letters_by_child[letter.child_id.id].append(letter.id)
+
+        # Paid gifts of all children in one search
+        gift_categ = self.env.ref("sponsorship_compassion.product_category_gift")
+        lines = self.env["account.invoice.line"].sudo().search([
+            ("partner_id", "=", partner.id),
+            ("state", "=", "paid"),
+            ("contract_id.child_id", "in", all_children.ids),
+            ("product_id.categ_id", "=", gift_categ.id),
+            ("price_total", "!=", 0),
+        ])
+        lines_by_child = defaultdict(list)
+        for line in lines:
+            lines_by_child[line.contract_id.child_id.id].append(line.id)
+
+        return {
+            "children": {state: children[state].ids for state in CHILDREN_STATES},
+            "letters": letters_by_child,
+            "gift_lines": lines_by_child,
+            "gift_params": {
+                child.id: partner.with_context(
+                    mailchimp_child=child).wordpress_form_data
+                for child in all_children
+            },
+        }
+
+
+class RecurringContract(models.Model):
+    _inherit = "recurring.contract"
+
+    @api.model
+    def create(self, vals):
+        res = super().create(vals)
+        res._invalidate_portal_snapshot()
+        return res
+
+    @api.multi
+    def write(self, vals):
+        if not SNAPSHOT_CONTRACT_FIELDS.intersection(vals):
+            return super().write(vals)
+        # The previous sponsors lose the child
+        partners = self._get_portal_snapshot_partners()
+        res = super().write(vals)
+        self.env["portal.children.snapshot"].invalidate(
+            partners | self._get_portal_snapshot_partners())
+        return res
+
+    @api.multi
+    def unlink(self):
+        self._invalidate_portal_snapshot()
+        return super().unlink()
+
+    def _get_portal_snapshot_partners(self):
+        return self.mapped("partner_id") | self.mapped("correspondent_id")
+
+    def _invalidate_portal_snapshot(self):
+        self.env["portal.children.snapshot"].invalidate(
+            self._get_portal_snapshot_partners())
+
+
+class Correspondence(models.Model):
+    _inherit = "correspondence"
+
+    @api.model
+    def create(self, vals):
+        res = super().create(vals)
+        res._invalidate_portal_snapshot()
+        return res
+
+    @api.multi
+    def write(self, vals):
+        res = super().write(vals)
+        if SNAPSHOT_LETTER_FIELDS.intersection(vals):
+            self._invalidate_portal_snapshot()
+        return res
+
+    @api.multi
+    def unlink(self):
+        self._invalidate_portal_snapshot()
+        return super().unlink()
+
+    def _invalidate_portal_snapshot(self):
+        self.env["portal.children.snapshot"].invalidate(
+            self.mapped("partner_id") | self.mapped("sponsorship_id.partner_id"))
+
+
+class AccountInvoice(models.Model):
+    _inherit = "account.invoice"
+
+    @api.multi
+    def write(self, vals):
+        res = super().write(vals)
+        if "state" in vals:
+            self.env["portal.children.snapshot"].invalidate(
+                self.mapped("partner_id"))
+        return res
+
+
+class ResPartner(models.Model):
+    _inherit = "res.partner"
+
+    @api.multi
+    def write(self, vals):
+        # The gift form parameters depend on the partner data
+        if SNAPSHOT_PARTNER_FIELDS.intersection(vals):
+            self.env["portal.children.snapshot"].invalidate(self)
+        return super().write(vals)
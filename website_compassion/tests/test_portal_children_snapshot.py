@@ -0,0 +1,78 @@
+##############################################################################
+#
+#    Copyright (C) 2022 Compassion CH (http://www.compassion.ch)
+#    Releasing children from poverty in Jesus' name
+#
+#    The licence is in the file __manifest__.py
+#
+##############################################################################
+import logging
+import time
+
+import mock
+
+from odoo.addons.sponsorship_compassion.tests.test_sponsorship_compassion import (
+    BaseSponsorshipTest,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class TestPortalChildrenSnapshot(BaseSponsorshipTest):
+    def setUp(self):
+        super().setUp()
+        self.snapshot_obj = self.env["portal.children.snapshot"]
+        group = self.create_group({"partner_id": self.michel.id})
+        self.sponsorships = self.env["recurring.contract"]
+        for i in range(30):
+            sponsorship = self.create_contract({
+                "partner_id": self.michel.id,
+                "group_id": group.id,
+                "child_id": self.create_child(f"UG7232{i:04d}").id,
+            }, [{"amount": 50.0}])
+            self.validate_sponsorship(sponsorship)
+            self.sponsorships += sponsorship
+        self.snapshot_obj.invalidate(self.michel)
+
+    def _measure(self):
+        queries = self.cr.sql_log_count
+        start = time.time()
+        snapshot = self.snapshot_obj.get_snapshot(self.michel)
+        return snapshot, self.cr.sql_log_count - queries, time.time() - start
+
+    def test_benchmark_sponsor_of_30_children(self):
+        snapshot, compute_queries, compute_time = self._measure()
+        cached, cached_queries, cached_time = self._measure()
+        logger.info(
+            "Portal snapshot of 30 children: computed with %s queries in "
+            "%.3fs, read with %s queries in %.3fs",
+            compute_queries, compute_time, cached_queries, cached_time)
+
+        self.assertEqual(len(snapshot["children"]["all"]), 30)
+        self.assertEqual(cached, snapshot)
+        self.assertLessEqual(cached_queries, 3)
+
+    def test_snapshot_is_invalidated(self):
+        self.snapshot_obj.get_snapshot(self.michel)
+        self.sponsorships[0].write({"partner_id": self.michel.id})
+        snapshot = self.snapshot_obj.sudo().search([
+            ("partner_id", "=", self.michel.id)])
+        self.assertFalse(snapshot.data)
+
+    def test_snapshot_invalidated_while_computed_is_not_stored(self):
+        snapshot_class = type(self.snapshot_obj)
+        compute = snapshot_class._compute_snapshot
+
+        def compute_and_invalidate(snapshot_obj, partner):
+            data = compute(snapshot_obj, partner)
+            self.sponsorships[0].write({"partner_id": self.michel.id})
+            return data
+
+        self.snapshot_obj.get_snapshot(self.michel)
+        self.snapshot_obj.invalidate(self.michel)
+        with mock.patch.object(
+                snapshot_class, "_compute_snapshot", compute_and_invalidate):
+            self.snapshot_obj.get_snapshot(self.michel)
+        snapshot = self.snapshot_obj.sudo().search([
+            ("partner_id", "=", self.michel.id)])
+        self.assertFalse(snapshot.data)
@@ -0,0 +1,85 @@
+##############################################################################
+#
+#    Copyright (C) 2022 Compassion CH (http://www.compassion.ch)
+#    Releasing children from poverty in Jesus' name
+#
+#    The licence is in the file __manifest__.py
+#
+##############################################################################
+import io
+import shutil
+import threading
+from zipfile import ZipFile, ZIP_DEFLATED
+
+from odoo.tools.config import config
+
+CHUNK_SIZE = 64 * 1024
+
+# Limits the number of archives built at the same time by this worker.
+archive_slots = threading.BoundedSemaphore(
+    int(config.get("portal_max_zip_downloads") or 2))
+
+
+class _ChunkBuffer(io.RawIOBase):
+    """ Unseekable file collecting the bytes written by ZipFile. """
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def pop(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class ZipStream:
+    """
+    Iterable giving a ZIP archive by chunks, to be used as the body of a
+    response. The files are read from the disk when the archive is sent,
+    so that only one chunk is held in memory. Iterating does not use the
+    Odoo environment, as the request cursor is closed at that time.
+
+    The archive slot taken by the caller and the temporary folder are
+    released when the response is closed, even if it is never iterated.
+    """
+
+    def __init__(self, files, tmp_dir=None, slots=None):
+        """
+        :param files: list of tuples (path on disk, path in the archive)
+        :param tmp_dir: temporary folder to delete at the end
+        :param slots: semaphore acquired by the caller, released at the end
+        """
+        self.files = files
+        self.tmp_dir = tmp_dir
+        self.slots = slots
+        self._closed = False
+
+    def __iter__(self):
+        buffer = _ChunkBuffer()
+        with ZipFile(buffer, "w", ZIP_DEFLATED) as archive:
+            for disk_path, archive_path in self.files:
+                with open(disk_path, "rb") as src, \
+                        archive.open(archive_path, "w") as dst:
+                    for data in iter(lambda: src.read(CHUNK_SIZE), b""):
+                        dst.write(data)
+                        chunk = buffer.pop()
+                        if chunk:
+                            yield chunk
+        yield buffer.pop()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        if self.tmp_dir:
+            shutil.rmtree(self.tmp_dir, ignore_errors=True)
+        if self.slots:
+            self.slots.release()